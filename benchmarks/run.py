@@ -0,0 +1,289 @@
+"""
+Benchmarks the numeric hot paths and the loaders on synthetic data.
+
+Call this as follows:
+```
+(/{your_path}/h36m_framewise_actions)$ python benchmarks/run.py [--frames 100 1000 10000] [--threads 1 4]
+(/{your_path}/h36m_framewise_actions)$ python benchmarks/run.py --save      # store as baseline
+(/{your_path}/h36m_framewise_actions)$ python benchmarks/run.py --compare   # flag regressions
+```
+Every stage is timed on sequences of each length and with each number of
+numba threads. It reports the best of --repeat runs as frames/second and
+the peak memory that numpy allocated during one run. With --compare the
+exit code is 1 if any stage is more than --tolerance slower than the
+baseline. Baselines are machine specific: save one per machine.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from os.path import join, dirname, abspath, isfile
+from time import perf_counter
+
+sys.path.insert(0, os.getcwd())
+
+import numpy as np
+import numba as nb
+
+import h36m_fa.conversion as conv
+import h36m_fa.fk as FK
+import h36m_fa.kabsch as KB
+import h36m_fa.mirror as mirror
+import h36m_fa.poses as poses
+from h36m_fa.cache import CACHE
+from h36m_fa.labels import LabelStore
+import synthetic
+
+BASELINE = join(dirname(abspath(__file__)), "baseline.json")
+
+
+def nothing():
+    pass
+
+
+# ==============================
+# S T A G E S
+# every stage(n_frames, data_dir, n_threads) returns (prepare, run):
+# prepare is called untimed before every timed call of run; n_threads
+# is also set as the number of numba threads
+# ==============================
+
+
+def stage_expmap2euler(n_frames, data_dir, n_threads):
+    seq = synthetic.expmap(n_frames)
+    return nothing, lambda: conv.expmap2euler(seq)
+
+
+def stage_euler_fk(n_frames, data_dir, n_threads):
+    seq = synthetic.euler(n_frames)
+    return nothing, lambda: FK.euler_fk(seq)
+
+
+def stage_batch_euler_fk(n_frames, data_dir, n_threads):
+    seq = synthetic.euler(n_frames)
+    return nothing, lambda: FK.batch_euler_fk(seq, n_threads=n_threads)
+
+
+def stage_expmap_fk(n_frames, data_dir, n_threads):
+    seq = synthetic.expmap(n_frames)
+    return nothing, lambda: FK.expmap_fk(seq, n_threads=n_threads)
+
+
+def stage_batch_rot3d(n_frames, data_dir, n_threads):
+    angles = synthetic.euler(n_frames).reshape((-1, 3))
+    return nothing, lambda: FK.batch_rot3d(angles)
+
+
+def stage_kabsch(n_frames, data_dir, n_threads):
+    P = synthetic.joints(n_frames, seed=0)
+    Q = synthetic.joints(n_frames, seed=1)
+    return nothing, lambda: [KB.kabsch(P[t], Q[t]) for t in range(n_frames)]
+
+
+def stage_rotate_P_to_Q(n_frames, data_dir, n_threads):
+    P = synthetic.joints(n_frames, seed=0)
+    Q = synthetic.joints(n_frames, seed=1)
+    return nothing, lambda: [KB.rotate_P_to_Q(P[t], Q[t]) for t in range(n_frames)]
+
+
+def stage_rotate_P_to_Q_batch(n_frames, data_dir, n_threads):
+    P = synthetic.joints(n_frames, seed=0)
+    Q = synthetic.joints(n_frames, seed=1)
+    return nothing, lambda: KB.rotate_P_to_Q_batch(P, Q)
+
+
+def stage_mirror_p3d(n_frames, data_dir, n_threads):
+    seq = synthetic.joints(n_frames).reshape((n_frames, -1))
+    return nothing, lambda: mirror.mirror_p3d(seq)
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif isfile(path):
+            os.remove(path)
+
+
+def _shadow(data_dir):
+    fname = join(
+        data_dir,
+        "exp_dir/h3.6m/dataset",
+        synthetic.ACTOR,
+        f"{synthetic.ACTION}_{synthetic.SID}.npy",
+    )
+    return fname, fname + ".src"
+
+
+def _load(loader, data_dir):
+    return lambda: loader(synthetic.ACTOR, synthetic.ACTION, synthetic.SID, data_dir)
+
+
+def stage_get_expmap_text(n_frames, data_dir, n_threads):
+    def prepare():
+        CACHE.clear()
+        _remove(*_shadow(data_dir))
+
+    return prepare, _load(poses.get_expmap, data_dir)
+
+
+def stage_get_expmap(n_frames, data_dir, n_threads):
+    _load(poses.get_expmap, data_dir)()  # writes the binary shadow
+    return CACHE.clear, _load(poses.get_expmap, data_dir)
+
+
+def stage_get_euler_acquire(n_frames, data_dir, n_threads):
+    def prepare():
+        CACHE.clear()
+        _remove(join(data_dir, "euler"))
+
+    return prepare, _load(poses.get_euler, data_dir)
+
+
+def stage_get3d_fixed_acquire(n_frames, data_dir, n_threads):
+    def prepare():
+        CACHE.clear()
+        _remove(
+            join(data_dir, "fixed_skeleton"),
+            join(data_dir, "fixed_skeleton_from_rotation"),
+        )
+
+    return prepare, _load(poses.get3d_fixed, data_dir)
+
+
+def stage_get3d_fixed_cached(n_frames, data_dir, n_threads):
+    _load(poses.get3d_fixed, data_dir)()
+    return nothing, _load(poses.get3d_fixed, data_dir)
+
+
+def stage_labels(n_frames, data_dir, n_threads):
+    store = LabelStore(n_classes=11, data_dir=data_dir)
+    return nothing, lambda: store.get(synthetic.ACTOR, synthetic.ACTION, synthetic.SID)
+
+
+STAGES = {
+    "expmap2euler": stage_expmap2euler,
+    "euler_fk": stage_euler_fk,
+    "batch_euler_fk": stage_batch_euler_fk,
+    "expmap_fk": stage_expmap_fk,
+    "batch_rot3d": stage_batch_rot3d,
+    "kabsch": stage_kabsch,
+    "rotate_P_to_Q": stage_rotate_P_to_Q,
+    "rotate_P_to_Q_batch": stage_rotate_P_to_Q_batch,
+    "mirror_p3d": stage_mirror_p3d,
+    "get_expmap[text]": stage_get_expmap_text,
+    "get_expmap": stage_get_expmap,
+    "get_euler[acquire]": stage_get_euler_acquire,
+    "get3d_fixed[acquire]": stage_get3d_fixed_acquire,
+    "get3d_fixed[cached]": stage_get3d_fixed_cached,
+    "labels.get": stage_labels,
+}
+
+
+# ==============================
+# R U N
+# ==============================
+
+
+def measure(stage, n_frames, data_dir, n_threads, repeat):
+    """
+    :return: {"fps": frames/second of the best run, "seconds": ...,
+        "peak_bytes": peak numpy/python allocation during one run}
+    """
+    prepare, run = stage(n_frames, data_dir, n_threads)
+    prepare()
+    run()  # warm-up: numba compilation, page cache
+    best = np.inf
+    for _ in range(repeat):
+        prepare()
+        start = perf_counter()
+        run()
+        best = min(best, perf_counter() - start)
+    prepare()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"fps": n_frames / best, "seconds": best, "peak_bytes": peak}
+
+
+def result_key(name, n_frames, n_threads):
+    return f"{name}/{n_frames}/{n_threads}"
+
+
+def benchmark(names, frames, threads, repeat):
+    results = {}
+    for n_frames in frames:
+        data_dir = tempfile.mkdtemp(prefix="h36m_fa_bench_")
+        try:
+            synthetic.write_data_dir(data_dir, n_frames)
+            for n_threads in threads:
+                nb.set_num_threads(min(n_threads, nb.config.NUMBA_NUM_THREADS))
+                for name in names:
+                    r = measure(STAGES[name], n_frames, data_dir, n_threads, repeat)
+                    results[result_key(name, n_frames, n_threads)] = r
+                    print(
+                        f"{name:>24} {n_frames:>7} frames {n_threads:>3} threads "
+                        f"{r['fps']:>14,.0f} fps {r['peak_bytes'] / 2 ** 20:>9.1f} MiB"
+                    )
+        finally:
+            CACHE.clear()
+            shutil.rmtree(data_dir)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: [(key, fps, baseline fps), ...] of the stages that are more
+        than tolerance slower than the baseline
+    """
+    regressions = []
+    for key, r in results.items():
+        if key in baseline and r["fps"] < (1 - tolerance) * baseline[key]["fps"]:
+            regressions.append((key, r["fps"], baseline[key]["fps"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--frames", nargs="+", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--threads", nargs="+", type=int, default=[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="store as baseline")
+    parser.add_argument("--compare", action="store_true", help="flag regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = benchmark(args.stages, args.frames, args.threads, args.repeat)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save:
+        baseline = {}
+        if isfile(args.baseline):
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print("saved baseline:", args.baseline)
+    if args.compare:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for key, fps, base_fps in regressions:
+            print(f"REGRESSION {key}: {fps:,.0f} fps (baseline {base_fps:,.0f} fps)")
+        if len(regressions) > 0:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Synthetic Human3.6M-shaped data for the benchmarks.
+
+The sequences are smooth random walks with the shapes, dtypes and value
+ranges of the real data, so that they exercise the same code paths
+without the (licensed) dataset.
+"""
+import numpy as np
+from os import makedirs
+from os.path import join
+
+import h36m_fa.fk as FK
+import h36m_fa.labels as labels
+
+ACTOR = "S1"
+ACTION = "walking"
+SID = 1
+
+
+def random_walk(rng, n_frames, dim, step, limit):
+    """
+    :return: {n_frames x dim} float32 random walk, reflected at +/-limit
+    """
+    seq = np.cumsum(rng.normal(0, step, (n_frames, dim)), axis=0)
+    seq = seq + rng.uniform(-limit, limit, dim)
+    # fold into [-limit, limit] so that long sequences stay in range
+    seq = np.abs((seq + limit) % (4 * limit) - 2 * limit) - limit
+    return seq.astype(np.float32)
+
+
+def expmap(n_frames, seed=0):
+    """
+    :return: {n_frames x 99}: root position, then 33 axis-angle rotations
+    """
+    rng = np.random.default_rng(seed)
+    seq = random_walk(rng, n_frames, 99, step=0.02, limit=2.0)
+    seq[:, 0:3] = random_walk(rng, n_frames, 3, step=5.0, limit=2000.0)
+    return seq
+
+
+def euler(n_frames, seed=0):
+    """
+    :return: {n_frames x 96}
+    """
+    rng = np.random.default_rng(seed)
+    return random_walk(rng, n_frames, 96, step=0.02, limit=np.pi / 2)
+
+
+def joints(n_frames, seed=0):
+    """
+    :return: {n_frames x 32 x 3}
+    """
+    return FK.euler_fk(euler(n_frames, seed=seed))
+
+
+def multi_hot(n_frames, n_classes=11, mean_length=100, seed=0):
+    """
+    :return: {n_frames x n_classes} uint8, every class switches on and off
+        in runs of about mean_length frames
+    """
+    rng = np.random.default_rng(seed)
+    switches = rng.random((n_frames, n_classes)) < 1 / mean_length
+    state = rng.random(n_classes) < 0.5
+    return (np.cumsum(switches, axis=0) % 2 != state).astype(np.uint8)
+
+
+def write_data_dir(data_dir, n_frames, seed=0):
+    """
+    Writes the raw files of one sequence (ACTOR, ACTION, SID) in the
+    layout that poses.get* expects, plus a label store with it
+    """
+    exp_dir = join(data_dir, "exp_dir/h3.6m/dataset", ACTOR)
+    makedirs(exp_dir, exist_ok=True)
+    name = f"{ACTOR}_{ACTION}_{SID}"
+    np.savetxt(
+        join(exp_dir, f"{ACTION}_{SID}.txt"), expmap(n_frames, seed), delimiter=","
+    )
+    np.save(join(data_dir, name + ".npy"), joints(n_frames, seed))
+    for n_classes in [8, 11]:
+        lab = multi_hot(n_frames, n_classes=n_classes, seed=seed)
+        labels.pack({name: lab}, n_classes, data_dir)
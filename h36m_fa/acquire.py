@@ -1,3 +1,99 @@
 import numpy as np
-from os.path imoort isfile, join
+import multiprocessing as mp
+from os import cpu_count, getpid, replace
+from threading import get_ident
+from os.path import join, dirname, basename
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from tqdm import tqdm
+
+import h36m_fa.instrument as IN
+
+
+def tmp_name(fname: str):
+    """
+    temporary sibling of fname: same directory so that the rename is
+    atomic, unique per process and thread so that concurrent writers of
+    the same file never share it
+    """
+    return join(dirname(fname), f".{basename(fname)}.{getpid()}.{get_ident()}.tmp")
+
+
+def load(fname: str):
+    """np.load, recorded as I/O stage"""
+    with IN.stage("acquire.load") as span:
+        arr = np.load(fname)
+        span.frames += len(arr)
+        span.nbytes += arr.nbytes
+    return arr
+
+
+def atomic_save(fname: str, arr):
+    """np.save that either fully writes fname or leaves it untouched"""
+    with IN.stage("acquire.save") as span:
+        tmp = tmp_name(fname)
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+            span.nbytes += f.tell()
+        replace(tmp, fname)
+
+
+def atomic_savetxt(fname: str, arr):
+    """np.savetxt that either fully writes fname or leaves it untouched"""
+    with IN.stage("acquire.savetxt") as span:
+        tmp = tmp_name(fname)
+        with open(tmp, "wb") as f:
+            np.savetxt(f, arr)
+            span.nbytes += f.tell()
+        replace(tmp, fname)
+
+
+def _instrumented(task, actor, action, sid, data_dir):
+    """runs task in a worker process and returns the stages it recorded"""
+    IN.enable()
+    IN.reset()
+    task(actor, action, sid, data_dir)
+    return IN.stages()
+
+
+def run(task, keys, data_dir: str, n_workers=None, desc=""):
+    """
+    Runs task(actor, action, sid, data_dir) for every key. Tasks must be
+    idempotent and write their outputs atomically, so that an interrupted
+    run can simply be restarted with the remaining keys.
+    :param keys: [(actor, action, sid), ...]
+    :param n_workers: number of processes, defaults to the number of cores;
+        with a single worker everything runs in the calling process
+    Workers are spawned rather than forked as the numba threading layers
+    (tbb, omp) are not fork-safe: scripts that run with more than one
+    worker need an `if __name__ == "__main__":` guard.
+    If instrumentation is enabled, the stages recorded in the workers are
+    merged into the calling process.
+    """
+    keys = list(keys)
+    if len(keys) == 0:
+        return
+    if n_workers is None:
+        n_workers = cpu_count() or 1
+    n_workers = min(n_workers, len(keys))
+    if n_workers == 1:
+        for actor, action, sid in tqdm(keys, desc=desc):
+            task(actor, action, sid, data_dir)
+        return
+    context = mp.get_context("spawn")
+    instrumented = IN.ENABLED
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context) as pool:
+        if instrumented:
+            futures = [
+                pool.submit(_instrumented, task, actor, action, sid, data_dir)
+                for actor, action, sid in keys
+            ]
+        else:
+            futures = [
+                pool.submit(task, actor, action, sid, data_dir)
+                for actor, action, sid in keys
+            ]
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            result = future.result()
+            if instrumented:
+                IN.merge(result)
@@ -0,0 +1,231 @@
+"""
+Consolidated, memory-mapped archives of the pose representations.
+
+Every representation is packed into one contiguous array per order
+    {data_dir}/archive/{representation}_{order}.npy   {n_frames_total x ...}
+    {data_dir}/archive/{representation}_{order}.json  {"order": order,
+        "index": {"S1_walking_1": [start, length]},
+        "sources": {path: manifest.fingerprint}}
+so that sweeping the whole dataset costs a single file open and all
+sequences are returned as zero-copy views into the memory map. The
+fingerprints of the files the sequences were read from are checked when
+the archive is first opened in a process, and the archive is rebuilt if
+any of them changed.
+"""
+import json
+import numpy as np
+from os import makedirs, remove, replace
+from os.path import join, isfile, isdir, abspath
+import h36m_fa.poses as poses
+import h36m_fa.bulk as bulk
+import h36m_fa.manifest as MF
+from h36m_fa.labels import key
+
+
+REPRESENTATIONS = poses.REPRESENTATIONS
+
+ORDERS = ["actor", "action"]
+
+
+def all_keys(order="actor"):
+    """
+    :param order: "actor" keeps every actor contiguous in the archive,
+        "action" keeps every action contiguous
+    :return: [(actor, action, sid), ...]
+    """
+    assert order in ORDERS, "unknown order:" + str(order)
+    if order == "actor":
+        return poses.all_sequences()
+    return [
+        (actor, action, sid)
+        for action in poses.ACTIONS
+        for actor in poses.ACTORS
+        for sid in [1, 2]
+    ]
+
+
+def archive_name(representation: str, data_dir: str, order="actor"):
+    """
+    :return: path of the archive without extension
+    """
+    return join(abspath(data_dir), "archive", representation + "_" + order)
+
+
+def build_archive(representation: str, data_dir: str, order="actor"):
+    """
+    Packs all sequences of a representation into one archive. The
+    sequence lengths are read first, then every sequence is streamed into
+    a temporary memory map, so that only one sequence is in memory at a
+    time. The index is written before the data is renamed into place: an
+    archive whose .npy exists is complete.
+    """
+    assert representation in REPRESENTATIONS, "unknown:" + str(representation)
+    assert order in ORDERS, "unknown order:" + str(order)
+    data_dir = abspath(data_dir)
+    archive_dir = join(data_dir, "archive")
+    if not isdir(archive_dir):
+        makedirs(archive_dir)
+    loader = REPRESENTATIONS[representation]
+    fname = archive_name(representation, data_dir, order)
+    if isfile(fname + ".npy"):
+        remove(fname + ".npy")
+
+    keys = all_keys(order)
+    index = {}
+    start = 0
+    for actor, action, sid in keys:
+        shape = bulk.shape(representation, actor, action, sid, data_dir)
+        index[key(actor, action, sid)] = [start, shape[0]]
+        start += shape[0]
+    frame_shape = tuple(shape[1:])
+
+    data = np.lib.format.open_memmap(
+        fname + ".tmp.npy", mode="w+", dtype=np.float32, shape=(start,) + frame_shape
+    )
+    sources = {}
+    for actor, action, sid in keys:
+        s, n = index[key(actor, action, sid)]
+        data[s : s + n] = loader(actor, action, sid, data_dir)
+        # after loading: the loader generates missing artifacts
+        path = MF.input_path(actor, action, sid, representation)
+        sources[path] = MF.fingerprint(join(data_dir, path))
+    data.flush()
+    del data
+
+    with open(fname + ".tmp.json", "w") as f:
+        json.dump({"order": order, "index": index, "sources": sources}, f)
+    replace(fname + ".tmp.json", fname + ".json")
+    replace(fname + ".tmp.npy", fname + ".npy")
+
+
+class Archive:
+    def __init__(self, representation: str, data_dir: str, order="actor"):
+        self.representation = representation
+        self.data_dir = abspath(data_dir)
+        self.order = order
+        self._data = None
+        self._index = None
+
+    @property
+    def fname(self):
+        return archive_name(self.representation, self.data_dir, self.order) + ".npy"
+
+    @property
+    def index(self):
+        """
+        {"actor_action_sid": (start, length)}
+        """
+        if self._index is None:
+            meta = self._meta()
+            self._index = {k: tuple(v) for k, v in meta["index"].items()}
+        return self._index
+
+    def _meta(self):
+        fname = self.fname[:-4] + ".json"
+        with open(fname, "r") as f:
+            meta = json.load(f)
+        assert meta["order"] == self.order, fname + ": " + str(meta["order"])
+        return meta
+
+    def is_fresh(self):
+        """
+        :return: False if the archive is missing or any source file changed
+            (by content) since the archive was built
+        """
+        if not isfile(self.fname) or not isfile(self.fname[:-4] + ".json"):
+            return False
+        sources = self._meta().get("sources")
+        if sources is None:
+            # built before the sources were recorded
+            return False
+        for path, recorded in sources.items():
+            fp = MF.fingerprint(join(self.data_dir, path), recorded)
+            if fp is None or fp["hash"] != recorded["hash"]:
+                return False
+        return True
+
+    @property
+    def data(self):
+        """
+        {n_frames_total x ...} memory-mapped, read-only
+        """
+        if self._data is None:
+            self._data = np.load(self.fname, mmap_mode="r")
+        return self._data
+
+    def span(self, actor, action, sid):
+        return self.index[key(actor, action, sid)]
+
+    def get(self, actor, action, sid):
+        """
+        :return: zero-copy view of one sequence
+        """
+        start, length = self.span(actor, action, sid)
+        return self.data[start : start + length]
+
+    def get_split(self, actors=None, actions=None, sids=(1, 2)):
+        """
+        All frames of the selected sequences, in archive order.
+        If the selection is contiguous in the archive (e.g. one actor in
+        an "actor"-ordered archive or one action in an "action"-ordered
+        one) the result is a zero-copy view, otherwise it is a copy.
+        :return: frames, {"actor_action_sid": (start, length)} relative
+            to the returned frames
+        """
+        actors = poses.ACTORS if actors is None else actors
+        actions = poses.ACTIONS if actions is None else actions
+        wanted = set(
+            key(actor, action, sid)
+            for actor in actors
+            for action in actions
+            for sid in sids
+        )
+        spans = sorted(
+            (start, length, name)
+            for name, (start, length) in self.index.items()
+            if name in wanted
+        )
+        assert len(spans) > 0, "empty split"
+
+        # merge touching spans into runs
+        runs = []
+        for start, length, _ in spans:
+            if len(runs) > 0 and runs[-1][1] == start:
+                runs[-1][1] = start + length
+            else:
+                runs.append([start, start + length])
+        if len(runs) == 1:
+            frames = self.data[runs[0][0] : runs[0][1]]
+        else:
+            frames = np.concatenate([self.data[a:b] for a, b in runs], axis=0)
+
+        index = {}
+        offset = 0
+        for start, length, name in spans:
+            index[name] = (offset, length)
+            offset += length
+        return frames, index
+
+
+ARCHIVES = {}
+
+
+def get_archive(representation: str, data_dir: str, order="actor"):
+    """
+    Returns the (lazily opened) archive, (re)building it on first use if
+    it is missing or its sources changed.
+    """
+    data_dir = abspath(data_dir)
+    if (representation, data_dir, order) not in ARCHIVES:
+        archive = Archive(representation, data_dir, order=order)
+        if not archive.is_fresh():
+            build_archive(representation, data_dir, order=order)
+        ARCHIVES[representation, data_dir, order] = archive
+    return ARCHIVES[representation, data_dir, order]
+
+
+def get(representation: str, actor, action, sid, data_dir: str, order="actor"):
+    """
+    Zero-copy equivalent of the poses.get* loaders
+    """
+    return get_archive(representation, data_dir, order=order).get(actor, action, sid)
@@ -0,0 +1,191 @@
+"""
+Concurrent loading of many sequences into one packed buffer.
+
+    frames, offsets = bulk.load(keys, "fixed_skeleton", data_dir)
+    frames[offsets[i] : offsets[i + 1]]  # the i-th sequence
+
+First the lengths of all sequences are read from the .npy headers (or
+binary text shadows), then the output buffer is allocated once and every
+file is read straight into its slice on a thread pool: no intermediate
+arrays and no concatenation. Sequences without a binary file on disk yet
+fall back to their poses.get* loader (which generates them); this runs
+on the calling thread, as the parallel numba kernels of the generation
+must not be launched from pool threads (see kabsch_kernels). Sequences
+that are already in the in-process cache are copied from there. Bulk
+reads do not populate the cache.
+"""
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join, isfile, abspath
+import h36m_fa.txtcache as TC
+import h36m_fa.instrument as IN
+from h36m_fa.poses import REPRESENTATIONS
+from h36m_fa.cache import CACHE, cache_key
+
+
+def _name(actor, action, sid):
+    return actor + "_" + action + "_" + str(sid)
+
+
+def _shadow(fname):
+    if isfile(fname) and TC.is_fresh(fname):
+        return TC.shadow_name(fname)
+    return None
+
+
+# representation -> binary file that its loader reads (None if missing)
+SOURCES = {
+    "3d": lambda actor, action, sid, data_dir: join(
+        data_dir, _name(actor, action, sid) + ".npy"
+    ),
+    "expmap": lambda actor, action, sid, data_dir: _shadow(
+        join(data_dir, "exp_dir/h3.6m/dataset", actor, action + "_" + str(sid) + ".txt")
+    ),
+    "euler": lambda actor, action, sid, data_dir: join(
+        data_dir, "euler", _name(actor, action, sid) + ".npy"
+    ),
+    "fixed_skeleton": lambda actor, action, sid, data_dir: _shadow(
+        join(data_dir, "fixed_skeleton", _name(actor, action, sid) + ".txt")
+    ),
+    "fixed_skeleton_from_rotation": lambda actor, action, sid, data_dir: join(
+        data_dir, "fixed_skeleton_from_rotation", _name(actor, action, sid) + ".npy"
+    ),
+}
+
+# representations whose loader flattens the frames of the file
+FLATTEN = {"fixed_skeleton_from_rotation"}
+
+
+def _npy_header(fname):
+    """
+    :return: shape, dtype, offset of the data; None if the data cannot
+        be read into a buffer directly
+    """
+    with open(fname, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            header = np.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            header = np.lib.format.read_array_header_2_0(f)
+        else:
+            return None
+        shape, fortran_order, dtype = header
+        if fortran_order or dtype.hasobject or len(shape) == 0:
+            return None
+        return shape, dtype, f.tell()
+
+
+class _Source:
+    """where and how one sequence is read"""
+
+    __slots__ = ["fname", "offset", "shape", "dtype", "seq"]
+
+    def __init__(self, fname=None, offset=0, shape=None, dtype=None, seq=None):
+        self.fname = fname
+        self.offset = offset
+        self.shape = shape
+        self.dtype = dtype
+        self.seq = seq
+
+
+def _resolve(representation, actor, action, sid, data_dir, fallback=True):
+    """
+    :param fallback: call the loader if there is no binary file
+    :return: _Source with the file and header of the sequence, or with
+        the sequence itself (from the cache or the loader); None if the
+        loader would be needed but fallback is False
+    """
+    loader = REPRESENTATIONS[representation]
+    # a peek: bulk reads must not skew the hit/miss statistics
+    seq = CACHE.peek(cache_key(loader, actor, action, sid, data_dir))
+    if seq is not None:
+        return _Source(shape=seq.shape, dtype=seq.dtype, seq=seq)
+    fname = SOURCES[representation](actor, action, sid, data_dir)
+    if fname is not None and isfile(fname):
+        header = _npy_header(fname)
+        if header is not None:
+            shape, dtype, offset = header
+            if representation in FLATTEN:
+                shape = (shape[0], int(np.prod(shape[1:])))
+            return _Source(fname=fname, offset=offset, shape=shape, dtype=dtype)
+    if not fallback:
+        return None
+    seq = np.asarray(loader(actor, action, sid, data_dir))
+    return _Source(shape=seq.shape, dtype=seq.dtype, seq=seq)
+
+
+def shape(representation: str, actor, action, sid, data_dir: str):
+    """
+    Shape of a sequence as its poses.get* loader returns it, read from the
+    file header where possible (no data is kept); sequences that were not
+    generated yet are generated
+    """
+    assert representation in REPRESENTATIONS, "unknown:" + str(representation)
+    data_dir = abspath(data_dir)
+    return tuple(_resolve(representation, actor, action, sid, data_dir).shape)
+
+
+def _read(source, out):
+    """fills out with the sequence"""
+    if source.seq is not None:
+        out[:] = np.reshape(source.seq, out.shape)
+        return
+    with open(source.fname, "rb") as f:
+        f.seek(source.offset)
+        n_bytes = f.readinto(memoryview(out.reshape(-1).view(np.uint8)))
+    assert n_bytes == out.nbytes, "truncated file:" + source.fname
+
+
+def load(keys, representation: str, data_dir: str, n_threads=8, as_dict=False):
+    """
+    :param keys: [(actor, action, sid), ...]
+    :param representation: one of poses.REPRESENTATIONS
+    :param n_threads: number of concurrent reads
+    :param as_dict: return {(actor, action, sid): sequence} (views into one
+        buffer) instead of the packed buffer
+    :return: {n_frames_total x ...} frames, {len(keys) + 1} int64 offsets:
+        sequence i is frames[offsets[i] : offsets[i + 1]]
+    """
+    assert representation in REPRESENTATIONS, "unknown:" + str(representation)
+    keys = [tuple(k) for k in keys]
+    assert len(keys) > 0, "no keys"
+    data_dir = abspath(data_dir)
+    with IN.stage("bulk.load") as span, ThreadPoolExecutor(n_threads) as pool:
+        sources = list(
+            pool.map(
+                lambda k: _resolve(
+                    representation, k[0], k[1], k[2], data_dir, fallback=False
+                ),
+                keys,
+            )
+        )
+        for i, (actor, action, sid) in enumerate(keys):
+            if sources[i] is None:
+                sources[i] = _resolve(representation, actor, action, sid, data_dir)
+        frame_shape = tuple(sources[0].shape[1:])
+        for (actor, action, sid), source in zip(keys, sources):
+            assert tuple(source.shape[1:]) == frame_shape, (
+                _name(actor, action, sid) + str(source.shape) + str(frame_shape)
+            )
+        dtype = np.result_type(*[source.dtype for source in sources])
+        for source in sources:
+            if source.dtype != dtype and source.seq is None:
+                # mixed dtypes cannot be read into the buffer directly
+                source.seq = np.load(source.fname)
+
+        lengths = np.array([source.shape[0] for source in sources], dtype=np.int64)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        frames = np.empty((offsets[-1],) + frame_shape, dtype=dtype)
+        list(
+            pool.map(
+                lambda i: _read(sources[i], frames[offsets[i] : offsets[i + 1]]),
+                range(len(keys)),
+            )
+        )
+        span.frames += len(frames)
+        span.nbytes += frames.nbytes
+
+    if as_dict:
+        return {k: frames[offsets[i] : offsets[i + 1]] for i, k in enumerate(keys)}
+    return frames, offsets
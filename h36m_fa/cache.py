@@ -0,0 +1,127 @@
+"""
+Shared in-process cache for the poses.get* loaders.
+
+The cache is bounded by the total number of bytes of the cached arrays
+and evicts the least recently used sequences first. Cached arrays are
+returned read-only so that callers cannot corrupt them: use np.copy when
+a writable array is needed. Arrays that are not cached (larger than the
+cache, or caching disabled) are returned as they are.
+
+The size can be set with the H36M_FA_CACHE_BYTES environment variable
+or with CACHE.resize(max_bytes); 0 disables caching.
+"""
+import functools
+import threading
+import numpy as np
+from collections import OrderedDict
+from os import environ
+from os.path import abspath
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class LRUCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """
+        :return: the cached array or None
+        """
+        with self._lock:
+            seq = self._entries.get(key)
+            if seq is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return seq
+
+    def peek(self, key):
+        """
+        :return: the cached array or None, without counting a hit or miss
+            and without refreshing its position
+        """
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, seq):
+        """
+        Caches seq (unless it is larger than the whole cache)
+        :return: seq, read-only if it was cached
+        """
+        seq = np.asarray(seq)
+        with self._lock:
+            if key in self._entries:
+                self.n_bytes -= self._entries.pop(key).nbytes
+            if seq.nbytes <= self.max_bytes:
+                seq.flags.writeable = False
+                self._entries[key] = seq
+                self.n_bytes += seq.nbytes
+                self._evict()
+        return seq
+
+    def resize(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.n_bytes = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "n_bytes": self.n_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _evict(self):
+        while self.n_bytes > self.max_bytes:
+            _, seq = self._entries.popitem(last=False)
+            self.n_bytes -= seq.nbytes
+            self.evictions += 1
+
+
+CACHE = LRUCache(int(environ.get("H36M_FA_CACHE_BYTES", DEFAULT_MAX_BYTES)))
+
+
+def cache_key(loader, actor, action, sid, data_dir):
+    """
+    :return: the key of a sequence of a loader wrapped by cached
+    """
+    return (loader.__name__, actor, action, str(sid), abspath(data_dir))
+
+
+def cached(loader):
+    """
+    Wraps a loader(actor, action, sid, data_dir) so that its results are
+    served from CACHE
+    """
+
+    @functools.wraps(loader)
+    def cached_loader(actor, action, sid, data_dir):
+        key = cache_key(loader, actor, action, sid, data_dir)
+        seq = CACHE.get(key)
+        if seq is None:
+            seq = CACHE.put(key, loader(actor, action, sid, data_dir))
+        return seq
+
+    return cached_loader
@@ -1,20 +1,69 @@
 import numpy as np
+import h36m_fa.instrument as IN
 
 
+@IN.timed(frames="arg")
 def expmap2euler(seq):
     """
-    :param seq: {n x 99}
+    :param seq: {... x 99}
+    :return: {... x 96} float32
     """
-    n_frames, dim = seq.shape
+    seq = np.asarray(seq)
+    dim = seq.shape[-1]
     assert dim == 99, "dim is " + str(dim)
-    euler = np.copy(seq)
-    for j in range(n_frames):
-        for k in np.arange(0, 97, 3):
-            idx = [k, k + 1, k + 2]
-            R = expmap2rotmat(seq[j, idx])
-            euler[j, idx] = rotmat2euler(R.T)
-    euler[:, 0:6] = 0
-    return euler[:, 3:]
+    if seq.dtype != np.float32 and seq.dtype != np.float64:
+        seq = seq.astype(np.float32)
+    batch_shape = seq.shape[:-1]
+    R = batch_expmap2rotmat(seq.reshape((-1, 3)))
+    euler = batch_rotmat2euler(np.swapaxes(R, 1, 2))
+    euler = euler.reshape(batch_shape + (99,)).astype(np.float32)
+    euler[..., 0:6] = 0
+    return euler[..., 3:]
+
+
+def batch_expmap2rotmat(r):
+    """
+    Batched version of expmap2rotmat: the operations are ordered exactly
+    as in the single-matrix version so that results are bit-identical.
+    :param r: {n x 3}
+    :return: {n x 3 x 3} float64
+    """
+    # np.linalg.norm reduces with a BLAS dot: matmul follows the same path
+    theta = np.sqrt(np.matmul(r[:, None, :], r[:, :, None])[:, 0, 0])
+    r0 = np.divide(r, np.maximum(theta, np.finfo(np.float32).eps)[:, None])
+    r0 = r0.astype(np.float64)
+    n = len(r0)
+    zero = np.zeros((n,))
+    r0x = np.stack(
+        [zero, -r0[:, 2], r0[:, 1], zero, zero, -r0[:, 0], zero, zero, zero], axis=1
+    ).reshape((n, 3, 3))
+    r0x = r0x - np.swapaxes(r0x, 1, 2)
+    sin = np.sin(theta).astype(np.float64)[:, None, None]
+    one_minus_cos = (1 - np.cos(theta)).astype(np.float64)[:, None, None]
+    R = np.eye(3, 3) + sin * r0x + one_minus_cos * np.matmul(r0x, r0x)
+    return R
+
+
+def batch_rotmat2euler(R):
+    """
+    Batched version of rotmat2euler: the gimbal-lock special case
+    is handled with a mask instead of branching.
+    :param R: {n x 3 x 3}
+    :return: {n x 3}
+    """
+    R02 = R[:, 0, 2]
+    special = (R02 == 1) | (R02 == -1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        E2 = -np.arcsin(R02)
+        cosE2 = np.cos(E2)
+        E1 = np.arctan2(R[:, 1, 2] / cosE2, R[:, 2, 2] / cosE2)
+        E3 = np.arctan2(R[:, 0, 1] / cosE2, R[:, 0, 0] / cosE2)
+    if np.any(special):
+        dlta = np.arctan2(R[special, 0, 1], R02[special])
+        E1[special] = dlta
+        E2[special] = np.where(R02[special] == -1, np.pi / 2, -np.pi / 2)
+        E3[special] = 0
+    return np.stack([E1, E2, E3], axis=1)
 
 
 def expmap2rotmat(r):
@@ -61,4 +110,235 @@ def rotmat2euler(R):
         E1 = np.arctan2(R[1, 2] / np.cos(E2), R[2, 2] / np.cos(E2))
         E3 = np.arctan2(R[0, 1] / np.cos(E2), R[0, 0] / np.cos(E2))
     eul = np.array([E1, E2, E3])
-    return eul
\ No newline at end of file
+    return eul
+
+
+# ==============================
+# Batched conversions between rotation representations. All functions
+# accept arbitrary leading batch dimensions and compute in float32:
+#   expmap  {... x 3}     axis * angle
+#   zyx     {... x 3}     angles (a, b, c) with R = Rz(c) @ Ry(b) @ Rx(a),
+#                         the convention of fk.batch_rot3d and get_euler
+#   rotmat  {... x 3 x 3}
+#   quat    {... x 4}     unit quaternion (w, x, y, z), w >= 0
+#   6d      {... x 6}     first two columns of the rotation matrix
+#                         (Zhou et al., On the Continuity of Rotation
+#                         Representations in Neural Networks)
+# Pose vectors such as {n_frames x 96} are reshaped to {n_frames x 32 x 3}
+# before converting.
+# ==============================
+
+REPRESENTATIONS = {"expmap": 1, "zyx": 1, "rotmat": 2, "quat": 1, "6d": 1}
+
+
+def _flatten(x, n_dims: int):
+    """
+    :return: x as {n x ...} float32, batch shape
+    """
+    x = np.asarray(x, dtype=np.float32)
+    batch_shape = x.shape[: x.ndim - n_dims]
+    return x.reshape((-1,) + x.shape[x.ndim - n_dims :]), batch_shape
+
+
+def _zyx2rotmat(e):
+    sa, sb, sc = np.sin(e[:, 0]), np.sin(e[:, 1]), np.sin(e[:, 2])
+    ca, cb, cc = np.cos(e[:, 0]), np.cos(e[:, 1]), np.cos(e[:, 2])
+    R = np.stack(
+        [
+            cb * cc,
+            cc * sb * sa - sc * ca,
+            cc * sb * ca + sc * sa,
+            cb * sc,
+            sc * sb * sa + cc * ca,
+            sc * sb * ca - cc * sa,
+            -sb,
+            cb * sa,
+            cb * ca,
+        ],
+        axis=1,
+    )
+    return R.reshape((-1, 3, 3))
+
+
+def _rotmat2zyx(R):
+    cos_b = np.hypot(R[:, 0, 0], R[:, 1, 0])
+    gimbal = cos_b < 1e-6
+    a = np.arctan2(R[:, 2, 1], R[:, 2, 2])
+    b = np.arctan2(-R[:, 2, 0], cos_b)
+    c = np.arctan2(R[:, 1, 0], R[:, 0, 0])
+    # cos(b) == 0: only a + c or a - c is defined, put everything into a
+    a = np.where(gimbal, np.arctan2(-R[:, 1, 2], R[:, 1, 1]), a)
+    c = np.where(gimbal, 0, c)
+    return np.stack([a, b, c], axis=1)
+
+
+def _rotmat2quat(R):
+    m00, m11, m22 = R[:, 0, 0], R[:, 1, 1], R[:, 2, 2]
+    trace = m00 + m11 + m22
+    # pick the numerically most stable of the four formulas per matrix
+    case = np.argmax(np.stack([trace, m00, m11, m22], axis=1), axis=1)
+    q = np.empty((len(R), 4), dtype=R.dtype)
+
+    sel = case == 0
+    s = np.sqrt(np.maximum(trace[sel] + 1, 0)) * 2
+    q[sel, 0] = 0.25 * s
+    q[sel, 1] = (R[sel, 2, 1] - R[sel, 1, 2]) / s
+    q[sel, 2] = (R[sel, 0, 2] - R[sel, 2, 0]) / s
+    q[sel, 3] = (R[sel, 1, 0] - R[sel, 0, 1]) / s
+
+    sel = case == 1
+    s = np.sqrt(np.maximum(1 + m00[sel] - m11[sel] - m22[sel], 0)) * 2
+    q[sel, 0] = (R[sel, 2, 1] - R[sel, 1, 2]) / s
+    q[sel, 1] = 0.25 * s
+    q[sel, 2] = (R[sel, 0, 1] + R[sel, 1, 0]) / s
+    q[sel, 3] = (R[sel, 0, 2] + R[sel, 2, 0]) / s
+
+    sel = case == 2
+    s = np.sqrt(np.maximum(1 + m11[sel] - m00[sel] - m22[sel], 0)) * 2
+    q[sel, 0] = (R[sel, 0, 2] - R[sel, 2, 0]) / s
+    q[sel, 1] = (R[sel, 0, 1] + R[sel, 1, 0]) / s
+    q[sel, 2] = 0.25 * s
+    q[sel, 3] = (R[sel, 1, 2] + R[sel, 2, 1]) / s
+
+    sel = case == 3
+    s = np.sqrt(np.maximum(1 + m22[sel] - m00[sel] - m11[sel], 0)) * 2
+    q[sel, 0] = (R[sel, 1, 0] - R[sel, 0, 1]) / s
+    q[sel, 1] = (R[sel, 0, 2] + R[sel, 2, 0]) / s
+    q[sel, 2] = (R[sel, 1, 2] + R[sel, 2, 1]) / s
+    q[sel, 3] = 0.25 * s
+
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    q[q[:, 0] < 0] *= -1
+    return q
+
+
+def _quat2rotmat(q):
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    R = np.stack(
+        [
+            1 - 2 * (y * y + z * z),
+            2 * (x * y - z * w),
+            2 * (x * z + y * w),
+            2 * (x * y + z * w),
+            1 - 2 * (x * x + z * z),
+            2 * (y * z - x * w),
+            2 * (x * z - y * w),
+            2 * (y * z + x * w),
+            1 - 2 * (x * x + y * y),
+        ],
+        axis=1,
+    )
+    return R.reshape((-1, 3, 3))
+
+
+def _quat2expmap(q):
+    q = q * np.where(q[:, 0] < 0, -1, 1).astype(q.dtype)[:, np.newaxis]
+    sin_half = np.linalg.norm(q[:, 1:], axis=1)
+    theta = 2 * np.arctan2(sin_half, q[:, 0])
+    # theta / sin(theta / 2) -> 2 for small angles
+    small = sin_half < 1e-6
+    scale = np.where(small, 2, theta / np.where(small, 1, sin_half))
+    return q[:, 1:] * scale[:, np.newaxis]
+
+
+def _expmap2quat(r):
+    theta = np.linalg.norm(r, axis=1)
+    # sin(theta / 2) / theta -> 1 / 2 for small angles
+    small = theta < 1e-6
+    scale = np.where(small, 0.5, np.sin(theta / 2) / np.where(small, 1, theta))
+    q = np.concatenate(
+        [np.cos(theta / 2)[:, np.newaxis], r * scale[:, np.newaxis]], axis=1
+    )
+    # angles above pi: same rotation as -q
+    q[q[:, 0] < 0] *= -1
+    return q
+
+
+def _rotmat2sixd(R):
+    return np.concatenate([R[:, :, 0], R[:, :, 1]], axis=1)
+
+
+def _sixd2rotmat(d):
+    a1 = d[:, 0:3]
+    a2 = d[:, 3:6]
+    b1 = a1 / np.linalg.norm(a1, axis=1, keepdims=True)
+    b2 = a2 - np.sum(b1 * a2, axis=1, keepdims=True) * b1
+    b2 = b2 / np.linalg.norm(b2, axis=1, keepdims=True)
+    b3 = np.cross(b1, b2)
+    return np.stack([b1, b2, b3], axis=2)
+
+
+TO_ROTMAT = {
+    "expmap": lambda r: batch_expmap2rotmat(r).astype(np.float32),
+    "zyx": _zyx2rotmat,
+    "quat": _quat2rotmat,
+    "6d": _sixd2rotmat,
+}
+FROM_ROTMAT = {
+    "expmap": lambda R: _quat2expmap(_rotmat2quat(R)),
+    "zyx": _rotmat2zyx,
+    "quat": _rotmat2quat,
+    "6d": _rotmat2sixd,
+}
+# conversions that do not need to go through the rotation matrix
+DIRECT = {
+    ("expmap", "quat"): _expmap2quat,
+    ("quat", "expmap"): _quat2expmap,
+}
+
+
+def convert(x, src: str, dst: str):
+    """
+    Converts rotations between any two REPRESENTATIONS
+    :param x: {... x src}
+    :return: {... x dst} float32
+    """
+    assert src in REPRESENTATIONS, "unknown representation:" + str(src)
+    assert dst in REPRESENTATIONS, "unknown representation:" + str(dst)
+    x, batch_shape = _flatten(x, REPRESENTATIONS[src])
+    if src == dst:
+        y = x.copy()
+    elif (src, dst) in DIRECT:
+        y = DIRECT[src, dst](x)
+    else:
+        R = x if src == "rotmat" else TO_ROTMAT[src](x)
+        y = R if dst == "rotmat" else FROM_ROTMAT[dst](R)
+    y = y.astype(np.float32, copy=False)
+    return y.reshape(batch_shape + y.shape[1:])
+
+
+def zyx2rotmat(e):
+    return convert(e, "zyx", "rotmat")
+
+
+def rotmat2zyx(R):
+    return convert(R, "rotmat", "zyx")
+
+
+def quat2rotmat(q):
+    return convert(q, "quat", "rotmat")
+
+
+def rotmat2quat(R):
+    return convert(R, "rotmat", "quat")
+
+
+def sixd2rotmat(d):
+    return convert(d, "6d", "rotmat")
+
+
+def rotmat2sixd(R):
+    return convert(R, "rotmat", "6d")
+
+
+def rotmat2expmap(R):
+    return convert(R, "rotmat", "expmap")
+
+
+def expmap2quat(r):
+    return convert(r, "expmap", "quat")
+
+
+def quat2expmap(q):
+    return convert(q, "quat", "expmap")
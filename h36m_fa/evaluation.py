@@ -0,0 +1,149 @@
+"""
+Batched pose error metrics with a per-action breakdown.
+
+All metrics work on stacks of poses {n_frames x n_joints x 3} (or
+{n_frames x 3 * n_joints}) and are returned in the unit of the inputs
+(meters for the poses of this package):
+    MPJPE       mean per-joint position error
+    PA-MPJPE    MPJPE after Procrustes alignment (rotation, translation
+                and scale) of every predicted frame to its target
+Per-class results average over the frames in which an action of the
+frame-wise labels (labels8/labels11) is active.
+"""
+import numpy as np
+from h36m_fa.labels import LabelStore
+
+
+def _as_joints(x):
+    x = np.asarray(x, dtype=np.float32)
+    if x.shape[-1] != 3:
+        x = x.reshape(x.shape[:-1] + (-1, 3))
+    return x
+
+
+def align(P, Q, scale=True):
+    """
+    Procrustes-aligns every frame of P to the same frame of Q
+    :param P: {n_frames x n_joints x 3}
+    :param Q: {n_frames x n_joints x 3}
+    :param scale: also fit a scale (False: rigid alignment as in kabsch)
+    :return: {n_frames x n_joints x 3}
+    """
+    P = _as_joints(P)
+    Q = _as_joints(Q)
+    assert P.shape == Q.shape, str(P.shape) + " & " + str(Q.shape)
+    P_centroid = P.mean(axis=1, keepdims=True)
+    Q_centroid = Q.mean(axis=1, keepdims=True)
+    P0 = P - P_centroid
+    Q0 = Q - Q_centroid
+    H = np.matmul(np.swapaxes(P0, 1, 2), Q0)
+    u, s, vh = np.linalg.svd(H)
+    # reflections: flip the axis of the smallest singular value
+    d = np.sign(np.linalg.det(np.matmul(u, vh)))
+    d = np.where(d == 0, 1, d)
+    s[:, 2] *= d
+    u[:, :, 2] *= d[:, np.newaxis]
+    R = np.matmul(u, vh)  # P0 @ R maps onto Q0
+    aligned = np.matmul(P0, R)
+    if scale:
+        norm = np.sum(P0 ** 2, axis=(1, 2))
+        c = s.sum(axis=1) / np.maximum(norm, np.finfo(np.float32).tiny)
+        aligned *= c[:, np.newaxis, np.newaxis]
+    return (aligned + Q_centroid).astype(np.float32)
+
+
+def joint_errors(pred, target):
+    """
+    :return: {n_frames x n_joints} euclidean distances
+    """
+    pred = _as_joints(pred)
+    target = _as_joints(target)
+    assert pred.shape == target.shape, str(pred.shape) + " & " + str(target.shape)
+    return np.linalg.norm(pred - target, axis=-1)
+
+
+def mpjpe(pred, target):
+    """
+    :return: {n_frames} mean per-joint position error of every frame
+    """
+    return joint_errors(pred, target).mean(axis=-1)
+
+
+def pa_mpjpe(pred, target, scale=True):
+    """
+    :return: {n_frames} MPJPE after Procrustes alignment of every frame
+    """
+    return mpjpe(align(pred, target, scale=scale), target)
+
+
+def per_class(errors, labels):
+    """
+    Averages frame-wise errors over the frames of every class in one
+    matrix product
+    :param errors: {n_frames} or {n_frames x ...}
+    :param labels: {n_frames x n_classes} multi-hot
+    :return: {n_classes} or {n_classes x ...} (nan for classes without
+        frames), {n_classes} number of frames per class
+    """
+    errors = np.asarray(errors, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.float64)
+    assert len(errors) == len(labels), str(errors.shape) + " & " + str(labels.shape)
+    flat = errors.reshape((len(errors), -1))
+    counts = labels.sum(axis=0)
+    sums = labels.T @ flat
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts[:, np.newaxis]
+    return means.reshape((labels.shape[1],) + errors.shape[1:]), counts.astype(np.int64)
+
+
+def stack_labels(keys, lengths, n_classes: int = 11, store=None):
+    """
+    Frame-wise labels that line up with predictions of the given
+    sequences concatenated in order
+    :param keys: [(actor, action, sid), ...]
+    :param lengths: number of predicted frames per sequence, the first
+        lengths[i] frames of sequence i are used
+    :return: {sum(lengths) x n_classes} uint8
+    """
+    store = LabelStore(n_classes=n_classes) if store is None else store
+    out = np.empty((int(np.sum(lengths)), store.n_classes), dtype=np.uint8)
+    start = 0
+    for (actor, action, sid), length in zip(keys, lengths):
+        lab = store.get(actor, action, sid)
+        assert len(lab) >= length, f"{actor} {action} {sid}: {len(lab)} < {length}"
+        out[start : start + length] = lab[:length]
+        start += length
+    return out
+
+
+def evaluate(pred, target, labels=None, scale=True):
+    """
+    :param pred: {n_frames x n_joints x 3}
+    :param target: {n_frames x n_joints x 3}
+    :param labels: optional {n_frames x n_classes} multi-hot, e.g. from
+        stack_labels
+    :return: {"mpjpe": float, "pa_mpjpe": float,
+              "per_joint": {n_joints}, "per_joint_pa": {n_joints},
+              "per_class": {"mpjpe": {n_classes}, "pa_mpjpe": {n_classes},
+                            "per_joint": {n_classes x n_joints},
+                            "n_frames": {n_classes}}}  (with labels only)
+    """
+    errors = joint_errors(pred, target)
+    errors_pa = joint_errors(align(pred, target, scale=scale), target)
+    result = {
+        "mpjpe": float(errors.mean()),
+        "pa_mpjpe": float(errors_pa.mean()),
+        "per_joint": errors.mean(axis=0),
+        "per_joint_pa": errors_pa.mean(axis=0),
+    }
+    if labels is not None:
+        n_joints = errors.shape[1]
+        # one product for all metrics: [joint errors | pa joint errors]
+        means, counts = per_class(np.concatenate([errors, errors_pa], axis=1), labels)
+        result["per_class"] = {
+            "mpjpe": means[:, :n_joints].mean(axis=1),
+            "pa_mpjpe": means[:, n_joints:].mean(axis=1),
+            "per_joint": means[:, :n_joints],
+            "n_frames": counts,
+        }
+    return result
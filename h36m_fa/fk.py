@@ -1,5 +1,9 @@
 import numpy as np
-from h36m_fa.mirror import mirror_p3d
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+import h36m_fa.conversion as conv
+import h36m_fa.instrument as IN
+from h36m_fa.mirror import mirror_p3d, PERMUTATION
 
 # -- hardcoded data --
 parent = (
@@ -147,6 +151,7 @@ bone_lengths = (
 )
 bone_lengths = bone_lengths.reshape((-1, 3)).astype("float32")
 assert len(parent) == len(bone_lengths)
+assert all(parent[jid] < jid for jid in range(len(parent))), "parents must come first"
 n_joints = len(parent)
 
 
@@ -167,6 +172,44 @@ def calculate_chain(parent, n_joints):
 chain_per_joint = calculate_chain(parent, n_joints=n_joints)
 
 
+# joint and axis order of the output of euler_fk: (x, z, y) and mirrored
+OUTPUT_JOINTS = PERMUTATION[n_joints]
+OUTPUT_AXES = [0, 2, 1]
+
+CHUNK_SIZE = 4096
+
+
+def _batch_frames(args, result):
+    """frames over all leading batch dimensions of the output"""
+    return result.size // (n_joints * 3)
+
+
+def _chain(Rs, out):
+    """
+    Accumulates the local rotations along the kinematic tree into the
+    joint positions, in the layout of euler_fk: joints are stored
+    parents-first, so one pass over the tree suffices, every joint
+    extends the accumulated rotation/position of its parent
+    :param Rs: {n x n_joints x 3 x 3} local rotations, accumulated in
+        their dtype
+    :param out: {n x n_joints x 3} float32
+    """
+    global_R = np.empty_like(Rs)
+    Pts3d = np.empty(out.shape, dtype=Rs.dtype)
+    for jid in range(n_joints):
+        pid = parent[jid]
+        if pid < 0:
+            Pts3d[:, jid] = bone_lengths[jid]
+            global_R[:, jid] = Rs[:, jid]
+        else:
+            p_R = global_R[:, pid]
+            Pts3d[:, jid] = np.matmul(bone_lengths[jid], p_R) + Pts3d[:, pid]
+            np.matmul(Rs[:, jid], p_R, out=global_R[:, jid])
+    out[:] = Pts3d[:, OUTPUT_JOINTS][:, :, OUTPUT_AXES]
+    np.negative(out[..., 0], out=out[..., 0])
+
+
+@IN.timed(frames="arg")
 def euler_fk(angles, inv_rot=False):
     """
     :param [n_batch x 3 * n_joints]
@@ -175,39 +218,120 @@ def euler_fk(angles, inv_rot=False):
     angles = np.reshape(angles, (-1, 3))
     Rs = batch_rot3d(angles, inv_rot=inv_rot)
     Rs = np.reshape(Rs, (n_batch, n_joints, 3, 3))
-    Pts3d = []
-    for jid in range(n_joints):
-        bone = bone_lengths[jid]
-        bone = np.tile(bone, n_batch)
-        bone = np.reshape(bone, (n_batch, 3))
-        bone = np.expand_dims(bone, axis=1)
-        chain = chain_per_joint[jid]
-
-        p_xyz = np.zeros((n_batch, 1, 3), dtype=np.float32)
-        p_R = np.tile(np.eye(3, dtype=np.float32), (n_batch, 1))
-        p_R = np.reshape(p_R, (n_batch, 3, 3))
-
-        for jid2 in chain:
-            cur_R = Rs[:, jid2]
-            cur_bone = bone_lengths[jid2]
-            cur_bone = np.tile(cur_bone, n_batch)
-            cur_bone = np.reshape(cur_bone, (n_batch, 3))
-            cur_bone = np.expand_dims(cur_bone, axis=1)
-            p_xyz = p_xyz + np.matmul(cur_bone, p_R)
-            p_R = np.matmul(cur_R, p_R)
-        xyz = np.matmul(bone, p_R) + p_xyz
-        xyz = np.reshape(xyz, (n_batch, 3))
-        Pts3d.append(xyz)
-
-    Pts3d = np.stack(Pts3d, axis=1).astype(np.float32)
-
-    Pts3d[:, :, (0, 1, 2)] = Pts3d[:, :, (0, 2, 1)]
-
-    Pts3d = mirror_p3d(Pts3d)
-
+    Pts3d = np.empty((n_batch, n_joints, 3), dtype=np.float32)
+    _chain(Rs, Pts3d)
     return Pts3d
 
 
+def chunked(fn, x, out, chunk_size=CHUNK_SIZE, n_threads=None):
+    """
+    Runs fn(x[a:b], out[a:b]) over chunks of the first axis, spread over
+    n_threads threads (numpy releases the GIL in the heavy operations)
+    """
+    n = len(x)
+    bounds = [(a, min(a + chunk_size, n)) for a in range(0, n, chunk_size)]
+    if n_threads is None:
+        n_threads = cpu_count() or 1
+    n_threads = min(n_threads, len(bounds))
+    if n_threads <= 1:
+        for a, b in bounds:
+            fn(x[a:b], out[a:b])
+        return out
+    with ThreadPoolExecutor(n_threads) as pool:
+        list(pool.map(lambda ab: fn(x[ab[0] : ab[1]], out[ab[0] : ab[1]]), bounds))
+    return out
+
+
+def _chunked_fk(fn, x, dim, out, chunk_size, n_threads):
+    """
+    :param x: {... x dim}
+    :return: out {... x n_joints x 3} float32, allocated if None
+    """
+    batch_shape = x.shape[:-1]
+    if out is None:
+        out = np.empty(batch_shape + (n_joints, 3), dtype=np.float32)
+    assert out.shape == batch_shape + (n_joints, 3), str(out.shape)
+    assert out.dtype == np.float32, str(out.dtype)
+    flat_out = out.reshape((-1, n_joints, 3))
+    assert np.shares_memory(flat_out, out) or out.size == 0, (
+        "out must flatten without a copy"
+    )
+    chunked(fn, x.reshape((-1, dim)), flat_out, chunk_size=chunk_size, n_threads=n_threads)
+    return out
+
+
+def _euler_fk_chunk(angles, out, inv_rot):
+    Rs = conv.zyx2rotmat(np.reshape(angles, (len(angles), n_joints, 3)))
+    if inv_rot:
+        Rs = np.swapaxes(Rs, -1, -2)
+    _chain(Rs, out)
+
+
+@IN.timed(frames=_batch_frames)
+def batch_euler_fk(angles, out=None, inv_rot=False, chunk_size=CHUNK_SIZE, n_threads=None):
+    """
+    float32 euler_fk for any number of leading batch dimensions. The input
+    is processed in chunks of chunk_size frames, so that the temporary
+    memory only depends on chunk_size * n_threads and not on the input.
+    :param angles: {... x 3 * n_joints}
+    :param out: optional preallocated {... x n_joints x 3} float32
+    :return: {... x n_joints x 3} float32
+    """
+    angles = np.asarray(angles)
+    assert angles.shape[-1] == 3 * n_joints, "dim is " + str(angles.shape[-1])
+    return _chunked_fk(
+        lambda x, y: _euler_fk_chunk(x, y, inv_rot),
+        angles,
+        3 * n_joints,
+        out,
+        chunk_size,
+        n_threads,
+    )
+
+
+def _expmap_fk_chunk(seq, out):
+    r = seq[:, 3:].reshape((len(seq), n_joints, 3)).copy()
+    r[:, 0] = 0  # like expmap2euler: no global rotation
+    _chain(conv.convert(r, "expmap", "rotmat"), out)
+
+
+@IN.timed(frames=_batch_frames)
+def expmap_fk(seq, out=None, chunk_size=CHUNK_SIZE, n_threads=None):
+    """
+    Forward kinematics straight from the expmap representation: the
+    rotations come from batched Rodrigues instead of the
+    expmap -> Euler -> rotation matrix round trip. The output matches
+    euler_fk(conversion.expmap2euler(seq)) only up to the float32 rounding
+    of the Euler angles (a few micrometers), so the stored artifacts
+    (poses.get3d_fixed_from_rotation) keep using the Euler path.
+    :param seq: {... x 99} as returned by poses.get_expmap
+    :param out: optional preallocated {... x n_joints x 3} float32
+    :return: {... x n_joints x 3} float32
+    """
+    seq = np.asarray(seq)
+    assert seq.shape[-1] == 99, "dim is " + str(seq.shape[-1])
+    return _chunked_fk(_expmap_fk_chunk, seq, 99, out, chunk_size, n_threads)
+
+
+@IN.timed(frames=_batch_frames)
+def rotmat_fk(Rs, out=None, chunk_size=CHUNK_SIZE, n_threads=None):
+    """
+    Forward kinematics of local joint rotation matrices, in the layout of
+    euler_fk
+    :param Rs: {... x n_joints x 3 x 3}
+    :param out: optional preallocated {... x n_joints x 3} float32
+    :return: {... x n_joints x 3} float32
+    """
+    Rs = np.asarray(Rs)
+    assert Rs.shape[-3:] == (n_joints, 3, 3), str(Rs.shape)
+    Rs = Rs.reshape(Rs.shape[:-3] + (n_joints * 9,))
+
+    def fn(x, y):
+        _chain(x.reshape((-1, n_joints, 3, 3)).astype(np.float32), y)
+
+    return _chunked_fk(fn, Rs, n_joints * 9, out, chunk_size, n_threads)
+
+
 def batch_rot3d(r, inv_rot=False):
     n_batch = np.shape(r)[0]
     const0 = np.zeros((n_batch,))
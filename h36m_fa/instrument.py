@@ -0,0 +1,202 @@
+"""
+Opt-in stage timing for data acquisition and loading.
+
+Disabled by default: every instrumented call then costs a single flag
+check. Enable it with the H36M_FA_INSTRUMENT=1 environment variable or
+instrument.enable(), run the workload and read instrument.report():
+    {"stages": {"poses.get_euler": {"calls": 210, "seconds": 12.3,
+                                    "frames": 1.2e6, "bytes": 0, ...}},
+     "cache": CACHE.stats()}
+Stage times are inclusive: "poses.get3d_fixed" contains the time of the
+conversion, fk, kabsch and I/O stages it calls. frames counts the frames
+that were processed, bytes the bytes that were read from or written to
+disk. Stages that run in acquire.run worker processes are collected and
+merged into the report of the calling process.
+
+External profilers can be attached with add_hook, e.g.
+    instrument.add_hook(torch.profiler.record_function)
+    instrument.add_hook(lambda name: nvtx.annotate(name))
+every hook is called with the stage name and must return a context
+manager that is entered for the duration of the stage.
+"""
+import json
+import functools
+import threading
+from contextlib import ExitStack, contextmanager
+from os import environ
+from time import perf_counter
+
+from h36m_fa.cache import CACHE
+
+ENABLED = environ.get("H36M_FA_INSTRUMENT", "0") not in ["", "0"]
+
+HOOKS = []
+
+_stages = {}
+_lock = threading.Lock()
+
+
+class Span:
+    """
+    counters of one running stage, set frames and nbytes inside the stage
+    """
+
+    __slots__ = ["frames", "nbytes"]
+
+    def __init__(self):
+        self.frames = 0
+        self.nbytes = 0
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+
+
+def add_hook(hook):
+    HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    HOOKS.remove(hook)
+
+
+def _record(name, seconds, calls, frames, nbytes):
+    with _lock:
+        entry = _stages.get(name)
+        if entry is None:
+            entry = _stages[name] = {"calls": 0, "seconds": 0.0, "frames": 0, "bytes": 0}
+        entry["calls"] += calls
+        entry["seconds"] += seconds
+        entry["frames"] += frames
+        entry["bytes"] += nbytes
+
+
+@contextmanager
+def _stage(name):
+    span = Span()
+    with ExitStack() as hooks:
+        for hook in HOOKS:
+            hooks.enter_context(hook(name))
+        start = perf_counter()
+        try:
+            yield span
+        finally:
+            _record(name, perf_counter() - start, 1, span.frames, span.nbytes)
+
+
+def stage(name: str):
+    """
+    with instrument.stage("name") as span:
+        ...
+        span.frames += n_frames
+    """
+    if not ENABLED:
+        return _null_stage()
+    return _stage(name)
+
+
+@contextmanager
+def _null_stage():
+    yield Span()
+
+
+def _count(spec, args, result):
+    if spec is None:
+        return 0
+    if spec == "arg":
+        return len(args[0])
+    if spec == "result":
+        return len(result)
+    if callable(spec):
+        return spec(args, result)
+    return spec
+
+
+def timed(name=None, frames=None):
+    """
+    Decorator that records every call as a stage
+    :param name: stage name, defaults to module.function
+    :param frames: number of frames per call: "arg" (len of the first
+        argument), "result" (len of the result), a function
+        frames(args, result), an int or None
+    """
+
+    def decorator(fn):
+        stage_name = name
+        if stage_name is None:
+            stage_name = fn.__module__.split(".")[-1] + "." + fn.__name__
+
+        @functools.wraps(fn)
+        def timed_fn(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _stage(stage_name) as span:
+                result = fn(*args, **kwargs)
+                span.frames += _count(frames, args, result)
+            return result
+
+        return timed_fn
+
+    return decorator
+
+
+def stages():
+    """
+    :return: {name: {"calls", "seconds", "frames", "bytes", "fps", "MiB/s"}}
+        sorted by decreasing time
+    """
+    with _lock:
+        items = [(name, dict(entry)) for name, entry in _stages.items()]
+    items.sort(key=lambda item: -item[1]["seconds"])
+    for _, entry in items:
+        seconds = max(entry["seconds"], 1e-12)
+        entry["fps"] = entry["frames"] / seconds
+        entry["MiB/s"] = entry["bytes"] / seconds / 2 ** 20
+    return dict(items)
+
+
+def report():
+    return {"stages": stages(), "cache": CACHE.stats()}
+
+
+def report_json(fname=None):
+    """
+    :return: the report as JSON string, also written to fname if given
+    """
+    text = json.dumps(report(), indent=2)
+    if fname is not None:
+        with open(fname, "w") as f:
+            f.write(text)
+    return text
+
+
+def merge(other_stages: dict):
+    """
+    Adds the stages of another report, e.g. from a worker process
+    """
+    for name, entry in other_stages.items():
+        _record(name, entry["seconds"], entry["calls"], entry["frames"], entry["bytes"])
+
+
+def summary():
+    """
+    :return: the stages as a human-readable table
+    """
+    lines = [f"{'stage':<40}{'calls':>8}{'seconds':>10}{'fps':>14}{'MiB/s':>10}"]
+    for name, entry in stages().items():
+        lines.append(
+            f"{name:<40}{entry['calls']:>8}{entry['seconds']:>10.3f}"
+            f"{entry['fps']:>14,.0f}{entry['MiB/s']:>10.1f}"
+        )
+    return "\n".join(lines)
@@ -1,74 +1,121 @@
+"""
+Kabsch alignment of joint sets.
+
+float32 and float64 inputs are processed in their own precision without
+copies (other dtypes are converted to float32). The numba kernels live in
+h36m_fa.kabsch_kernels and are imported, compiled and cached on disk on
+first use; run
+```
+python -m h36m_fa.kabsch
+```
+once (e.g. when building a container image) to compile them ahead of time.
+"""
 import numpy as np
-import numba as nb
-import numpy.linalg as la
+import h36m_fa.instrument as IN
+
+
+def _kernels():
+    import h36m_fa.kabsch_kernels as KK
+
+    return KK
+
+
+def _dtype(P, Q):
+    dtype = np.result_type(P.dtype, Q.dtype)
+    if dtype != np.float64:
+        dtype = np.float32
+    return dtype
 
 
 def __preprocess_PQ(P, Q):
     """mold P, Q so that they properly fit into the numba functions"""
+    P = np.asarray(P)
+    Q = np.asarray(Q)
     if len(P.shape) == 1:
         P = P.reshape((-1, 3))
     if len(Q.shape) == 1:
         Q = Q.reshape((-1, 3))
     assert len(P.shape) == 2 and len(Q.shape) == 2, str(P.shape) + " & " + str(Q.shape)
     assert P.shape == Q.shape, str(P.shape) + " & " + str(Q.shape)
+    dtype = _dtype(P, Q)
+    P = np.ascontiguousarray(P, dtype=dtype)
+    Q = np.ascontiguousarray(Q, dtype=dtype)
+    return P, Q
+
 
-    if P.dtype != np.float32:
-        P = P.astype(np.float32)
-    if Q.dtype != np.float32:
-        Q = Q.astype(np.float32)
+def __preprocess_PQ_batch(P, Q):
+    """mold stacks of P, Q so that they properly fit into the numba functions"""
+    P = np.asarray(P)
+    Q = np.asarray(Q)
+    dtype = _dtype(P, Q)
+    P = np.ascontiguousarray(np.reshape(P, (len(P), -1, 3)), dtype=dtype)
+    Q = np.ascontiguousarray(np.reshape(Q, (len(Q), -1, 3)), dtype=dtype)
+    assert P.shape == Q.shape, str(P.shape) + " & " + str(Q.shape)
     return P, Q
 
 
+@IN.timed(frames=1)
 def kabsch(P, Q):
     """
     :param P: {n_joints x 3}
     :param Q: {n_joints x 3}
+    :return: {3 x 3}
     """
     P, Q = __preprocess_PQ(P, Q)
-    return _kabsch(P, Q)
+    return _kernels().kabsch(P, Q)
 
 
+@IN.timed(frames=1)
 def rotate_P_to_Q(P, Q):
     """
     :param P: {n_joints x 3}
     :param Q: {n_joints x 3}
     """
     P, Q = __preprocess_PQ(P, Q)
-    return _rotate_P_to_Q(P, Q)
+    return _kernels().rotate_P_to_Q(P, Q)
 
 
-@nb.njit(nb.float32[:, :](nb.float32[:, :], nb.float32[:, :]), nogil=True)
-def _kabsch(P, Q):
+@IN.timed(frames="arg")
+def kabsch_batch(P, Q):
     """
-    :param P: {n_joints x 3}
-    :param Q: {n_joints x 3}
+    :param P: {n_frames x n_joints x 3}
+    :param Q: {n_frames x n_joints x 3}
+    :return: {n_frames x 3 x 3}
     """
-    n_joints = P.shape[0]
-    P_centroid = np.sum(P, axis=0) / n_joints
-    Q_centroid = np.sum(Q, axis=0) / n_joints
-    P = P - P_centroid
-    Q = Q - Q_centroid
-    H = np.transpose(P) @ Q
-    u, _, vh = la.svd(H)
-    v = np.transpose(vh)
-    uh = np.transpose(u)
-    d = la.det(v @ uh)
-    D = np.array([1, 0, 0, 0, 1, 0, 0, 0, d], dtype=np.float32).reshape((3, 3))
-    R = v @ D @ uh
-    return R
-
-
-@nb.njit(nb.float32[:, :](nb.float32[:, :], nb.float32[:, :]), nogil=True)
-def _rotate_P_to_Q(P, Q):
+    P, Q = __preprocess_PQ_batch(P, Q)
+    return _kernels().kabsch_batch(P, Q)
+
+
+@IN.timed(frames="arg")
+def rotate_P_to_Q_batch(P, Q):
     """
-    :param P: {n_joints x 3}
-    :param Q: {n_joints x 3}
+    :param P: {n_frames x n_joints x 3}
+    :param Q: {n_frames x n_joints x 3}
+    :return: {n_frames x n_joints x 3}
+    """
+    P, Q = __preprocess_PQ_batch(P, Q)
+    return _kernels().rotate_P_to_Q_batch(P, Q)
+
+
+def warmup(dtypes=(np.float32, np.float64)):
+    """
+    Compiles (or loads from the disk cache) all kernels for the given
+    dtypes, for all combinations of writable and read-only (e.g. cached)
+    inputs
     """
-    n_joints = P.shape[0]
-    translate_p = np.sum(P, axis=0) / n_joints
-    translate_q = np.sum(Q, axis=0) / n_joints
-    R = np.ascontiguousarray(_kabsch(P, Q))
-    P = P - translate_p
-    P = P @ np.transpose(R)
-    P += translate_q
-    return P
\ No newline at end of file
+    rng = np.random.default_rng(0)
+    for dtype in dtypes:
+        for P_writeable in [True, False]:
+            for Q_writeable in [True, False]:
+                P = rng.normal(size=(2, 32, 3)).astype(dtype)
+                Q = rng.normal(size=(2, 32, 3)).astype(dtype)
+                P.flags.writeable = P_writeable
+                Q.flags.writeable = Q_writeable
+                kabsch(P[0], Q[0])
+                rotate_P_to_Q(P[0], Q[0])
+                kabsch_batch(P, Q)
+                rotate_P_to_Q_batch(P, Q)
+
+
+if __name__ == "__main__":
+    warmup()
@@ -0,0 +1,84 @@
+"""
+numba kernels of h36m_fa.kabsch.
+
+This module is only imported on the first Kabsch call, so that importing
+the package does not pay for numba. The kernels are compiled lazily for
+the dtypes they are called with (float32 or float64) and cached on disk
+(__pycache__, or NUMBA_CACHE_DIR if the package directory is read-only),
+so that every later process only loads the machine code.
+
+With the tbb threading layer, processes that launched the parallel
+kernels from other threads than the main thread can hang at exit. The
+package itself only launches them from the calling thread (bulk.load
+generates missing sequences there); if you generate sequences from your
+own threads, select another layer, e.g. NUMBA_THREADING_LAYER=omp.
+"""
+import numpy as np
+import numba as nb
+import numpy.linalg as la
+
+
+@nb.njit(nogil=True, cache=True)
+def kabsch(P, Q):
+    """
+    :param P: {n_joints x 3}
+    :param Q: {n_joints x 3}
+    """
+    n_joints = P.shape[0]
+    P_centroid = np.sum(P, axis=0) / n_joints
+    Q_centroid = np.sum(Q, axis=0) / n_joints
+    P = P - P_centroid
+    Q = Q - Q_centroid
+    H = np.transpose(P) @ Q
+    u, _, vh = la.svd(H)
+    v = np.transpose(vh)
+    uh = np.transpose(u)
+    d = la.det(v @ uh)
+    D = np.zeros_like(H)
+    D[0, 0] = 1
+    D[1, 1] = 1
+    D[2, 2] = d
+    R = v @ D @ uh
+    return R
+
+
+@nb.njit(nogil=True, cache=True)
+def rotate_P_to_Q(P, Q):
+    """
+    :param P: {n_joints x 3}
+    :param Q: {n_joints x 3}
+    """
+    n_joints = P.shape[0]
+    translate_p = np.sum(P, axis=0) / n_joints
+    translate_q = np.sum(Q, axis=0) / n_joints
+    R = np.ascontiguousarray(kabsch(P, Q))
+    P = P - translate_p
+    P = P @ np.transpose(R)
+    P += translate_q
+    return P
+
+
+@nb.njit(nogil=True, parallel=True, cache=True)
+def kabsch_batch(P, Q):
+    """
+    :param P: {n_frames x n_joints x 3}
+    :param Q: {n_frames x n_joints x 3}
+    """
+    n_frames = P.shape[0]
+    R = np.empty((n_frames, 3, 3), dtype=P.dtype)
+    for i in nb.prange(n_frames):
+        R[i] = kabsch(P[i], Q[i])
+    return R
+
+
+@nb.njit(nogil=True, parallel=True, cache=True)
+def rotate_P_to_Q_batch(P, Q):
+    """
+    :param P: {n_frames x n_joints x 3}
+    :param Q: {n_frames x n_joints x 3}
+    """
+    n_frames = P.shape[0]
+    out = np.empty_like(P)
+    for i in nb.prange(n_frames):
+        out[i] = rotate_P_to_Q(P[i], Q[i])
+    return out
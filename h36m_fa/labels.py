@@ -0,0 +1,87 @@
+"""
+Packed frame-wise action labels.
+
+Every label set is stored as two files in h36m_fa/data:
+    labels{n}.npy   {n_frames_total x ceil(n / 8)} uint8, one bit per action
+    labels{n}.json  {"n_classes": n, "index": {"S1_walking_1": [start, length]}}
+The packed array is memory-mapped on first access and only the requested
+sequence is decoded, so importing is cheap and untouched sequences are
+never read from disk.
+
+The files are generated from data/label*.txt via
+preprocessing/labels_to_binary.py
+"""
+import json
+import numpy as np
+from os.path import join, dirname, abspath
+
+DATA_DIR = join(dirname(abspath(__file__)), "data")
+
+
+def key(actor, action, sid):
+    return f"{actor}_{action}_{sid}"
+
+
+class LabelStore:
+    def __init__(self, n_classes: int, data_dir: str = DATA_DIR):
+        self.n_classes = n_classes
+        self.data_dir = data_dir
+        self._packed = None
+        self._index = None
+
+    @property
+    def index(self):
+        """
+        {"actor_action_sid": (start, length)}
+        """
+        if self._index is None:
+            fname = join(self.data_dir, f"labels{self.n_classes}.json")
+            with open(fname, "r") as f:
+                meta = json.load(f)
+            assert meta["n_classes"] == self.n_classes, str(meta["n_classes"])
+            self._index = {k: tuple(v) for k, v in meta["index"].items()}
+        return self._index
+
+    @property
+    def packed(self):
+        """
+        {n_frames_total x ceil(n_classes / 8)} memory-mapped bits
+        """
+        if self._packed is None:
+            fname = join(self.data_dir, f"labels{self.n_classes}.npy")
+            self._packed = np.load(fname, mmap_mode="r")
+        return self._packed
+
+    def span(self, actor, action, sid):
+        """
+        :return: (start, length) of the sequence in the packed array
+        """
+        return self.index[key(actor, action, sid)]
+
+    def get(self, actor, action, sid):
+        """
+        :return: {n_frames x n_classes} uint8 multi-hot labels
+        """
+        start, length = self.span(actor, action, sid)
+        bits = self.packed[start : start + length]
+        return np.unpackbits(bits, axis=1, count=self.n_classes)
+
+
+def pack(labels: dict, n_classes: int, data_dir: str = DATA_DIR):
+    """
+    Writes a label store
+    :param labels: {"actor_action_sid": {n_frames x n_classes}}
+    """
+    index = {}
+    packed = []
+    start = 0
+    for name, lab in labels.items():
+        lab = np.asarray(lab)
+        assert lab.ndim == 2 and lab.shape[1] == n_classes, name + str(lab.shape)
+        packed.append(np.packbits(lab.astype(np.uint8), axis=1))
+        index[name] = [start, len(lab)]
+        start += len(lab)
+    packed = np.concatenate(packed, axis=0)
+    np.save(join(data_dir, f"labels{n_classes}.npy"), packed)
+    with open(join(data_dir, f"labels{n_classes}.json"), "w") as f:
+        json.dump({"n_classes": n_classes, "index": index}, f)
@@ -0,0 +1,350 @@
+"""
+Content-hashed records of the derived directories.
+
+Every artifact of the derived directories (euler/,
+fixed_skeleton_from_rotation/, fixed_skeleton/) has a record
+    {data_dir}/{kind}/.manifest/{name}.json
+with the hash of the output and the hashes of its inputs (source expmap
+text, the official 3D keypoints, upstream artifacts) together with a code
+hash: the pipeline version, the source of the modules and poses functions
+that compute the artifact and, where forward kinematics is involved, the
+fk.parent/fk.bone_lengths tables. An artifact is stale when any of these
+changed. The poses.acquire*/get* functions write the record whenever they
+generate an artifact; one file per artifact so that concurrent workers
+never overwrite each other's records.
+
+Hashes are only recomputed for files whose size or mtime differ from the
+recorded ones, so verifying the whole tree costs a few stats per file;
+pass deep=True (--deep) to rehash everything. verify never writes: the
+records of touched but unchanged files are refreshed by rebuild.
+
+Call this as follows:
+```
+(/{your_path}/h36m_framewise_actions)$ python -m h36m_fa.manifest verify {data_dir} [--deep]
+(/{your_path}/h36m_framewise_actions)$ python -m h36m_fa.manifest rebuild {data_dir} [--workers 8]
+(/{your_path}/h36m_framewise_actions)$ python -m h36m_fa.manifest record {data_dir}
+```
+verify exits with 1 if any existing artifact is outdated, rebuild
+recomputes exactly those artifacts (artifacts that were never generated
+are left to the poses loaders) and record adopts the existing outputs as
+they are (e.g. trees generated before records existed).
+"""
+import sys
+import json
+import inspect
+import hashlib
+import argparse
+import numpy as np
+from os import stat, remove, replace, makedirs
+from os.path import join, dirname, abspath, isfile
+import h36m_fa.fk as FK
+import h36m_fa.acquire as ACQ
+import h36m_fa.txtcache as TC
+
+# bump to invalidate all artifacts, e.g. when the output format changes
+PIPELINE_VERSION = 1
+
+MANIFEST_DIR = ".manifest"
+PACKAGE_DIR = dirname(abspath(__file__))
+HASH_BLOCK = 2 ** 20
+
+# in dependency order: an artifact may depend on the kinds before it
+ARTIFACTS = {
+    "euler": {
+        "ext": ".npy",
+        "inputs": ["expmap"],
+        "code": ["conversion.py"],
+        "functions": ["acquire_euler_sequence"],
+        "tables": False,
+        "task": "acquire_euler_sequence",
+    },
+    "fixed_skeleton_from_rotation": {
+        "ext": ".npy",
+        "inputs": ["euler"],
+        "code": ["fk.py", "mirror.py"],
+        "functions": ["get3d_fixed_from_rotation"],
+        "tables": True,
+        "task": "acquire_fixed_skeleton_from_rotation_sequence",
+    },
+    "fixed_skeleton": {
+        "ext": ".txt",
+        "inputs": ["fixed_skeleton_from_rotation", "3d"],
+        "code": ["kabsch.py", "kabsch_kernels.py", "txtcache.py"],
+        "functions": ["acquire_fixed_skeleton_sequence"],
+        "tables": False,
+        "task": "acquire_fixed_skeleton_sequence",
+    },
+}
+
+# statuses of existing artifacts that rebuild recomputes
+OUTDATED = ["unrecorded", "modified", "stale"]
+
+
+def artifact_name(actor, action, sid, kind):
+    return actor + "_" + action + "_" + str(sid) + ARTIFACTS[kind]["ext"]
+
+
+def input_path(actor, action, sid, source):
+    """
+    :param source: "expmap", "3d" or a kind of ARTIFACTS
+    :return: path relative to data_dir
+    """
+    if source == "expmap":
+        return join("exp_dir/h3.6m/dataset", actor, action + "_" + str(sid) + ".txt")
+    if source == "3d":
+        return f"{actor}_{action}_{sid}.npy"
+    return join(source, artifact_name(actor, action, sid, source))
+
+
+def hash_file(fname: str):
+    h = hashlib.blake2b(digest_size=16)
+    with open(fname, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def code_hash(kind: str):
+    """
+    :return: hash of everything besides the inputs that determines the
+        artifacts of this kind (upstream kinds are covered by the hashes
+        of their outputs)
+    """
+    import h36m_fa.poses as poses  # poses imports this module
+
+    spec = ARTIFACTS[kind]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{PIPELINE_VERSION}:{kind}".encode())
+    for module in spec["code"]:
+        with open(join(PACKAGE_DIR, module), "rb") as f:
+            h.update(module.encode())
+            h.update(f.read())
+    for function in spec["functions"]:
+        h.update(inspect.getsource(getattr(poses, function)).encode())
+    if spec["tables"]:
+        h.update(np.ascontiguousarray(FK.parent).tobytes())
+        h.update(np.ascontiguousarray(FK.bone_lengths).tobytes())
+    return h.hexdigest()
+
+
+def fingerprint(fname: str, recorded=None, deep=False):
+    """
+    :param recorded: previous fingerprint of fname, its hash is reused if
+        size and mtime are unchanged
+    :return: {"size": .., "mtime_ns": .., "hash": ..} or None if fname
+        does not exist
+    """
+    try:
+        st = stat(fname)
+    except FileNotFoundError:
+        return None
+    fp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if (
+        not deep
+        and recorded is not None
+        and recorded["size"] == fp["size"]
+        and recorded["mtime_ns"] == fp["mtime_ns"]
+    ):
+        fp["hash"] = recorded["hash"]
+    else:
+        fp["hash"] = hash_file(fname)
+    return fp
+
+
+def record_name(data_dir: str, kind: str, name: str):
+    return join(data_dir, kind, MANIFEST_DIR, name + ".json")
+
+
+def load(data_dir: str, kind: str, name: str):
+    """
+    :return: {"code": .., "output": fingerprint, "inputs": {path:
+        fingerprint}} or None if the artifact has no (readable) record
+    """
+    fname = record_name(data_dir, kind, name)
+    if isfile(fname):
+        try:
+            with open(fname, "r") as f:
+                return json.load(f)
+        except ValueError:
+            pass
+    return None
+
+
+def save(data_dir: str, kind: str, name: str, entry: dict):
+    fname = record_name(data_dir, kind, name)
+    makedirs(dirname(fname), exist_ok=True)
+    tmp = ACQ.tmp_name(fname)
+    with open(tmp, "w") as f:
+        json.dump(entry, f, indent=1, sort_keys=True)
+    replace(tmp, fname)
+
+
+def _status(data_dir, key, kind, entry, code, deep):
+    """
+    :return: status, fresh entry (None unless the artifact is "ok")
+    """
+    actor, action, sid = key
+    spec = ARTIFACTS[kind]
+    inputs = {}
+    for source in spec["inputs"]:
+        path = input_path(actor, action, sid, source)
+        recorded = None if entry is None else entry["inputs"].get(path)
+        fp = fingerprint(join(data_dir, path), recorded, deep)
+        if fp is None and source not in ARTIFACTS:
+            return "no input", None
+        inputs[path] = fp
+    output = join(data_dir, kind, artifact_name(actor, action, sid, kind))
+    if not isfile(output):
+        return "missing", None
+    if entry is None:
+        return "unrecorded", None
+    if any(fp is None for fp in inputs.values()):
+        # an upstream artifact was deleted
+        return "stale", None
+    fp = fingerprint(output, entry["output"], deep)
+    if fp["hash"] != entry["output"]["hash"]:
+        return "modified", None
+    if entry["code"] != code:
+        return "stale", None
+    if set(inputs) != set(entry["inputs"]) or any(
+        fp_in["hash"] != entry["inputs"][path]["hash"] for path, fp_in in inputs.items()
+    ):
+        return "stale", None
+    return "ok", {"code": code, "output": fp, "inputs": inputs}
+
+
+def check(data_dir: str, kind: str, keys=None, deep=False, refresh=False):
+    """
+    :param keys: [(actor, action, sid), ...], defaults to all sequences
+    :param refresh: update the records of "ok" artifacts whose files were
+        touched but not changed, so that they are not rehashed next time;
+        False never writes
+    :return: {(actor, action, sid): status} with status one of "ok",
+        "missing" (not generated yet), "no input" (source data missing),
+        "unrecorded" (generated without a record), "modified" (output
+        changed since it was recorded), "stale" (inputs or code changed,
+        or an upstream artifact is outdated)
+    """
+    import h36m_fa.poses as poses
+
+    data_dir = abspath(data_dir)
+    keys = poses.all_sequences() if keys is None else [tuple(k) for k in keys]
+    code = code_hash(kind)
+    # an artifact is only as fresh as the artifacts it was computed from
+    upstream = [
+        check(data_dir, source, keys, deep=deep, refresh=refresh)
+        for source in ARTIFACTS[kind]["inputs"]
+        if source in ARTIFACTS
+    ]
+    statuses = {}
+    for key in keys:
+        name = artifact_name(*key, kind)
+        entry = load(data_dir, kind, name)
+        status, fresh = _status(data_dir, key, kind, entry, code, deep)
+        if status == "ok" and any(s[key] in OUTDATED for s in upstream):
+            status, fresh = "stale", None
+        statuses[key] = status
+        if refresh and fresh is not None and fresh != entry:
+            save(data_dir, kind, name, fresh)
+    return statuses
+
+
+def record(data_dir: str, kind: str, keys):
+    """
+    Records the current outputs of keys and their inputs as up-to-date
+    """
+    data_dir = abspath(data_dir)
+    code = code_hash(kind)
+    spec = ARTIFACTS[kind]
+    for actor, action, sid in keys:
+        name = artifact_name(actor, action, sid, kind)
+        output = fingerprint(join(data_dir, kind, name))
+        if output is None:
+            continue
+        inputs = {}
+        for source in spec["inputs"]:
+            path = input_path(actor, action, sid, source)
+            inputs[path] = fingerprint(join(data_dir, path))
+        if any(fp is None for fp in inputs.values()):
+            continue
+        save(data_dir, kind, name, {"code": code, "output": output, "inputs": inputs})
+
+
+def _remove(fname: str):
+    paths = [fname]
+    if fname.endswith(".txt"):
+        paths += [TC.shadow_name(fname), TC.shadow_name(fname) + ".src"]
+    for path in paths:
+        if isfile(path):
+            remove(path)
+
+
+def rebuild(data_dir: str, kinds=None, n_workers=None):
+    """
+    Recomputes every OUTDATED artifact (kinds are processed in dependency
+    order, so that rebuilt inputs propagate downstream)
+    :return: {kind: number of rebuilt artifacts}
+    """
+    import h36m_fa.poses as poses
+    from h36m_fa.cache import CACHE
+
+    data_dir = abspath(data_dir)
+    kinds = list(ARTIFACTS) if kinds is None else kinds
+    rebuilt = {}
+    for kind in ARTIFACTS:
+        if kind not in kinds:
+            continue
+        statuses = check(data_dir, kind, refresh=True)
+        todo = [key for key, status in statuses.items() if status in OUTDATED]
+        rebuilt[kind] = len(todo)
+        if len(todo) == 0:
+            continue
+        print(f"[manifest] rebuild {len(todo)} of {len(statuses)}:", join(data_dir, kind))
+        for key in todo:
+            _remove(join(data_dir, kind, artifact_name(*key, kind)))
+        CACHE.clear()
+        # the tasks record what they generate
+        ACQ.run(
+            getattr(poses, ARTIFACTS[kind]["task"]),
+            todo,
+            data_dir,
+            n_workers=n_workers,
+            desc=kind,
+        )
+    return rebuilt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="records of the derived directories")
+    parser.add_argument("command", choices=["verify", "rebuild", "record"])
+    parser.add_argument("data_dir")
+    parser.add_argument("--kinds", nargs="+", default=list(ARTIFACTS), choices=ARTIFACTS)
+    parser.add_argument("--deep", action="store_true", help="rehash all files")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild(args.data_dir, args.kinds, n_workers=args.workers)
+        return
+    if args.command == "record":
+        import h36m_fa.poses as poses
+
+        for kind in args.kinds:
+            record(args.data_dir, kind, poses.all_sequences())
+        return
+    failed = False
+    for kind in args.kinds:
+        statuses = check(args.data_dir, kind, deep=args.deep)
+        counts = {}
+        for key, status in statuses.items():
+            counts[status] = counts.get(status, 0) + 1
+            if status in OUTDATED:
+                failed = True
+                print(f"{status:>10} {kind}/{artifact_name(*key, kind)}")
+        print(f"[manifest] {kind}:", ", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,99 @@
 import numpy as np
-import numba as nb
-from mocap.math.quaternion import qfix
+import h36m_fa.instrument as IN
+
+LS_32 = [6, 7, 8, 9, 10, 16, 17, 18, 19, 20, 21, 22, 23]
+RS_32 = [1, 2, 3, 4, 5, 24, 25, 26, 27, 28, 29, 30, 31]
+LS_17 = [4, 5, 6, 11, 12, 13]
+RS_17 = [1, 2, 3, 14, 15, 16]
+
+
+def _swap_permutation(n_joints, LS, RS):
+    perm = np.arange(n_joints)
+    perm[LS] = RS
+    perm[RS] = LS
+    return perm
+
+
+# joint jid of a mirrored pose is joint PERMUTATION[n_joints][jid] of the original
+PERMUTATION = {
+    32: _swap_permutation(32, LS_32, RS_32),
+    17: _swap_permutation(17, LS_17, RS_17),
+}
+SIDES = {32: (LS_32, RS_32), 17: (LS_17, RS_17)}
 
 
-@nb.jit(nb.float32[:, :, :](nb.float32[:, :, :]), nopython=True, nogil=True)
 def reflect_over_x(seq):
     """reflect sequence over x-y (exchange left-right)
     INPLACE
+    :param seq: [... x 3]
     """
-    I = np.array([[-1, 0, 0], [0, 1, 0], [0, 0, 1]], np.float32)
-    # ensure we do not fuck up memory
-    for frame in range(len(seq)):
-        person = seq[frame]
-        for jid in range(len(person)):
-            pt3d = np.ascontiguousarray(person[jid])
-            seq[frame, jid] = I @ pt3d
+    np.negative(seq[..., 0], out=seq[..., 0])
     return seq
 
 
-def mirror_p3d(seq):
+def _swap_sides(x, n_joints, inplace):
+    """swaps left and right joints along axis -2"""
+    if inplace:
+        LS, RS = SIDES[n_joints]
+        left = x[..., LS, :].copy()
+        x[..., LS, :] = x[..., RS, :]
+        x[..., RS, :] = left
+        return x
+    return x[..., PERMUTATION[n_joints], :]
+
+
+@IN.timed(frames="arg")
+def mirror_p3d(seq, inplace=False):
     """
-    :param seq: [n_frames, 32*3]
+    :param seq: [... x 32*3] or [... x 32 x 3] (or 17 joints)
+    :param inplace: mirror seq itself instead of a copy (only possible
+        if seq can be viewed as [... x n_joints x 3])
+    :return: [... x n_joints x 3]
     """
-    if len(seq.shape) == 2:
-        n_joints = seq.shape[1] // 3
-    elif len(seq.shape) == 3:
-        n_joints = seq.shape[1]
+    seq = np.asarray(seq)
+    if seq.ndim >= 2 and seq.shape[-1] == 3 and seq.shape[-2] in PERMUTATION:
+        n_joints = seq.shape[-2]
+        x = seq
+    elif seq.ndim >= 1 and seq.shape[-1] % 3 == 0:
+        n_joints = seq.shape[-1] // 3
+        x = seq.reshape(seq.shape[:-1] + (n_joints, 3))
     else:
         raise ValueError("incorrect shape:" + str(seq.shape))
 
-    assert n_joints in [32, 17], "wrong joint number:" + str(n_joints)
+    assert n_joints in PERMUTATION, "wrong joint number:" + str(n_joints)
 
-    if n_joints == 32:
-        LS = [6, 7, 8, 9, 10, 16, 17, 18, 19, 20, 21, 22, 23]
-        RS = [1, 2, 3, 4, 5, 24, 25, 26, 27, 28, 29, 30, 31]
-    elif n_joints == 17:
-        LS = [4, 5, 6, 11, 12, 13]
-        RS = [1, 2, 3, 14, 15, 16]
+    if inplace:
+        assert np.shares_memory(x, seq), "cannot mirror inplace: reshape copies"
+    x = _swap_sides(x, n_joints, inplace)
+    return reflect_over_x(x)
 
-    lr = np.array(LS + RS)
-    rl = np.array(RS + LS)
-    n_frames = len(seq)
-    x = seq.reshape((n_frames, -1, 3))
-    x_copy = x.copy()
-    x = reflect_over_x(x_copy)
-    x[:, lr] = x[:, rl]
-    return x
 
+def qfix(q, inplace=False):
+    """
+    Enforces quaternion continuity over time by flipping each quaternion
+    into the hemisphere of its predecessor (q and -q are the same rotation)
+    :param q: [... x n_frames x n_joints x 4]
+    """
+    result = q if inplace else q.copy()
+    dot = np.sum(q[..., 1:, :, :] * q[..., :-1, :, :], axis=-1)
+    flip = np.cumsum(dot < 0, axis=-2) % 2 == 1
+    result[..., 1:, :, :][flip] *= -1
+    return result
 
-def mirror_quaternion(seq):
+
+def mirror_quaternion(seq, inplace=False):
     """
-    :param seq: [n_frames x 32*4]
+    :param seq: [... x n_frames x 32*4] or [... x n_frames x 32 x 4]
+    :param inplace: mirror seq itself instead of a copy
     :return:
     """
-    flatten = False
-    n_frames = seq.shape[0]
-    if len(seq.shape) == 2:
-        flatten = True
-        seq = seq.reshape((n_frames, 32, 4))
-    joints_left = [1, 2, 3, 4, 5, 24, 25, 26, 27, 28, 29, 30, 31]
-    joints_right = [6, 7, 8, 9, 10, 16, 17, 18, 19, 20, 21, 22, 23]
-    seq_mirror = seq.copy()
-    seq_mirror[:, joints_left] = seq[:, joints_right]
-    seq_mirror[:, joints_right] = seq[:, joints_left]
-    seq_mirror[:, :, [2, 3]] *= -1
-    seq_mirror = qfix(seq_mirror)
+    flatten = seq.shape[-1] != 4
+    if flatten:
+        seq = seq.reshape(seq.shape[:-1] + (32, 4))
+    assert seq.shape[-2] == 32, "wrong joint number:" + str(seq.shape)
+    seq_mirror = _swap_sides(seq, 32, inplace)
+    seq_mirror[..., 2:4] *= -1
+    seq_mirror = qfix(seq_mirror, inplace=True)
     if flatten:
-        seq_mirror = seq_mirror.reshape((n_frames, -1))
-    return seq_mirror
\ No newline at end of file
+        seq_mirror = seq_mirror.reshape(seq_mirror.shape[:-2] + (-1,))
+    return seq_mirror
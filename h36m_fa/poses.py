@@ -4,10 +4,13 @@ from os import makedirs
 import h36m_fa.conversion as conv
 import h36m_fa.fk as FK
 import h36m_fa.kabsch as KB
+import h36m_fa.acquire as ACQ
+import h36m_fa.txtcache as TC
+import h36m_fa.instrument as IN
+import h36m_fa.manifest as MF
+from h36m_fa.cache import cached
 from h36m_fa.mirror import reflect_over_x, mirror_p3d
 
-from tqdm import tqdm
-
 
 ACTORS = ["S1", "S5", "S6", "S7", "S8", "S9", "S11"]
 ACTIONS = [
@@ -29,6 +32,8 @@ ACTIONS = [
 ]
 
 
+@cached
+@IN.timed(frames="result")
 def get3d(actor: str, action: str, sid: int, data_dir: str):
     """
     Returns the official Human3.6M dataset 3D keypoints.
@@ -37,28 +42,25 @@ def get3d(actor: str, action: str, sid: int, data_dir: str):
     """
     data_dir = abspath(data_dir)
     fname = join(data_dir, f"{actor}_{action}_{sid}.npy")
-    return np.load(fname)
+    return ACQ.load(fname)
 
 
+@cached
+@IN.timed(frames="result")
 def get3d_fixed(actor, action, sid, data_dir: str):
     """"""
     data_dir = abspath(data_dir)
-    acquire_fixed_skeleton(data_dir)
-    fname_binary = join(
-        join(data_dir, "fixed_skeleton"), actor + "_" + action + "_" + str(sid) + ".npy"
+    fname = join(
+        join(data_dir, "fixed_skeleton"),
+        actor + "_" + action + "_" + str(sid) + ".txt",
     )
-    if isfile(fname_binary):
-        seq = np.load(fname_binary)
-    else:
-        fname = join(
-            join(data_dir, "fixed_skeleton"),
-            actor + "_" + action + "_" + str(sid) + ".txt",
-        )
-        seq = np.loadtxt(fname, dtype=np.float32)
-        np.save(fname_binary, seq)
-    return seq
+    if not isfile(fname):
+        acquire_fixed_skeleton_sequence(actor, action, sid, data_dir)
+    return TC.loadtxt(fname)
 
 
+@cached
+@IN.timed(frames="result")
 def get_expmap(actor, action, sid, data_dir: str):
     """
     ExpMap representation as provided in Martinez et al.
@@ -74,51 +76,58 @@ def get_expmap(actor, action, sid, data_dir: str):
         print("preprocessing/process_h36m.py")
         print("exiting...")
         exit()
-    seq = np.loadtxt(fname, delimiter=",", dtype=np.float32)
+    seq = TC.loadtxt(fname, delimiter=",")
     return seq
 
 
+@cached
+@IN.timed(frames="result")
 def get_euler(actor, action, sid, data_dir: str):
     """
     Euler Angle representation.
     """
     data_dir = abspath(data_dir)
-    acquire_euler(data_dir)
     fname = join(
         join(data_dir, "euler"), actor + "_" + action + "_" + str(sid) + ".npy"
     )
-    return np.load(fname)
-
-
-CACHE_get3d_fixed_from_rotation = {}
+    if not isfile(fname):
+        acquire_euler_sequence(actor, action, sid, data_dir)
+    return ACQ.load(fname)
 
 
+@cached
+@IN.timed(frames="result")
 def get3d_fixed_from_rotation(actor, action, sid, data_dir):
+    data_dir = abspath(data_dir)
     loc = join(data_dir, "fixed_skeleton_from_rotation")
-    fname = join(loc, actor + "_" + action + "_" + str(sid) + ".txt")
+    fname = join(loc, actor + "_" + action + "_" + str(sid) + ".npy")
     if isfile(fname):
-        seq = np.load(fname)
-        n_frames = len(seq)
-        seq = seq.reshape((n_frames, -1))
-        return seq
+        seq = ACQ.load(fname)
     else:
         if not isdir(loc):
-            makedirs(loc)
-        global CACHE_get3d_fixed_from_rotation
-        if (actor, action, sid) not in CACHE_get3d_fixed_from_rotation:
-            seq = get_euler(actor, action, sid, data_dir)
-            seq = FK.euler_fk(seq)
-            seq = reflect_over_x(seq)
-            seq = mirror_p3d(
-                seq
-            )  # there are some mirroring issues in the original rotational data:
-            # https://github.com/una-dinosauria/human-motion-prediction/issues/46
-            seq = seq.astype("float32")
-            np.save(fname, seq)
-            n_frames = len(seq)
-            seq = seq.reshape((n_frames, -1))
-            CACHE_get3d_fixed_from_rotation[actor, action, sid] = seq
-        return CACHE_get3d_fixed_from_rotation[actor, action, sid]
+            makedirs(loc, exist_ok=True)
+        seq = get_euler(actor, action, sid, data_dir)
+        seq = FK.euler_fk(seq)
+        seq = reflect_over_x(seq)
+        seq = mirror_p3d(
+            seq
+        )  # there are some mirroring issues in the original rotational data:
+        # https://github.com/una-dinosauria/human-motion-prediction/issues/46
+        seq = seq.astype("float32")
+        ACQ.atomic_save(fname, seq)
+        MF.record(data_dir, "fixed_skeleton_from_rotation", [(actor, action, sid)])
+    n_frames = len(seq)
+    seq = seq.reshape((n_frames, -1))
+    return seq
+
+
+REPRESENTATIONS = {
+    "3d": get3d,
+    "expmap": get_expmap,
+    "euler": get_euler,
+    "fixed_skeleton": get3d_fixed,
+    "fixed_skeleton_from_rotation": get3d_fixed_from_rotation,
+}
 
 
 # ==============================
@@ -126,71 +135,109 @@ def get3d_fixed_from_rotation(actor, action, sid, data_dir):
 # ==============================
 
 
-def acquire_fixed_skeleton(data_dir: str):
-    data_dir_orig = data_dir
-    acquire_euler(data_dir)
-    data_dir = join(data_dir, "fixed_skeleton")
-    if not isdir(data_dir):
-        print("[mocap][Human3.6M] generate fixed skeletons:", data_dir)
-        makedirs(data_dir)
-        for actor in ACTORS:
-            print("\thandle actor ", actor)
-            for action in tqdm(ACTIONS):
-                for sid in [1, 2]:
-                    fname = join(
-                        data_dir, actor + "_" + action + "_" + str(sid) + ".txt"
-                    )
-                    seq1 = get3d_fixed_from_rotation(actor, action, sid, data_dir_orig)
-                    seq2 = get3d(actor, action, sid, data_dir_orig)
-                    assert len(seq1) == len(seq2), (
-                        actor
-                        + " "
-                        + action
-                        + " -> "
-                        + str(seq1.shape)
-                        + "|"
-                        + str(seq2.shape)
-                    )
-
-                    seq1_ = []
-                    for p, q in zip(seq1, seq2):
-                        p = KB.rotate_P_to_Q(p, q)
-                        seq1_.append(p)
-                    n_frames = len(seq1)
-                    seq1 = np.reshape(seq1_, (n_frames, -1))
-                    np.savetxt(fname, seq1)
-
-
-def acquire_fixed_skeleton_from_rotation(data_dir: str):
-    acquire_euler(data_dir)
-    data_dir = join(data_dir, "fixed_skeleton_from_rotation")
-    if not isdir(data_dir):
-        print("[mocap][Human3.6M] generate fixed skeletons from rotation:", data_dir)
-        makedirs(data_dir)
-        for actor in ACTORS:
-            print("\thandle actor ", actor)
-            for action in tqdm(ACTIONS):
-                for sid in [1, 2]:
-                    fname = join(
-                        data_dir, actor + "_" + action + "_" + str(sid) + ".npy"
-                    )
-                    seq1 = get3d_fixed_from_rotation(actor, action, sid, data_dir)
-                    np.save(fname, seq1)
-
-
-def acquire_euler(data_dir: str):
+def all_sequences():
+    return [
+        (actor, action, sid) for actor in ACTORS for action in ACTIONS for sid in [1, 2]
+    ]
+
+
+def acquire_fixed_skeleton_sequence(actor, action, sid, data_dir: str):
+    data_dir = abspath(data_dir)
+    loc = join(data_dir, "fixed_skeleton")
+    fname = join(loc, actor + "_" + action + "_" + str(sid) + ".txt")
+    if isfile(fname):
+        return
+    makedirs(loc, exist_ok=True)
+    seq1 = get3d_fixed_from_rotation(actor, action, sid, data_dir)
+    seq2 = get3d(actor, action, sid, data_dir)
+    assert len(seq1) == len(seq2), (
+        actor + " " + action + " -> " + str(seq1.shape) + "|" + str(seq2.shape)
+    )
+    n_frames = len(seq1)
+    seq1 = KB.rotate_P_to_Q_batch(seq1, seq2)
+    seq1 = np.reshape(seq1, (n_frames, -1))
+    TC.savetxt(fname, seq1)
+    MF.record(data_dir, "fixed_skeleton", [(actor, action, sid)])
+
+
+def acquire_fixed_skeleton_from_rotation_sequence(actor, action, sid, data_dir: str):
+    get3d_fixed_from_rotation(actor, action, sid, data_dir)
+
+
+def acquire_euler_sequence(actor, action, sid, data_dir: str):
+    data_dir = abspath(data_dir)
+    euler_dir = join(data_dir, "euler")
+    fname = join(euler_dir, actor + "_" + action + "_" + str(sid) + ".npy")
+    if isfile(fname):
+        return
+    makedirs(euler_dir, exist_ok=True)
+    exp_seq = get_expmap(actor, action, sid, data_dir)
+    euler_seq = conv.expmap2euler(exp_seq).astype("float32")
+    ACQ.atomic_save(fname, euler_seq)
+    MF.record(data_dir, "euler", [(actor, action, sid)])
+
+
+def acquire_fixed_skeleton(data_dir: str, n_workers=None):
+    """
+    Generates all missing fixed skeletons, resuming interrupted runs.
+    Outdated ones are regenerated by manifest.rebuild.
+    """
+    data_dir = abspath(data_dir)
+    acquire_euler(data_dir, n_workers=n_workers)
+    loc = join(data_dir, "fixed_skeleton")
+    missing = [
+        (actor, action, sid)
+        for actor, action, sid in all_sequences()
+        if not isfile(join(loc, actor + "_" + action + "_" + str(sid) + ".txt"))
+    ]
+    if len(missing) > 0:
+        print("[mocap][Human3.6M] generate fixed skeletons:", loc)
+    ACQ.run(
+        acquire_fixed_skeleton_sequence,
+        missing,
+        data_dir,
+        n_workers=n_workers,
+        desc="fixed skeleton",
+    )
+
+
+def acquire_fixed_skeleton_from_rotation(data_dir: str, n_workers=None):
+    """
+    Generates all missing fixed skeletons from rotation, resuming
+    interrupted runs.
+    """
+    data_dir = abspath(data_dir)
+    acquire_euler(data_dir, n_workers=n_workers)
+    loc = join(data_dir, "fixed_skeleton_from_rotation")
+    missing = [
+        (actor, action, sid)
+        for actor, action, sid in all_sequences()
+        if not isfile(join(loc, actor + "_" + action + "_" + str(sid) + ".npy"))
+    ]
+    if len(missing) > 0:
+        print("[mocap][Human3.6M] generate fixed skeletons from rotation:", loc)
+    ACQ.run(
+        acquire_fixed_skeleton_from_rotation_sequence,
+        missing,
+        data_dir,
+        n_workers=n_workers,
+        desc="fixed skeleton from rotation",
+    )
+
+
+def acquire_euler(data_dir: str, n_workers=None):
+    """
+    Extracts all missing euler sequences, resuming interrupted runs.
+    """
+    data_dir = abspath(data_dir)
     euler_dir = join(data_dir, "euler")
-    if not isdir(euler_dir):
-        makedirs(euler_dir)
-    for actor in ACTORS:
-        for action in ACTIONS:
-            for sid in [1, 2]:
-                fname = join(euler_dir, actor + "_" + action + "_" + str(sid) + ".npy")
-                if not isfile(fname):
-                    print(
-                        "[data aquisition] - h36m - extract euler ",
-                        (actor, action, sid),
-                    )
-                    exp_seq = get_expmap(actor, action, sid, data_dir)
-                    euler_seq = conv.expmap2euler(exp_seq).astype("float32")
-                    np.save(fname, euler_seq)
\ No newline at end of file
+    missing = [
+        (actor, action, sid)
+        for actor, action, sid in all_sequences()
+        if not isfile(join(euler_dir, actor + "_" + action + "_" + str(sid) + ".npy"))
+    ]
+    if len(missing) > 0:
+        print("[data aquisition] - h36m - extract euler:", euler_dir)
+    ACQ.run(
+        acquire_euler_sequence, missing, data_dir, n_workers=n_workers, desc="euler"
+    )
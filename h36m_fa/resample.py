@@ -0,0 +1,158 @@
+"""
+Frame-rate resampling of poses and their frame-wise labels.
+
+The Human3.6M sources are recorded at 50 Hz. Output frame i is taken at
+source time i * factor with factor = 50 / rate. Integer factors pick
+every factor-th frame, fractional factors interpolate between the two
+neighbouring frames: linearly for positions, by quaternion slerp for the
+Euler representation. Labels are pooled over the source frames
+[round(i * factor), round((i + 1) * factor)) of every output frame.
+"""
+import numpy as np
+import h36m_fa.conversion as conv
+from h36m_fa.cache import CACHE, cached
+from h36m_fa.labels import LabelStore
+
+SOURCE_RATE = 50
+
+RULES = ["any", "majority", "fraction"]
+
+
+def factor_of(rate, src_rate=SOURCE_RATE):
+    factor = src_rate / rate
+    assert factor >= 1, "upsampling is not supported: " + str(rate)
+    return factor
+
+
+def _is_integer(factor):
+    return abs(factor - round(factor)) < 1e-9
+
+
+def n_resampled(n_frames: int, factor):
+    return int(np.floor((n_frames - 1) / factor + 1e-9)) + 1
+
+
+def _neighbours(n_frames: int, factor):
+    t = np.arange(n_resampled(n_frames, factor)) * factor
+    i0 = np.minimum(np.floor(t + 1e-9).astype(np.int64), n_frames - 1)
+    i1 = np.minimum(i0 + 1, n_frames - 1)
+    w = np.clip(t - i0, 0, 1)
+    return i0, i1, w
+
+
+def resample_poses(seq, factor):
+    """
+    :param seq: {n_frames x ...} positions (or any linear quantity)
+    """
+    if _is_integer(factor):
+        return np.ascontiguousarray(seq[:: int(round(factor))])
+    i0, i1, w = _neighbours(len(seq), factor)
+    w = w.reshape((-1,) + (1,) * (seq.ndim - 1)).astype(np.float32)
+    return ((1 - w) * seq[i0] + w * seq[i1]).astype(np.float32)
+
+
+def slerp(q0, q1, w):
+    """
+    :param q0: {n x 4}
+    :param q1: {n x 4}
+    :param w: {n} interpolation weights in [0, 1]
+    """
+    dot = np.sum(q0 * q1, axis=1)
+    q1 = np.where((dot < 0)[:, np.newaxis], -q1, q1)
+    dot = np.abs(dot)
+    theta = np.arccos(np.clip(dot, -1, 1))
+    sin = np.sin(theta)
+    # nearly identical rotations: fall back to (normalized) lerp
+    near = sin < 1e-6
+    safe_sin = np.where(near, 1, sin)
+    w0 = np.where(near, 1 - w, np.sin((1 - w) * theta) / safe_sin)
+    w1 = np.where(near, w, np.sin(w * theta) / safe_sin)
+    q = w0[:, np.newaxis] * q0 + w1[:, np.newaxis] * q1
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def resample_euler(seq, factor):
+    """
+    :param seq: {n_frames x 3 * n_joints} as returned by poses.get_euler
+    """
+    if _is_integer(factor):
+        return np.ascontiguousarray(seq[:: int(round(factor))])
+    n_frames, dim = seq.shape
+    n_joints = dim // 3
+    i0, i1, w = _neighbours(n_frames, factor)
+    q = conv.convert(np.reshape(seq, (n_frames, n_joints, 3)), "zyx", "quat")
+    w = np.repeat(w, n_joints)
+    q = slerp(q[i0].reshape((-1, 4)), q[i1].reshape((-1, 4)), w)
+    euler = conv.convert(q, "quat", "zyx")
+    return euler.reshape((-1, dim)).astype(np.float32)
+
+
+def resample_labels(lab, factor, rule="any", threshold=0.5):
+    """
+    :param lab: {n_frames x n_classes} multi-hot labels
+    :param rule: "any": active if active in any pooled frame,
+        "majority": active in more than threshold of the pooled frames,
+        "fraction": the float32 fraction of pooled frames that are active
+    """
+    assert rule in RULES, "unknown rule:" + str(rule)
+    n_frames = len(lab)
+    n_out = n_resampled(n_frames, factor)
+    edges = np.round(np.arange(n_out + 1) * factor).astype(np.int64)
+    edges = np.minimum(edges, n_frames)
+    lo = edges[:-1]
+    hi = np.maximum(edges[1:], lo + 1)
+    cumsum = np.zeros((n_frames + 1, lab.shape[1]), dtype=np.int64)
+    np.cumsum(lab, axis=0, out=cumsum[1:])
+    counts = cumsum[hi] - cumsum[lo]
+    if rule == "any":
+        return (counts > 0).astype(lab.dtype)
+    fraction = counts / (hi - lo)[:, np.newaxis]
+    if rule == "majority":
+        return (fraction > threshold).astype(lab.dtype)
+    return fraction.astype(np.float32)
+
+
+def resampled(loader, rate, euler=False):
+    """
+    Wraps a loader(actor, action, sid, data_dir) so that it returns the
+    sequences at the given rate; results are cached per rate.
+    :param euler: True if the loader returns Euler angles (e.g.
+        poses.get_euler), so that they are interpolated as rotations
+    """
+    factor = factor_of(rate)
+    resample = resample_euler if euler else resample_poses
+
+    def resampled_loader(actor, action, sid, data_dir):
+        return resample(loader(actor, action, sid, data_dir), factor)
+
+    resampled_loader.__name__ = f"{loader.__name__}@{rate}"
+    return cached(resampled_loader)
+
+
+class ResampledLabels:
+    def __init__(self, n_classes: int, rate, rule="any", threshold=0.5):
+        """
+        Drop-in for LabelStore.get at another frame rate
+        """
+        self.store = LabelStore(n_classes=n_classes)
+        self.n_classes = n_classes
+        self.factor = factor_of(rate)
+        self.rate = rate
+        self.rule = rule
+        self.threshold = threshold
+
+    def get(self, actor, action, sid):
+        key = (
+            f"labels{self.n_classes}@{self.rate}",
+            self.rule,
+            self.threshold,
+            actor,
+            action,
+            str(sid),
+        )
+        lab = CACHE.get(key)
+        if lab is None:
+            lab = self.store.get(actor, action, sid)
+            lab = resample_labels(lab, self.factor, self.rule, self.threshold)
+            lab = CACHE.put(key, lab)
+        return lab
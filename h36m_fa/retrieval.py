@@ -0,0 +1,176 @@
+"""
+Nearest-neighbour retrieval of similar poses across Human3.6M.
+
+Poses are canonicalized (root joint at the origin and, by default,
+rotated about the vertical axis so that the hips face the same way),
+reduced with PCA and put into a KD-tree. Queries first fetch
+k * oversample candidates from the tree and then rank them by their
+distance in the full pose space.
+
+An index is saved as plain .npy arrays plus a small JSON file and loaded
+with memory mapping, so that opening it is cheap and several processes
+share the pages; only the KD-tree over the (small) reduced poses is
+rebuilt on load. Requires scipy.
+"""
+import json
+import numpy as np
+from os import makedirs, replace
+from os.path import join, isdir
+import h36m_fa.bulk as bulk
+import h36m_fa.poses as poses
+from h36m_fa.labels import LabelStore
+
+ROOT = 0
+LEFT_HIP = 6
+RIGHT_HIP = 1
+# vertical axis of the fixed-skeleton poses
+UP = 2
+
+ARRAYS = ["mean", "components", "reduced", "poses", "seq_ids", "frames"]
+
+
+def canonicalize(seq, yaw=True):
+    """
+    :param seq: {n x 96} or {n x 32 x 3}
+    :param yaw: also remove the rotation about the vertical axis
+    :return: {n x 96} float32, root-centered
+    """
+    seq = np.asarray(seq, dtype=np.float32).reshape((-1, 32, 3))
+    seq = seq - seq[:, ROOT : ROOT + 1]
+    if yaw:
+        axes = [a for a in range(3) if a != UP]
+        hips = seq[:, LEFT_HIP] - seq[:, RIGHT_HIP]
+        angle = np.arctan2(hips[:, axes[1]], hips[:, axes[0]])
+        cos = np.cos(angle)[:, np.newaxis]
+        sin = np.sin(angle)[:, np.newaxis]
+        a = seq[:, :, axes[0]].copy()
+        b = seq[:, :, axes[1]]
+        seq[:, :, axes[0]] = cos * a + sin * b
+        seq[:, :, axes[1]] = cos * b - sin * a
+    return seq.reshape((len(seq), -1))
+
+
+class PoseIndex:
+    def __init__(self, arrays: dict, keys, yaw=True):
+        """
+        Use PoseIndex.build or PoseIndex.load
+        """
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.keys = [tuple(k) for k in keys]
+        self.yaw = yaw
+        self._tree = None
+        self._label_stores = {}
+
+    def __len__(self):
+        return len(self.frames)
+
+    @staticmethod
+    def build(data_dir: str, keys=None, n_components=24, yaw=True, representation="fixed_skeleton"):
+        """
+        :param keys: [(actor, action, sid), ...], defaults to all sequences
+        :param n_components: PCA dimensions of the KD-tree
+        """
+        keys = poses.all_sequences() if keys is None else [tuple(k) for k in keys]
+        frames, offsets = bulk.load(keys, representation, data_dir)
+        X = canonicalize(frames, yaw=yaw)
+        del frames
+        lengths = np.diff(offsets)
+        seq_ids = np.repeat(np.arange(len(keys), dtype=np.int32), lengths)
+        frame_ids = (np.arange(len(X)) - np.repeat(offsets[:-1], lengths)).astype(np.int32)
+
+        mean = X.mean(axis=0, dtype=np.float64)
+        cov = np.cov(X, rowvar=False, dtype=np.float64)
+        eigval, eigvec = np.linalg.eigh(cov)
+        components = eigvec[:, ::-1][:, :n_components].T.copy()
+        reduced = (X - mean) @ components.T
+        arrays = {
+            "mean": mean,
+            "components": components,
+            "reduced": np.ascontiguousarray(reduced, dtype=np.float64),
+            "poses": X,
+            "seq_ids": seq_ids,
+            "frames": frame_ids,
+        }
+        return PoseIndex(arrays, keys, yaw=yaw)
+
+    def save(self, index_dir: str):
+        if not isdir(index_dir):
+            makedirs(index_dir)
+        for name in ARRAYS:
+            fname = join(index_dir, name + ".npy")
+            np.save(fname + ".tmp.npy", getattr(self, name))
+            replace(fname + ".tmp.npy", fname)
+        fname = join(index_dir, "index.json")
+        with open(fname + ".tmp", "w") as f:
+            json.dump({"keys": self.keys, "yaw": self.yaw}, f)
+        replace(fname + ".tmp", fname)
+
+    @staticmethod
+    def load(index_dir: str, mmap=True):
+        with open(join(index_dir, "index.json"), "r") as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            name: np.load(join(index_dir, name + ".npy"), mmap_mode=mmap_mode)
+            for name in ARRAYS
+        }
+        return PoseIndex(arrays, meta["keys"], yaw=meta["yaw"])
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            from scipy.spatial import cKDTree
+
+            self._tree = cKDTree(self.reduced, copy_data=False)
+        return self._tree
+
+    def search(self, query, k=5, oversample=4):
+        """
+        :param query: {m x 96} or {m x 32 x 3} poses (not canonicalized)
+        :return: {m x k} sequence ids (index into self.keys),
+            {m x k} frames, {m x k} distances in the full pose space
+        """
+        Q = canonicalize(query, yaw=self.yaw)
+        n_candidates = min(k * oversample, len(self))
+        _, candidates = self.tree.query((Q - self.mean) @ self.components.T, k=n_candidates)
+        candidates = candidates.reshape((len(Q), n_candidates))
+        distances = np.linalg.norm(self.poses[candidates] - Q[:, np.newaxis], axis=-1)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        best = np.take_along_axis(candidates, order, axis=1)
+        distances = np.take_along_axis(distances, order, axis=1)
+        return self.seq_ids[best], self.frames[best], distances
+
+    def labels(self, seq_ids, frames, n_classes: int = 11):
+        """
+        :return: {... x n_classes} uint8 labels at the given frames (zero
+            for frames beyond the labelled range)
+        """
+        store = self._label_stores.get(n_classes)
+        if store is None:
+            store = self._label_stores[n_classes] = LabelStore(n_classes=n_classes)
+        seq_ids = np.asarray(seq_ids)
+        frames = np.asarray(frames)
+        spans = np.array([store.span(*k) for k in self.keys], dtype=np.int64)
+        start = spans[seq_ids, 0]
+        valid = frames < spans[seq_ids, 1]
+        rows = np.where(valid, start + frames, 0)
+        bits = np.unpackbits(store.packed[rows.reshape(-1)], axis=1, count=n_classes)
+        bits = bits.reshape(frames.shape + (n_classes,))
+        bits[~valid] = 0
+        return bits
+
+    def query(self, query, k=5, n_classes: int = 11, oversample=4):
+        """
+        :return: [[(actor, action, sid, frame, distance), ...k], ...m],
+            {m x k x n_classes} labels at the retrieved frames
+        """
+        seq_ids, frames, distances = self.search(query, k=k, oversample=oversample)
+        results = [
+            [
+                self.keys[s] + (int(f), float(d))
+                for s, f, d in zip(seq_ids[i], frames[i], distances[i])
+            ]
+            for i in range(len(seq_ids))
+        ]
+        return results, self.labels(seq_ids, frames, n_classes=n_classes)
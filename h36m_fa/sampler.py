@@ -0,0 +1,155 @@
+"""
+Class-balanced sampling of window starts over the frame-wise labels.
+
+Every window of `length` frames is labelled by the actions that are
+active at its center frame. A draw first picks a class from an alias
+table over the class weights and then a uniformly random window whose
+center frame shows that class, so every draw is O(1). With the default
+"balanced" weights every class is drawn equally often, regardless of how
+many frames it covers. Windows whose center frame shows several classes
+can be reached through each of them.
+
+Draws are reproducible: sample(n, seed, epoch) is a fixed sequence and
+shard i of n_shards receives every n_shards-th element of it, so the
+shards of all workers together are exactly the single-process stream.
+"""
+import numpy as np
+import h36m_fa.poses as poses
+from h36m_fa.labels import LabelStore
+
+
+class AliasTable:
+    def __init__(self, weights):
+        """
+        Walker/Vose alias table: draws index i with probability
+        weights[i] / sum(weights) in O(1)
+        :param weights: {n} non-negative
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        assert weights.ndim == 1 and np.all(weights >= 0), str(weights)
+        total = weights.sum()
+        assert total > 0, "all weights are zero"
+        n = len(weights)
+        scaled = weights * n / total
+        self.prob = np.ones(n, dtype=np.float64)
+        self.alias = np.arange(n, dtype=np.int64)
+        small = [i for i in range(n) if scaled[i] < 1]
+        large = [i for i in range(n) if scaled[i] >= 1]
+        while len(small) > 0 and len(large) > 0:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            if scaled[l] < 1:
+                small.append(l)
+            else:
+                large.append(l)
+        # leftovers are 1 up to rounding
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, rng, n):
+        """
+        :return: {n} int64 indices
+        """
+        i = rng.integers(0, len(self.prob), size=n)
+        keep = rng.random(n) < self.prob[i]
+        return np.where(keep, i, self.alias[i])
+
+
+class BalancedSampler:
+    def __init__(
+        self, length: int = 1, n_classes: int = 11, weights="balanced", keys=None, store=None
+    ):
+        """
+        :param length: number of frames per window
+        :param n_classes: 8 or 11, selects the label set
+        :param weights: "balanced" (every class equally often),
+            "frequency" (proportional to the frames of a class, i.e.
+            uniform over labelled windows) or {n_classes} custom weights
+        :param keys: [(actor, action, sid), ...], defaults to all sequences
+        """
+        assert length > 0, str(length)
+        store = LabelStore(n_classes=n_classes) if store is None else store
+        self.n_classes = store.n_classes
+        self.length = length
+        self.keys = poses.all_sequences() if keys is None else [tuple(k) for k in keys]
+
+        labels = np.unpackbits(store.packed, axis=1, count=self.n_classes)
+        seq_starts = []
+        seq_lengths = []
+        for actor, action, sid in self.keys:
+            start, n_frames = store.span(actor, action, sid)
+            seq_starts.append(start)
+            seq_lengths.append(n_frames)
+        self.seq_starts = np.array(seq_starts, dtype=np.int64)
+        self.seq_lengths = np.array(seq_lengths, dtype=np.int64)
+
+        # global frame index of the center of every valid window
+        centers = []
+        seq_ids = []
+        for i, (start, n_frames) in enumerate(zip(self.seq_starts, self.seq_lengths)):
+            n_windows = max(n_frames - length + 1, 0)
+            centers.append(start + length // 2 + np.arange(n_windows, dtype=np.int64))
+            seq_ids.append(np.full(n_windows, i, dtype=np.int32))
+        centers = np.concatenate(centers)
+        seq_ids = np.concatenate(seq_ids)
+        active = labels[centers].astype(bool)
+
+        # per class: the windows whose center shows it, packed by class
+        cls, window = np.nonzero(active.T)
+        self.class_offsets = np.zeros(self.n_classes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cls, minlength=self.n_classes), out=self.class_offsets[1:])
+        self.window_seq = seq_ids[window]
+        self.window_start = (
+            centers[window] - length // 2 - self.seq_starts[self.window_seq]
+        )
+        self.counts = np.diff(self.class_offsets)
+
+        if isinstance(weights, str):
+            assert weights in ["balanced", "frequency"], "unknown weights:" + weights
+            if weights == "balanced":
+                weights = (self.counts > 0).astype(np.float64)
+            else:
+                weights = self.counts.astype(np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        assert weights.shape == (self.n_classes,), str(weights.shape)
+        # classes without windows cannot be drawn
+        self.weights = np.where(self.counts > 0, weights, 0)
+        self.table = AliasTable(self.weights)
+
+    def draw(self, rng, n: int):
+        """
+        :return: {n} class, {n} sequence id (index into self.keys),
+            {n} start frame of the window within its sequence
+        """
+        cls = self.table.draw(rng, n)
+        offset = (rng.random(n) * self.counts[cls]).astype(np.int64)
+        window = self.class_offsets[cls] + np.minimum(offset, self.counts[cls] - 1)
+        return cls, self.window_seq[window], self.window_start[window]
+
+    def sample(self, n: int, seed=0, epoch=0, shard=0, n_shards=1):
+        """
+        Deterministic draws: the same (seed, epoch) always yields the same
+        n windows, of which this shard receives every n_shards-th one.
+        :return: {m} class, {m} sequence id, {m} start frame
+        """
+        assert 0 <= shard < n_shards, str(shard) + "/" + str(n_shards)
+        rng = np.random.default_rng([seed, epoch])
+        cls, seq, start = self.draw(rng, n)
+        return cls[shard::n_shards], seq[shard::n_shards], start[shard::n_shards]
+
+    def windows(self, n: int, seed=0, epoch=0, shard=0, n_shards=1):
+        """
+        :return: [((actor, action, sid), start), ...]
+        """
+        _, seq, start = self.sample(n, seed=seed, epoch=epoch, shard=shard, n_shards=n_shards)
+        return [(self.keys[i], int(s)) for i, s in zip(seq, start)]
+
+    def class_probabilities(self):
+        """
+        :return: {n_classes} probability that a draw picks each class
+        """
+        return self.weights / self.weights.sum()
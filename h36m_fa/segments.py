@@ -0,0 +1,147 @@
+"""
+Run-length segment index over the frame-wise labels.
+
+All segments (maximal runs of frames in which an action is active) are
+extracted once from the packed label store. Queries then only touch
+the small segment tables and never the dense per-frame labels.
+"""
+import numpy as np
+from h36m_fa.labels import LabelStore
+
+
+class SegmentIndex:
+    def __init__(self, n_classes: int = 11, store=None):
+        """
+        :param n_classes: 8 or 11, selects the label set
+        """
+        store = LabelStore(n_classes=n_classes) if store is None else store
+        self.n_classes = store.n_classes
+        self.keys = []
+        seq_starts = []
+        seq_lengths = []
+        for name, (start, length) in store.index.items():
+            actor, action, sid = name.split("_")
+            self.keys.append((actor, action, int(sid)))
+            seq_starts.append(start)
+            seq_lengths.append(length)
+        seq_starts = np.array(seq_starts, dtype=np.int64)
+        seq_lengths = np.array(seq_lengths, dtype=np.int64)
+        order = np.argsort(seq_starts)
+        seq_starts = seq_starts[order]
+        seq_lengths = seq_lengths[order]
+        self.keys = [self.keys[i] for i in order]
+
+        labels = np.unpackbits(store.packed, axis=1, count=self.n_classes)
+        labels = labels.astype(bool)
+        n_frames = len(labels)
+        first = np.zeros(n_frames, dtype=bool)
+        first[seq_starts] = True
+        last = np.zeros(n_frames, dtype=bool)
+        last[seq_starts + seq_lengths - 1] = True
+
+        before = np.roll(labels, 1, axis=0)
+        before[first] = False
+        after = np.roll(labels, -1, axis=0)
+        after[last] = False
+        begins = labels & ~before
+        ends = labels & ~after
+
+        # class-major, so that begins and ends of a class pair up in order
+        cls, start = np.nonzero(begins.T)
+        _, end = np.nonzero(ends.T)
+        end = end + 1
+        seq = np.searchsorted(seq_starts, start, side="right") - 1
+        self.seg_class = cls.astype(np.int32)
+        self.seg_seq = seq.astype(np.int32)
+        self.seg_start = (start - seq_starts[seq]).astype(np.int64)
+        self.seg_end = (end - seq_starts[seq]).astype(np.int64)
+        self.seg_length = self.seg_end - self.seg_start
+
+        # per class: segment ids sorted by decreasing length
+        self._by_class = []
+        for k in range(self.n_classes):
+            ids = np.nonzero(self.seg_class == k)[0]
+            ids = ids[np.argsort(-self.seg_length[ids], kind="stable")]
+            self._by_class.append(ids)
+
+        # float64 products go through BLAS and are exact for these counts
+        counts = labels.astype(np.float64)
+        self._frame_counts = labels.sum(axis=0, dtype=np.int64)
+        self._cooccurrence = (counts.T @ counts).astype(np.int64)
+        ended = (ends[:-1] & ~last[:-1, np.newaxis]).astype(np.float64)
+        started = begins[1:].astype(np.float64)
+        self._transitions = (ended.T @ started).astype(np.int64)
+
+    def _as_tuples(self, ids):
+        return [
+            self.keys[self.seg_seq[i]]
+            + (int(self.seg_start[i]), int(self.seg_end[i]))
+            for i in ids
+        ]
+
+    def segment_ids(self, k: int, min_length: int = 1):
+        """
+        :return: ids of all segments of class k with at least min_length
+            frames, longest first
+        """
+        ids = self._by_class[k]
+        n = np.searchsorted(-self.seg_length[ids], -min_length, side="right")
+        return ids[:n]
+
+    def segments(self, k: int, min_length: int = 1):
+        """
+        :return: [(actor, action, sid, start, end), ...] of all segments of
+            class k with at least min_length frames, longest first; end is
+            exclusive
+        """
+        return self._as_tuples(self.segment_ids(k, min_length))
+
+    def cooccurrences(self, a: int, b: int, min_length: int = 1):
+        """
+        :return: [(actor, action, sid, start, end), ...] of all runs in
+            which both classes a and b are active
+        """
+        A = self.segment_ids(a)
+        B = self.segment_ids(b)
+        A = A[np.lexsort((self.seg_start[A], self.seg_seq[A]))]
+        B = B[np.lexsort((self.seg_start[B], self.seg_seq[B]))]
+        result = []
+        i = 0
+        j = 0
+        while i < len(A) and j < len(B):
+            sa, sb = self.seg_seq[A[i]], self.seg_seq[B[j]]
+            if sa != sb:
+                if sa < sb:
+                    i += 1
+                else:
+                    j += 1
+                continue
+            start = max(self.seg_start[A[i]], self.seg_start[B[j]])
+            end = min(self.seg_end[A[i]], self.seg_end[B[j]])
+            if end - start >= min_length:
+                result.append(self.keys[sa] + (int(start), int(end)))
+            if self.seg_end[A[i]] < self.seg_end[B[j]]:
+                i += 1
+            else:
+                j += 1
+        return result
+
+    def frame_counts(self):
+        """
+        :return: {n_classes} number of frames in which each class is active
+        """
+        return self._frame_counts.copy()
+
+    def cooccurrence(self):
+        """
+        :return: {n_classes x n_classes} number of frames in which both
+            classes are active; the diagonal are the frame counts
+        """
+        return self._cooccurrence.copy()
+
+    def transitions(self):
+        """
+        :return: {n_classes x n_classes} T[a, b]: number of times that
+            class a ends at the frame right before class b starts
+        """
+        return self._transitions.copy()
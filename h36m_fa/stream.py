@@ -0,0 +1,295 @@
+"""
+Frame-by-frame forward kinematics for live replay and prediction.
+
+A StreamProcessor accepts one Euler (96-d) or expmap (99-d) frame at a
+time and returns its 3D joints in the layout of fk.euler_fk, optionally
+also the mirrored joints (mirror.mirror_p3d) and the frame-wise label of
+the current frame. All intermediate arrays are buffers that are allocated
+once and written with out= operations. The joints are stored in the order
+of their depth in the kinematic tree and every joint is a 4 x 4
+transform [[R, 0], [p, 1]] (row vectors): a level of the tree then costs
+one gather of the parents and one batched matmul, so that every frame
+costs the same small, fixed amount of work. The returned arrays are
+buffers too: they are overwritten by the next frame, copy them to keep
+them.
+
+Every push is timed; latency() summarizes the timings as a histogram
+with power-of-two microsecond bins.
+"""
+import numpy as np
+from time import perf_counter_ns
+import h36m_fa.fk as FK
+from h36m_fa.mirror import PERMUTATION
+from h36m_fa.labels import LabelStore
+
+N_BINS = 32
+
+# conversion._zyx2rotmat entry by entry (a, b, c: rotations about x, y,
+# z); _product_table turns it into the gather indices of the products
+ZYX2ROTMAT = [
+    "cb * cc",
+    "cc * sb * sa - sc * ca",
+    "cc * sb * ca + sc * sa",
+    "cb * sc",
+    "sc * sb * sa + cc * ca",
+    "sc * sb * ca - cc * sa",
+    "-sb",
+    "cb * sa",
+    "cb * ca",
+]
+# the factors of the products, in the layout of the per-joint trig buffer:
+# sin(a, b, c), cos(a, b, c), 1, 0
+TRIG = ["sa", "sb", "sc", "ca", "cb", "cc", "1", "0"]
+
+# the skew-symmetric matrix of the unit axis k of
+# conversion.batch_expmap2rotmat, as entries of K_ENTRIES
+SKEW_MATRIX = ["0", "-k2", "k1", "k2", "0", "-k0", "-k1", "k0", "0"]
+K_ENTRIES = ["k0", "k1", "k2", "-k0", "-k1", "-k2", "0"]
+
+
+def _product_table(formulas, names, n_terms=2, n_factors=3):
+    """
+    :param formulas: sums of at most n_terms signed products of at most
+        n_factors names, e.g. "cc * sb * sa - sc * ca"
+    :return: {len(formulas) x n_terms x n_factors} indices into names,
+        {len(formulas) x n_terms} signs; missing factors are "1", missing
+        terms "0"
+    """
+    factors = []
+    signs = []
+    for formula in formulas:
+        terms = [t for t in formula.replace(" ", "").replace("-", "+-").split("+") if t]
+        assert len(terms) <= n_terms, formula
+        entry = []
+        for term in terms:
+            product = term.lstrip("-").split("*")
+            assert len(product) <= n_factors, formula
+            product += ["1"] * (n_factors - len(product))
+            entry.append([names.index(name) for name in product])
+        zero = [names.index("0")] + [names.index("1")] * (n_factors - 1)
+        padding = n_terms - len(terms)
+        factors.append(entry + [zero] * padding)
+        signs.append([-1 if term.startswith("-") else 1 for term in terms] + [1] * padding)
+    return factors, signs
+
+
+ZYX_FACTORS, ZYX_SIGNS = _product_table(ZYX2ROTMAT, TRIG)
+SKEW = [K_ENTRIES.index(entry) for entry in SKEW_MATRIX]
+
+
+def _flat_index(joints, axes, stride=3, offset=0):
+    """
+    :return: index into a flat {n_joints x stride} array that selects
+        joints (and their axes, starting at offset) in the given order
+    """
+    joints = np.asarray(joints)[:, np.newaxis]
+    return (joints * stride + offset + np.asarray(axes)[np.newaxis]).reshape(-1)
+
+
+def _levels(parent):
+    """
+    :return: {n_joints} joints sorted by their depth in the kinematic tree
+        (root first), [(lo, hi), ...] the slice of every depth below the
+        root in that order
+    """
+    depth = np.zeros(len(parent), dtype=np.int64)
+    for jid, pid in enumerate(parent):
+        if pid >= 0:
+            depth[jid] = depth[pid] + 1
+    assert np.sum(depth == 0) == 1 and parent[0] < 0, "joint 0 must be the only root"
+    order = np.argsort(depth, kind="stable")
+    bounds = np.searchsorted(depth[order], np.arange(depth.max() + 2))
+    return order, [(bounds[d], bounds[d + 1]) for d in range(1, depth.max() + 1)]
+
+
+class StreamProcessor:
+    def __init__(self, representation="euler", mirror=False, n_classes=None):
+        """
+        :param representation: "euler" {96} or "expmap" {99} frames
+        :param mirror: also compute the mirrored joints
+        :param n_classes: 8 or 11 to look up the frame-wise labels of the
+            sequence set with reset(actor, action, sid), None to skip
+        """
+        assert representation in ["euler", "expmap"], str(representation)
+        self.representation = representation
+        self.dim = 96 if representation == "euler" else 99
+        self.mirror = mirror
+        self.n_joints = FK.n_joints
+        J = self.n_joints
+
+        # everything per joint is in depth order (see _levels)
+        self._order, self._levels = _levels(FK.parent)
+        rank = np.argsort(self._order)
+        parent = rank[np.asarray(FK.parent)[self._order][1:]]
+        self._parents = [parent[lo - 1 : hi - 1] for lo, hi in self._levels]
+        self._parent_T = [np.empty((hi - lo, 4, 4), dtype=np.float32) for lo, hi in self._levels]
+
+        self._frame = np.zeros(self.dim, dtype=np.float32)
+        self._angles = np.zeros((J, 3), dtype=np.float32)
+        self._local_R = np.empty((J, 3, 3), dtype=np.float32)
+        # zyx
+        self._trig = np.zeros((J, 8), dtype=np.float32)
+        self._trig[:, TRIG.index("1")] = 1
+        self._factors = np.empty((J, 18, 3), dtype=np.float32)
+        self._terms = np.empty((J, 18), dtype=np.float32)
+        self._factor_index = np.array(ZYX_FACTORS).reshape(-1)
+        self._signs = np.array(ZYX_SIGNS, dtype=np.float32).reshape(-1)
+        # expmap
+        self._norm = np.empty((J, 2), dtype=np.float32)
+        self._k = np.zeros((J, 7), dtype=np.float32)
+        self._K = np.empty((J, 3, 3), dtype=np.float32)
+        self._KK = np.empty((J, 3, 3), dtype=np.float32)
+        self._eye = np.eye(3, dtype=np.float32)
+        self._skew = np.array(SKEW)
+
+        # local [[R, 0], [bone, 1]] and global [[R, 0], [p, 1]] transforms
+        self._local_T = np.zeros((J, 4, 4), dtype=np.float32)
+        self._local_T[:, 3, :3] = FK.bone_lengths.astype(np.float32)[self._order]
+        self._local_T[:, 3, 3] = 1
+        self._global_T = np.empty((J, 4, 4), dtype=np.float32)
+
+        self.joints = np.empty((J, 3), dtype=np.float32)
+        self.mirrored = np.empty((J, 3), dtype=np.float32) if mirror else None
+        self._to_output = _flat_index(
+            rank[FK.OUTPUT_JOINTS], FK.OUTPUT_AXES, stride=16, offset=12
+        )
+        self._to_mirror = _flat_index(PERMUTATION[J], [0, 1, 2])
+
+        self.store = None if n_classes is None else LabelStore(n_classes=n_classes)
+        self._labels = None
+        self._no_label = (
+            None if n_classes is None else np.zeros(n_classes, dtype=np.uint8)
+        )
+        self.frame = 0
+        self.histogram = np.zeros(N_BINS, dtype=np.int64)
+        self.max_ns = 0
+
+    def reset(self, actor=None, action=None, sid=None):
+        """
+        Starts a new sequence; its labels are looked up if n_classes was set
+        """
+        self.frame = 0
+        self._labels = None
+        if self.store is not None and actor is not None:
+            self._labels = self.store.get(actor, action, sid)
+
+    def _rotations(self, frame):
+        """
+        Writes the local rotations of the frame (as conversion.convert) into
+        the local transforms
+        """
+        np.copyto(self._frame, frame)
+        if self.representation == "euler":
+            angles = self._frame.reshape((-1, 3))
+        else:
+            # like expmap2euler: skip the root position, no global rotation
+            angles = self._frame[3:].reshape((-1, 3))
+        np.take(angles, self._order, axis=0, out=self._angles)
+        if self.representation == "euler":
+            self._zyx2rotmat()
+        else:
+            self._angles[0] = 0
+            self._expmap2rotmat()
+        np.copyto(self._local_T[:, :3, :3], self._local_R)
+
+    def _zyx2rotmat(self):
+        """
+        ZYX2ROTMAT for all joints: gathers the factors of every product
+        from the sines and cosines, multiplies and sums them
+        """
+        J = self.n_joints
+        np.sin(self._angles, out=self._trig[:, 0:3])
+        np.cos(self._angles, out=self._trig[:, 3:6])
+        np.take(self._trig, self._factor_index, axis=1, out=self._factors.reshape((J, -1)))
+        np.multiply.reduce(self._factors, axis=2, out=self._terms)
+        np.multiply(self._terms, self._signs, out=self._terms)
+        np.add(self._terms[:, 0::2], self._terms[:, 1::2], out=self._local_R.reshape((J, 9)))
+
+    def _expmap2rotmat(self):
+        """
+        Rodrigues' formula as conversion.batch_expmap2rotmat (in float32):
+        R = I + sin(theta) K + (1 - cos(theta)) K @ K
+        """
+        J = self.n_joints
+        r, theta, t = self._angles, self._norm[:, 0], self._norm[:, 1]
+        k = self._k[:, 0:3]
+        np.multiply(r, r, out=k)
+        np.sum(k, axis=1, out=theta)
+        np.sqrt(theta, out=theta)
+        np.maximum(theta, np.finfo(np.float32).eps, out=t)
+        np.divide(r, t[:, np.newaxis], out=k)
+        np.negative(k, out=self._k[:, 3:6])
+        K = self._K
+        np.take(self._k, self._skew, axis=1, out=K.reshape((J, 9)))
+        np.matmul(K, K, out=self._KK)
+        R = self._local_R
+        np.sin(theta, out=t)
+        np.multiply(K, t[:, np.newaxis, np.newaxis], out=R)
+        np.add(self._eye, R, out=R)
+        np.cos(theta, out=t)
+        np.subtract(1, t, out=t)
+        np.multiply(self._KK, t[:, np.newaxis, np.newaxis], out=self._KK)
+        np.add(R, self._KK, out=R)
+
+    def _chain(self):
+        """
+        The recurrence of fk._chain in homogeneous form:
+        [[R_local, 0], [bone, 1]] @ [[R_parent, 0], [p_parent, 1]] is
+        [[R_local @ R_parent, 0], [bone @ R_parent + p_parent, 1]]
+        """
+        T = self._global_T
+        T[0] = self._local_T[0]
+        # all joints of a level depend only on the previous levels
+        for (lo, hi), pids, parent_T in zip(self._levels, self._parents, self._parent_T):
+            np.take(T, pids, axis=0, out=parent_T)
+            np.matmul(self._local_T[lo:hi], parent_T, out=T[lo:hi])
+        np.take(T.reshape(-1), self._to_output, out=self.joints.reshape(-1))
+        np.negative(self.joints[:, 0], out=self.joints[:, 0])
+
+    def push(self, frame):
+        """
+        :param frame: {96} Euler angles or {99} expmap
+        :return: {n_joints x 3} joints, {n_joints x 3} mirrored joints (or
+            None), {n_classes} label of the frame (or None); all buffers
+        """
+        start = perf_counter_ns()
+        assert np.shape(frame) == (self.dim,), str(np.shape(frame))
+        self._rotations(frame)
+        self._chain()
+        if self.mirror:
+            np.take(self.joints.reshape(-1), self._to_mirror, out=self.mirrored.reshape(-1))
+            np.negative(self.mirrored[:, 0], out=self.mirrored[:, 0])
+        label = self._no_label
+        if self._labels is not None and self.frame < len(self._labels):
+            label = self._labels[self.frame]
+        self.frame += 1
+
+        elapsed = perf_counter_ns() - start
+        self.histogram[min((elapsed // 1000).bit_length(), N_BINS - 1)] += 1
+        self.max_ns = max(self.max_ns, elapsed)
+        return self.joints, self.mirrored, label
+
+    def latency(self):
+        """
+        :return: {"frames": n, "max_us": ..., "p50_us": ..., "p99_us": ...,
+            "histogram": {"<1us": n, "<2us": n, "<4us": n, ...}}; the
+            percentiles are the upper edges of their bins
+        """
+        n = int(self.histogram.sum())
+        edges = [2 ** b for b in range(N_BINS)]  # bin b: [2^(b-1), 2^b) us
+        cumulative = np.cumsum(self.histogram)
+
+        def percentile(q):
+            if n == 0:
+                return 0
+            return edges[int(np.searchsorted(cumulative, q * n))]
+
+        return {
+            "frames": n,
+            "max_us": self.max_ns / 1000,
+            "p50_us": percentile(0.5),
+            "p99_us": percentile(0.99),
+            "histogram": {
+                f"<{edges[b]}us": int(c) for b, c in enumerate(self.histogram) if c > 0
+            },
+        }
@@ -0,0 +1,72 @@
+"""
+Binary float32 shadows for text-backed arrays.
+
+The first time a text file is read it is parsed once and stored next to
+it as {name}.npy together with {name}.npy.src, which records the size and
+mtime of the text file. Later reads are served from the binary as long as
+the text file is unchanged.
+"""
+import json
+import numpy as np
+from os import stat, replace
+from os.path import isfile, splitext, getsize
+import h36m_fa.acquire as ACQ
+import h36m_fa.instrument as IN
+
+
+def shadow_name(fname: str):
+    return splitext(fname)[0] + ".npy"
+
+
+def _source_stat(fname: str):
+    st = stat(fname)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _write_shadow(fname: str, seq):
+    shadow = shadow_name(fname)
+    ACQ.atomic_save(shadow, seq)
+    tmp = ACQ.tmp_name(shadow + ".src")
+    with open(tmp, "w") as f:
+        json.dump(_source_stat(fname), f)
+    replace(tmp, shadow + ".src")
+
+
+def is_fresh(fname: str):
+    """
+    :return: True if the binary shadow of fname is up-to-date (False if
+        fname itself was deleted)
+    """
+    shadow = shadow_name(fname)
+    if not isfile(shadow) or not isfile(shadow + ".src"):
+        return False
+    try:
+        with open(shadow + ".src", "r") as f:
+            recorded = json.load(f)
+        return recorded == _source_stat(fname)
+    except (ValueError, FileNotFoundError):
+        return False
+
+
+def loadtxt(fname: str, delimiter=None):
+    """
+    np.loadtxt(fname, dtype=np.float32) that parses every file only once
+    """
+    if is_fresh(fname):
+        return ACQ.load(shadow_name(fname))
+    with IN.stage("txtcache.parse") as span:
+        seq = np.loadtxt(fname, delimiter=delimiter, dtype=np.float32)
+        span.frames += len(seq)
+        span.nbytes += getsize(fname)
+    _write_shadow(fname, seq)
+    return seq
+
+
+def savetxt(fname: str, seq):
+    """
+    Writes the text file and its binary shadow so that the data is never
+    parsed back from text
+    """
+    seq = np.asarray(seq, dtype=np.float32)
+    ACQ.atomic_savetxt(fname, seq)
+    _write_shadow(fname, seq)
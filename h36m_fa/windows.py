@@ -0,0 +1,136 @@
+"""
+Fixed-length pose windows paired with their frame-wise labels.
+"""
+import queue
+import threading
+import numpy as np
+import h36m_fa.poses as poses
+from h36m_fa.labels import LabelStore
+
+
+class Windows:
+    def __init__(
+        self,
+        data_dir: str,
+        length: int,
+        stride: int = 1,
+        n_classes: int = 11,
+        loader=poses.get3d_fixed,
+        keys=None,
+    ):
+        """
+        Precomputes the (sequence, start) of every valid window.
+        :param length: number of frames per window
+        :param n_classes: 8 or 11, selects the label set
+        :param loader: loader(actor, action, sid, data_dir) -> {n_frames x dim},
+            e.g. poses.get3d_fixed or poses.get_euler
+        :param keys: [(actor, action, sid), ...], defaults to all sequences
+        """
+        assert length > 0 and stride > 0, str(length) + " & " + str(stride)
+        self.length = length
+        self.stride = stride
+        self.keys = poses.all_sequences() if keys is None else list(keys)
+        store = LabelStore(n_classes=n_classes)
+
+        self.poses = []
+        self.labels = []
+        seq_ids = []
+        starts = []
+        for i, (actor, action, sid) in enumerate(self.keys):
+            seq = loader(actor, action, sid, data_dir)
+            lab = store.get(actor, action, sid)
+            # pose and label sequences may differ by a few trailing frames
+            n_frames = min(len(seq), len(lab))
+            self.poses.append(np.reshape(seq[:n_frames], (n_frames, -1)))
+            self.labels.append(lab[:n_frames])
+            seq_starts = np.arange(0, n_frames - length + 1, stride, dtype=np.int64)
+            starts.append(seq_starts)
+            seq_ids.append(np.full(len(seq_starts), i, dtype=np.int32))
+        self.seq_ids = np.concatenate(seq_ids)
+        self.starts = np.concatenate(starts)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        """
+        :return: {length x dim} poses, {length x n_classes} labels
+        """
+        seq_idx = self.seq_ids[i]
+        start = self.starts[i]
+        end = start + self.length
+        return self.poses[seq_idx][start:end], self.labels[seq_idx][start:end]
+
+    def key(self, i):
+        """
+        :return: (actor, action, sid), start of the i-th window
+        """
+        return self.keys[self.seq_ids[i]], int(self.starts[i])
+
+    def batch(self, indices):
+        """
+        :return: {n x length x dim} poses, {n x length x n_classes} labels
+        """
+        X = []
+        Y = []
+        for i in indices:
+            x, y = self[i]
+            X.append(x)
+            Y.append(y)
+        return np.stack(X), np.stack(Y)
+
+    def iterate(self, batch_size, shuffle=False, seed=None, drop_last=False, prefetch=2):
+        """
+        Yields batches, prepared ahead of time on a background thread.
+        :param prefetch: number of batches to prepare ahead, 0 disables
+            the background thread
+        """
+        order = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+        n_batches = len(order) // batch_size
+        if not drop_last and len(order) % batch_size > 0:
+            n_batches += 1
+        batches = (
+            order[b * batch_size : (b + 1) * batch_size] for b in range(n_batches)
+        )
+        if prefetch < 1:
+            for indices in batches:
+                yield self.batch(indices)
+            return
+
+        buffer = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+
+        def offer(item):
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for indices in batches:
+                    if not offer(self.batch(indices)):
+                        return
+            except Exception as e:  # re-raised in the consumer
+                offer(e)
+                return
+            offer(None)
+
+        worker = threading.Thread(target=produce, daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = buffer.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            worker.join()
@@ -0,0 +1,71 @@
+"""
+converts the data labels into the packed binary label store
+(h36m_fa/data/labels8.* and h36m_fa/data/labels11.*) so that they can be
+easily used in a python library (like this one!)
+
+You DO NOT NEED TO CALL THIS to use this library or the data!
+
+call this as follows:
+```
+(/{your_path}/h36m_framewise_actions)$ python preprocessing/labels_to_binary.py
+```
+"""
+import os
+import sys
+from os.path import join
+import numpy as np
+from tqdm import tqdm
+
+r = input(
+    "\nauto-generate the binary label files\n-ONLY DO THIS IF YOU ARE THE MAINTAINER OF THIS LIBRARY-\ncontinue?[y/N]"
+)
+r = str(r)
+if r != "y":
+    print("good choice :)")
+    print(r)
+    exit()
+print("generate data...")
+
+cwd = os.getcwd()
+sys.path.insert(0, cwd)
+
+from h36m_fa.labels import pack, DATA_DIR
+
+actors = ["S1", "S5", "S6", "S7", "S8", "S9", "S11"]
+actions = [
+    "directions",
+    "discussion",
+    "eating",
+    "greeting",
+    "phoning",
+    "posing",
+    "purchases",
+    "sitting",
+    "sittingdown",
+    "smoking",
+    "takingphoto",
+    "waiting",
+    "walking",
+    "walkingdog",
+    "walkingtogether",
+]
+
+LABELS_8 = {}
+LABELS_11 = {}
+
+for actor in tqdm(actors):
+    for action in actions:
+        for sid in [1, 2]:
+
+            fname_8 = join(cwd, f"data/label8_{actor}_{action}_{sid}.txt")
+            fname_11 = join(cwd, f"data/label11_{actor}_{action}_{sid}.txt")
+            lab8 = np.loadtxt(fname_8, ndmin=2)
+            lab11 = np.loadtxt(fname_11, ndmin=2)
+            assert np.all((lab8 == 0) | (lab8 == 1)), fname_8
+            assert np.all((lab11 == 0) | (lab11 == 1)), fname_11
+
+            LABELS_8[f"{actor}_{action}_{sid}"] = lab8
+            LABELS_11[f"{actor}_{action}_{sid}"] = lab11
+
+pack(LABELS_8, n_classes=8, data_dir=DATA_DIR)
+pack(LABELS_11, n_classes=11, data_dir=DATA_DIR)
@@ -2,31 +2,32 @@
 Call this function as follows:
 ```
 ```
-(/{your_path}/h36m_framewise_actions)$ python preprocessing/process_h36m.py {/path/to/orginal/h36m_dir} {/target/data/dir}
+(/{your_path}/h36m_framewise_actions)$ python preprocessing/process_h36m.py {/path/to/orginal/h36m_dir} {/target/data/dir} [n_workers]
 ```
 ```
+The CDF files are converted in parallel worker processes (one per core
+by default). Every output is written atomically, so an interrupted run
+can simply be restarted: existing files are skipped.
 """
 from spacepy import pycdf
 import numpy as np
-from tqdm import tqdm
-
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
 
+import os
 import sys
-from os.path import isfile, isdir, join
-from os import listdir, makedirs
+from os.path import isfile, isdir, join, getsize
+from os import listdir, makedirs, cpu_count, replace
 import requests
 import zipfile
 
-assert len(sys.argv) == 3
-
-path_source = sys.argv[1]
-path_destination = sys.argv[2]
+sys.path.insert(0, os.getcwd())
 
-assert isdir(path_source)
-if not isdir(path_destination):
-    makedirs(path_destination)
+from h36m_fa.acquire import tmp_name
 
-print(f"Process H36M from {path_source} to {path_destination}")
+# frames that are decoded per read, bounds the memory of every worker
+CHUNK = 4096
 
 # --- generate data ---
 ACTORS = ["S1", "S5", "S6", "S7", "S8", "S9", "S11"]
@@ -48,96 +49,162 @@ ACTIONS = [
     "WalkTogether",
 ]
 
-# get EXPMAPS
-zip_fname = join(path_destination, "h3.6m.zip")
-if not isfile(zip_fname):
-    print("[data aquisition] - h36m - download expmap data")
-    r = requests.get("http://www.cs.stanford.edu/people/ashesh/h3.6m.zip")
-    open(zip_fname, "wb").write(r.content)
-exp_dir = join(path_destination, "exp_dir")
-exp_data_dir = join(exp_dir, "h3.6m")
-if not isdir(exp_data_dir):
-    print("[data aquisition] - h36m - extract exmap data")
-    with zipfile.ZipFile(zip_fname, "r") as zip_ref:
-        zip_ref.extractall(exp_dir)
-
-for actor in ACTORS:
-    print("\n[get h36m skeleton] ->", actor)
-    for action in tqdm(ACTIONS):
-        for sid in [0, 1]:
-            # fix labeling... Human3.6M labeling is very messy and we need to fix it...
-
-            fixed_action = ""
-            if action == "WalkTogether":
-                fixed_action = "walkingtogether"
-            elif action == "Photo":
-                fixed_action = "takingphoto"
-            else:
-                fixed_action = action.lower()
-
-            if actor == "S1" and action == "Photo":
-                action = "TakingPhoto"
-            if actor != "S1" and action == "WalkingDog":
-                action = "WalkDog"
-
-            cdf_dir = join(join(path_source, actor), "MyPoseFeatures")
-            cdf_dir = join(cdf_dir, "D3_Positions")
-
-            videos = sorted([f for f in listdir(cdf_dir) if f.startswith(action)])
-
-            if (actor == "S1" and action == "Walking") or action == "Sitting":
-                # separate Walking from WalkingDog OR
-                # separate Sitting from SittingDown
-                assert len(videos) == 4
-                videos = videos[0:2]
-
-            assert len(videos) == 2, "# of videos:" + str(len(videos))
-            a, b = videos
-            if len(a) > len(b):  # ['xxx 9.cdf', 'xxx.cdf']
-                videos = [b, a]
-            else:
-                assert len(a) == len(b)
-
-            cdf_file = join(cdf_dir, videos[sid])
-            assert isfile(cdf_file)
-
-            cdf = pycdf.CDF(cdf_file)
-            joints3d = np.squeeze(cdf["Pose"]).reshape((-1, 32, 3)) / 1000
-            joints3d = joints3d.astype("float32")
-
-            # more magic to harmonize the naming conventions...
-            fixed_sid = sid + 1
-            fixed_sid = fixed_sid % 2 + 1  # 2 -> 1 and 1 -> 2
-
-            if (
-                (actor == "S8" and fixed_action == "walkingtogether")
-                or (actor == "S7" and fixed_action == "walking")
-                or (actor == "S7" and fixed_action == "waiting")
-                or (actor == "S5" and fixed_action == "waiting")
-                or (actor == "S7" and fixed_action == "takingphoto")
-                or (actor == "S6" and fixed_action == "takingphoto")
-                or (actor == "S5" and fixed_action == "takingphoto")
-                or (actor == "S11" and fixed_action == "sittingdown")
-                or (actor == "S9" and fixed_action == "sittingdown")
-                or (actor == "S8" and fixed_action == "sittingdown")
-                or (actor == "S7" and fixed_action == "sittingdown")
-                or (actor == "S5" and fixed_action == "sittingdown")
-                or (actor == "S6" and fixed_action == "sitting")
-                or (actor == "S1" and fixed_action == "sitting")
-                or (actor == "S5" and fixed_action == "greeting")
-                or (actor == "S6" and fixed_action == "eating")
-                or (actor == "S11" and fixed_action == "discussion")
-                or (actor == "S9" and fixed_action == "discussion")
-                or (actor == "S5" and fixed_action == "discussion")
-                or (actor == "S5" and fixed_action == "directions")
-            ):
-                fixed_sid = fixed_sid % 2 + 1  # 2 -> 1 and 1 -> 2
-
-            if fixed_action == "walkdog":
-                fixed_action = "walkingdog"
-
-            fname = join(
-                path_destination,
-                actor + "_" + fixed_action + "_" + str(fixed_sid) + ".npy",
+# fix labeling... Human3.6M labeling is very messy and we need to fix it...
+FIXED_ACTION = {"WalkTogether": "walkingtogether", "Photo": "takingphoto"}
+
+# (actor, action): prefix of the CDF files if it differs from the action
+CDF_PREFIX = {("S1", "Photo"): "TakingPhoto"}
+CDF_PREFIX.update({(actor, "WalkingDog"): "WalkDog" for actor in ACTORS[1:]})
+
+# more magic to harmonize the naming conventions: the second (sorted)
+# video is sid 1 and the first one is sid 2, except for these sequences
+KEEP_SID = {
+    ("S8", "walkingtogether"),
+    ("S7", "walking"),
+    ("S7", "waiting"),
+    ("S5", "waiting"),
+    ("S7", "takingphoto"),
+    ("S6", "takingphoto"),
+    ("S5", "takingphoto"),
+    ("S11", "sittingdown"),
+    ("S9", "sittingdown"),
+    ("S8", "sittingdown"),
+    ("S7", "sittingdown"),
+    ("S5", "sittingdown"),
+    ("S6", "sitting"),
+    ("S1", "sitting"),
+    ("S5", "greeting"),
+    ("S6", "eating"),
+    ("S11", "discussion"),
+    ("S9", "discussion"),
+    ("S5", "discussion"),
+    ("S5", "directions"),
+}
+
+
+def fixed_name(actor, action, sid):
+    """
+    :param sid: 0 or 1, index of the video in the sorted CDF directory
+    :return: actor_action_sid of the harmonized naming convention
+    """
+    fixed_action = FIXED_ACTION.get(action, action.lower())
+    fixed_sid = sid + 1 if (actor, fixed_action) in KEEP_SID else 2 - sid
+    return actor + "_" + fixed_action + "_" + str(fixed_sid)
+
+
+def cdf_file(path_source, actor, action, sid):
+    cdf_dir = join(path_source, actor, "MyPoseFeatures", "D3_Positions")
+    prefix = CDF_PREFIX.get((actor, action), action)
+    videos = sorted([f for f in listdir(cdf_dir) if f.startswith(prefix)])
+
+    if (actor == "S1" and action == "Walking") or action == "Sitting":
+        # separate Walking from WalkingDog OR
+        # separate Sitting from SittingDown
+        assert len(videos) == 4
+        videos = videos[0:2]
+
+    assert len(videos) == 2, "# of videos:" + str(len(videos))
+    a, b = videos
+    if len(a) > len(b):  # ['xxx 9.cdf', 'xxx.cdf']
+        videos = [b, a]
+    else:
+        assert len(a) == len(b)
+
+    fname = join(cdf_dir, videos[sid])
+    assert isfile(fname)
+    return fname
+
+
+def convert(actor, action, sid, path_source, path_destination):
+    """
+    Streams the poses of one CDF file in chunks into {n_frames x 32 x 3}
+    float32 meters at path_destination/actor_action_sid.npy
+    :return: output file name, number of frames, seconds
+    """
+    start = perf_counter()
+    fname = join(path_destination, fixed_name(actor, action, sid) + ".npy")
+    cdf = pycdf.CDF(cdf_file(path_source, actor, action, sid))
+    try:
+        pose = cdf["Pose"]
+        n_frames = pose.shape[1]
+        tmp = tmp_name(fname)
+        out = np.lib.format.open_memmap(
+            tmp, mode="w+", dtype=np.float32, shape=(n_frames, 32, 3)
+        )
+        for t in range(0, n_frames, CHUNK):
+            chunk = pose[0, t : t + CHUNK].reshape((-1, 32, 3)) / 1000
+            out[t : t + len(chunk)] = chunk.astype("float32")
+        out.flush()
+        del out
+        replace(tmp, fname)
+    finally:
+        cdf.close()
+    return fname, n_frames, perf_counter() - start
+
+
+def main():
+    assert len(sys.argv) in [3, 4]
+
+    path_source = sys.argv[1]
+    path_destination = sys.argv[2]
+    n_workers = int(sys.argv[3]) if len(sys.argv) == 4 else cpu_count() or 1
+
+    assert isdir(path_source)
+    if not isdir(path_destination):
+        makedirs(path_destination)
+
+    print(f"Process H36M from {path_source} to {path_destination}")
+
+    # get EXPMAPS
+    zip_fname = join(path_destination, "h3.6m.zip")
+    if not isfile(zip_fname):
+        print("[data aquisition] - h36m - download expmap data")
+        r = requests.get("http://www.cs.stanford.edu/people/ashesh/h3.6m.zip")
+        open(zip_fname, "wb").write(r.content)
+    exp_dir = join(path_destination, "exp_dir")
+    exp_data_dir = join(exp_dir, "h3.6m")
+    if not isdir(exp_data_dir):
+        print("[data aquisition] - h36m - extract exmap data")
+        with zipfile.ZipFile(zip_fname, "r") as zip_ref:
+            zip_ref.extractall(exp_dir)
+
+    jobs = [
+        (actor, action, sid)
+        for actor in ACTORS
+        for action in ACTIONS
+        for sid in [0, 1]
+        if not isfile(
+            join(path_destination, fixed_name(actor, action, sid) + ".npy")
+        )
+    ]
+    print(f"[get h36m skeleton] -> {len(jobs)} sequences, {n_workers} workers")
+    if len(jobs) == 0:
+        return
+
+    start = perf_counter()
+    total_bytes = 0
+    # spawn: forked children may inherit locks held by other threads
+    context = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(convert, actor, action, sid, path_source, path_destination)
+            for actor, action, sid in jobs
+        ]
+        for i, future in enumerate(as_completed(futures)):
+            fname, n_frames, seconds = future.result()
+            n_bytes = getsize(fname)
+            total_bytes += n_bytes
+            print(
+                f"[{i + 1}/{len(jobs)}] {fname}: {n_frames} frames, "
+                f"{n_frames / seconds:.0f} frames/s, "
+                f"{n_bytes / seconds / 2 ** 20:.1f} MiB/s"
             )
-            np.save(fname, joints3d)
+    seconds = perf_counter() - start
+    print(
+        f"converted {len(jobs)} sequences in {seconds:.1f}s "
+        f"({total_bytes / seconds / 2 ** 20:.1f} MiB/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
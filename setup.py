@@ -2,4 +2,9 @@ from distutils.core import setup
 import sys
 from os.path import join
 
-setup(name="h36m_fa", version="0.0.1", packages=["h36m_fa/labels8.py"])
+setup(
+    name="h36m_fa",
+    version="0.0.1",
+    packages=["h36m_fa"],
+    package_data={"h36m_fa": ["data/labels*.npy", "data/labels*.json"]},
+)
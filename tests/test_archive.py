@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from os import makedirs
+from os.path import join
+
+import h36m_fa.archive as archive
+import h36m_fa.poses as poses
+from h36m_fa.cache import CACHE
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    """a tree with short random 3d and expmap sequences for all 210 keys"""
+    data_dir = str(tmp_path_factory.mktemp("h36m"))
+    rng = np.random.default_rng(0)
+    for actor, action, sid in poses.all_sequences():
+        n_frames = int(rng.integers(3, 12))
+        p3d = rng.normal(size=(n_frames, 32, 3)).astype(np.float32)
+        np.save(join(data_dir, f"{actor}_{action}_{sid}.npy"), p3d)
+        exp_dir = join(data_dir, "exp_dir/h3.6m/dataset", actor)
+        makedirs(exp_dir, exist_ok=True)
+        seq = rng.uniform(-np.pi, np.pi, size=(n_frames, 99))
+        np.savetxt(join(exp_dir, f"{action}_{sid}.txt"), seq, delimiter=",")
+    yield data_dir
+    archive.ARCHIVES.clear()
+    CACHE.clear()
+
+
+def test_get_matches_loaders(data_dir):
+    for representation in ["3d", "expmap"]:
+        arch = archive.get_archive(representation, data_dir)
+        loader = poses.REPRESENTATIONS[representation]
+        for actor, action, sid in poses.all_sequences():
+            seq = arch.get(actor, action, sid)
+            assert np.shares_memory(seq, arch.data)
+            assert np.array_equal(seq, loader(actor, action, sid, data_dir))
+
+
+def test_get_split_zero_copy(data_dir):
+    for order in archive.ORDERS:
+        arch = archive.get_archive("3d", data_dir, order=order)
+        if order == "actor":
+            contiguous = dict(actors=["S5"])
+            scattered = dict(actions=["walking"])
+        else:
+            contiguous = dict(actions=["walking"])
+            scattered = dict(actors=["S5"])
+
+        frames, index = arch.get_split(**contiguous)
+        assert np.shares_memory(frames, arch.data)
+        frames_copy, index_copy = arch.get_split(**scattered)
+        assert not np.shares_memory(frames_copy, arch.data)
+
+        for frames, index in [(frames, index), (frames_copy, index_copy)]:
+            assert sum(length for _, length in index.values()) == len(frames)
+            for name, (start, length) in index.items():
+                actor, action, sid = name.split("_")
+                expected = poses.get3d(actor, action, int(sid), data_dir)
+                assert np.array_equal(frames[start : start + length], expected)
+
+
+def test_split_follows_archive_order(data_dir):
+    arch = archive.get_archive("3d", data_dir, order="action")
+    _, index = arch.get_split(actors=["S1", "S9"], actions=["eating", "walking"])
+    names = sorted(index, key=lambda name: index[name][0])
+    expected = [
+        f"{actor}_{action}_{sid}"
+        for action in ["eating", "walking"]
+        for actor in ["S1", "S9"]
+        for sid in [1, 2]
+    ]
+    assert names == expected
+
+
+def test_rebuilt_when_source_changes(data_dir):
+    arch = archive.get_archive("3d", data_dir)
+    assert arch.is_fresh()
+    fname = join(data_dir, "S7_posing_2.npy")
+    seq = np.load(fname)
+    np.save(fname, seq + 1)
+    assert not arch.is_fresh()
+
+    archive.ARCHIVES.clear()
+    CACHE.clear()
+    arch = archive.get_archive("3d", data_dir)
+    assert arch.is_fresh()
+    assert np.array_equal(arch.get("S7", "posing", 2), seq + 1)
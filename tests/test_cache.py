@@ -0,0 +1,85 @@
+import numpy as np
+
+from h36m_fa.cache import LRUCache, CACHE, cache_key, cached
+
+
+def seq(n_bytes, value=0):
+    return np.full(n_bytes // 4, value, dtype=np.float32)
+
+
+def test_byte_bound_and_lru_eviction():
+    cache = LRUCache(max_bytes=1000)
+    for i in range(3):
+        cache.put(i, seq(400, i))
+    # 1200 bytes: the oldest entry is evicted
+    assert 0 not in cache and 1 in cache and 2 in cache
+    assert cache.n_bytes == 800
+    assert cache.evictions == 1
+
+    cache.get(1)  # 1 is now the most recently used
+    cache.put(3, seq(400, 3))
+    assert 2 not in cache and 1 in cache and 3 in cache
+    assert cache.n_bytes <= cache.max_bytes
+
+    cache.resize(500)
+    assert len(cache) == 1 and 3 in cache
+    assert cache.n_bytes == 400
+
+
+def test_replacing_a_key_keeps_the_byte_count():
+    cache = LRUCache(max_bytes=1000)
+    cache.put("a", seq(400))
+    cache.put("a", seq(200))
+    assert len(cache) == 1
+    assert cache.n_bytes == 200
+
+
+def test_read_only_only_when_cached():
+    cache = LRUCache(max_bytes=1000)
+    small = cache.put("small", seq(400))
+    assert not small.flags.writeable
+    assert cache.get("small") is small
+
+    large = cache.put("large", seq(2000))
+    assert large.flags.writeable
+    assert "large" not in cache
+
+    disabled = LRUCache(max_bytes=0)
+    assert disabled.put("small", seq(400)).flags.writeable
+    assert len(disabled) == 0
+
+
+def test_stats():
+    cache = LRUCache(max_bytes=1000)
+    assert cache.get("a") is None
+    cache.put("a", seq(400))
+    cache.get("a")
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["entries"] == 1 and stats["n_bytes"] == 400
+
+
+def test_peek_does_not_count():
+    cache = LRUCache(max_bytes=1000)
+    assert cache.peek("a") is None
+    a = cache.put("a", seq(400))
+    cache.put("b", seq(400))
+    assert cache.peek("a") is a
+    assert cache.hits == 0 and cache.misses == 0
+    cache.put("c", seq(400))  # a is still the least recently used
+    assert "a" not in cache
+
+
+def test_cache_key_of_cached_loaders():
+    calls = []
+
+    @cached
+    def get_seq(actor, action, sid, data_dir):
+        calls.append(sid)
+        return seq(400, sid)
+
+    a = get_seq("S1", "walking", 1, ".")
+    key = cache_key(get_seq, "S1", "walking", 1, ".")
+    assert CACHE.peek(key) is a
+    assert get_seq("S1", "walking", 1, ".") is a
+    assert calls == [1]
@@ -0,0 +1,154 @@
+import numpy as np
+import h36m_fa.conversion as conv
+
+
+# ==============================
+# reference: the original per-frame implementation
+# ==============================
+
+
+def expmap2rotmat(r):
+    theta = np.linalg.norm(r)
+    r0 = np.divide(r, max(theta, np.finfo(np.float32).eps))
+    r0x = np.array([0, -r0[2], r0[1], 0, 0, -r0[0], 0, 0, 0]).reshape(3, 3)
+    r0x = r0x - r0x.T
+    R = np.eye(3, 3) + np.sin(theta) * r0x + (1 - np.cos(theta)) * (r0x).dot(r0x)
+    return R
+
+
+def rotmat2euler(R):
+    if R[0, 2] == 1 or R[0, 2] == -1:
+        E3 = 0
+        dlta = np.arctan2(R[0, 1], R[0, 2])
+        if R[0, 2] == -1:
+            E2 = np.pi / 2
+            E1 = E3 + dlta
+        else:
+            E2 = -np.pi / 2
+            E1 = -E3 + dlta
+    else:
+        E2 = -np.arcsin(R[0, 2])
+        E1 = np.arctan2(R[1, 2] / np.cos(E2), R[2, 2] / np.cos(E2))
+        E3 = np.arctan2(R[0, 1] / np.cos(E2), R[0, 0] / np.cos(E2))
+    return np.array([E1, E2, E3])
+
+
+def reference_expmap2euler(seq):
+    n_frames, dim = seq.shape
+    euler = np.copy(seq)
+    for j in range(n_frames):
+        for k in np.arange(0, 97, 3):
+            idx = [k, k + 1, k + 2]
+            R = expmap2rotmat(seq[j, idx])
+            euler[j, idx] = rotmat2euler(R.T)
+    euler[:, 0:6] = 0
+    return euler[:, 3:]
+
+
+def random_expmap(n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-np.pi, np.pi, size=(n_frames, 99)).astype(np.float32)
+
+
+def gimbal_expmap():
+    """rotations of +-pi/2 (and +-3pi/2) about y hit the special case"""
+    seq = random_expmap(8, seed=1)
+    angles = np.float32([np.pi / 2, -np.pi / 2, 3 * np.pi / 2, -3 * np.pi / 2])
+    for j in range(len(seq)):
+        for k in range(3, 99, 3):
+            if (j + k) % 2 == 0:
+                seq[j, k : k + 3] = [0, angles[(j + k // 3) % 4], 0]
+    seq[0, 3:6] = 0  # zero rotation
+    return seq
+
+
+def test_expmap2euler_random():
+    seq = random_expmap(64)
+    assert np.array_equal(conv.expmap2euler(seq), reference_expmap2euler(seq))
+
+
+def test_expmap2euler_gimbal_lock():
+    seq = gimbal_expmap()
+    R = expmap2rotmat(seq[1, 9:12]).T
+    assert abs(R[0, 2]) == 1
+    assert np.array_equal(conv.expmap2euler(seq), reference_expmap2euler(seq))
+
+
+def test_expmap2euler_batch():
+    seq = np.concatenate([random_expmap(12, seed=2), gimbal_expmap()[:4]])
+    batch = seq.reshape((4, 4, 99))
+    euler = conv.expmap2euler(batch)
+    assert euler.shape == (4, 4, 96)
+    expected = reference_expmap2euler(seq).reshape((4, 4, 96))
+    assert np.array_equal(euler, expected)
+
+
+# ==============================
+# round trips between the rotation representations
+# ==============================
+
+ROTATIONS = ["expmap", "zyx", "rotmat", "quat", "6d"]
+
+
+def special_expmap():
+    """identity, 180 degree rotations and small angles"""
+    axes = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 0], [1, -1, 1]], float)
+    axes /= np.linalg.norm(axes, axis=1, keepdims=True)
+    return np.concatenate(
+        [np.zeros((1, 3)), np.pi * axes, 1e-7 * axes, (np.pi - 1e-4) * axes]
+    ).astype(np.float32)
+
+
+def gimbal_zyx():
+    """b = +-pi/2: only a + c (or a - c) is defined"""
+    rng = np.random.default_rng(3)
+    e = rng.uniform(-np.pi, np.pi, size=(8, 3))
+    e[:, 1] = np.where(np.arange(8) % 2 == 0, np.pi / 2, -np.pi / 2)
+    return e.astype(np.float32)
+
+
+def test_expmap2rotmat_matches_reference():
+    r = np.concatenate([random_expmap(4).reshape((-1, 3)), special_expmap()])
+    R = conv.convert(r, "expmap", "rotmat")
+    assert R.dtype == np.float32
+    for i in range(len(r)):
+        assert np.allclose(R[i], expmap2rotmat(r[i]), atol=1e-6)
+
+
+def test_round_trips():
+    r = np.concatenate([random_expmap(4).reshape((-1, 3)), special_expmap()])
+    R = np.concatenate(
+        [conv.convert(r, "expmap", "rotmat"), conv.convert(gimbal_zyx(), "zyx", "rotmat")]
+    )
+    for src in ROTATIONS:
+        x = conv.convert(R, "rotmat", src)
+        assert np.allclose(conv.convert(x, src, "rotmat"), R, atol=1e-5), src
+        for dst in ROTATIONS:
+            y = conv.convert(x, src, dst)
+            assert y.dtype == np.float32
+            assert np.allclose(conv.convert(y, dst, "rotmat"), R, atol=1e-5), (src, dst)
+
+
+def test_quaternions_are_canonical():
+    r = np.concatenate([random_expmap(4).reshape((-1, 3)), special_expmap()])
+    for q in [conv.expmap2quat(r), conv.rotmat2quat(conv.convert(r, "expmap", "rotmat"))]:
+        assert np.all(q[:, 0] >= 0)
+        assert np.allclose(np.linalg.norm(q, axis=1), 1, atol=1e-6)
+
+
+def test_gimbal_zyx():
+    e = gimbal_zyx()
+    R = conv.zyx2rotmat(e)
+    e2 = conv.rotmat2zyx(R)
+    assert np.all(e2[:, 2] == 0)
+    assert np.allclose(np.abs(e2[:, 1]), np.pi / 2, atol=1e-3)
+    assert np.allclose(conv.zyx2rotmat(e2), R, atol=1e-5)
+
+
+def test_convert_batch_shapes():
+    x = random_expmap(6).reshape((2, 3, 33, 3))
+    for dst, shape in [("rotmat", (3, 3)), ("quat", (4,)), ("6d", (6,)), ("zyx", (3,))]:
+        y = conv.convert(x, "expmap", dst)
+        assert y.shape == (2, 3, 33) + shape
+        flat = conv.convert(x.reshape((-1, 3)), "expmap", dst)
+        assert np.array_equal(y.reshape(flat.shape), flat)
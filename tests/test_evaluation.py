@@ -0,0 +1,74 @@
+import numpy as np
+
+import h36m_fa.evaluation as EV
+import h36m_fa.kabsch as KB
+
+
+def random_rotations(n, seed=0):
+    rng = np.random.default_rng(seed)
+    q, _ = np.linalg.qr(rng.normal(size=(n, 3, 3)))
+    q[np.linalg.det(q) < 0, :, 0] *= -1
+    return q
+
+
+def poses(n_frames, seed=0):
+    return np.random.default_rng(seed).normal(size=(n_frames, 17, 3)).astype(np.float32)
+
+
+def test_mpjpe():
+    target = poses(5)
+    pred = target.copy()
+    pred[:, 3, 1] += 0.17
+    assert np.allclose(EV.mpjpe(pred, target), 0.01)
+    # flat poses
+    assert np.allclose(EV.mpjpe(pred.reshape((5, -1)), target.reshape((5, -1))), 0.01)
+
+
+def test_align_undoes_similarity_transforms():
+    target = poses(6, seed=1)
+    R = random_rotations(6, seed=1)
+    pred = 1.7 * np.matmul(target, R) + np.float32([1, -2, 0.5])
+    assert np.all(EV.mpjpe(pred, target) > 0.1)
+    assert np.allclose(EV.pa_mpjpe(pred, target), 0, atol=1e-5)
+    # without scale the error stays
+    assert np.all(EV.pa_mpjpe(pred, target, scale=False) > 0.1)
+
+
+def test_rigid_align_matches_kabsch():
+    target = poses(4, seed=2)
+    pred = poses(4, seed=3)
+    aligned = EV.align(pred, target, scale=False)
+    expected = KB.rotate_P_to_Q_batch(pred.astype(np.float64), target.astype(np.float64))
+    assert np.allclose(aligned, expected, atol=1e-5)
+
+
+def test_per_class():
+    errors = np.float64([1, 2, 3, 4])
+    labels = np.uint8([[1, 0, 0], [1, 1, 0], [0, 1, 0], [0, 1, 0]])
+    means, counts = EV.per_class(errors, labels)
+    assert np.array_equal(counts, [2, 3, 0])
+    assert np.allclose(means[:2], [1.5, 3])
+    assert np.isnan(means[2])
+
+    per_joint, _ = EV.per_class(np.stack([errors, 2 * errors], axis=1), labels)
+    assert per_joint.shape == (3, 2)
+    assert np.allclose(per_joint[:2], [[1.5, 3], [3, 6]])
+
+
+def test_evaluate():
+    target = poses(8, seed=4)
+    pred = target + np.random.default_rng(5).normal(0, 0.05, target.shape)
+    labels = (np.random.default_rng(6).random((8, 4)) < 0.5).astype(np.uint8)
+    labels[:, 0] = 1
+    result = EV.evaluate(pred, target, labels)
+    errors = EV.joint_errors(pred, target)
+    assert np.isclose(result["mpjpe"], EV.mpjpe(pred, target).mean())
+    assert np.isclose(result["pa_mpjpe"], EV.pa_mpjpe(pred, target).mean())
+    assert np.allclose(result["per_joint"], errors.mean(axis=0))
+    per_class = result["per_class"]
+    assert np.array_equal(per_class["n_frames"], labels.sum(axis=0))
+    assert np.isclose(per_class["mpjpe"][0], result["mpjpe"])
+    for k in range(4):
+        active = labels[:, k] == 1
+        if active.any():
+            assert np.isclose(per_class["mpjpe"][k], errors[active].mean())
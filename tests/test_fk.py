@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+import h36m_fa.conversion as conv
+import h36m_fa.fk as FK
+import h36m_fa.instrument as IN
+
+# batch_euler_fk computes in float32, euler_fk in float64
+ATOL = 1e-5
+
+
+def random_euler(n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-np.pi, np.pi, size=(n_frames, 96)).astype(np.float32)
+
+
+def test_batch_euler_fk_matches_euler_fk():
+    angles = random_euler(50)
+    for inv_rot in [False, True]:
+        expected = FK.euler_fk(angles, inv_rot=inv_rot)
+        out = FK.batch_euler_fk(angles, inv_rot=inv_rot)
+        assert out.dtype == np.float32 and out.shape == (50, 32, 3)
+        assert np.allclose(out, expected, atol=ATOL)
+
+
+def test_batch_euler_fk_batch_dims():
+    angles = random_euler(24, seed=1)
+    flat = FK.batch_euler_fk(angles)
+    out = FK.batch_euler_fk(angles.reshape((2, 3, 4, 96)))
+    assert out.shape == (2, 3, 4, 32, 3)
+    assert np.array_equal(out.reshape(flat.shape), flat)
+    assert FK.batch_euler_fk(angles[0]).shape == (32, 3)
+
+
+def test_batch_euler_fk_chunks_and_threads():
+    angles = random_euler(103, seed=2)
+    expected = FK.batch_euler_fk(angles, chunk_size=1000, n_threads=1)
+    for chunk_size in [1, 10, 32, 102]:
+        for n_threads in [1, 3]:
+            out = FK.batch_euler_fk(angles, chunk_size=chunk_size, n_threads=n_threads)
+            assert np.array_equal(out, expected), (chunk_size, n_threads)
+
+
+def test_batch_euler_fk_out():
+    angles = random_euler(12, seed=3).reshape((3, 4, 96))
+    out = np.full((3, 4, 32, 3), np.nan, dtype=np.float32)
+    result = FK.batch_euler_fk(angles, out=out, chunk_size=5)
+    assert result is out
+    assert np.array_equal(out, FK.batch_euler_fk(angles))
+
+    with pytest.raises(AssertionError):
+        FK.batch_euler_fk(angles, out=np.empty((3, 4, 32, 3), dtype=np.float64))
+    with pytest.raises(AssertionError):
+        FK.batch_euler_fk(angles, out=np.empty((12, 32, 3), dtype=np.float32))
+    # the batch dimensions of out cannot be flattened without a copy
+    with pytest.raises(AssertionError):
+        FK.batch_euler_fk(angles, out=np.empty((3, 5, 32, 3), dtype=np.float32)[:, :4])
+    # strided, but flattened by a view
+    strided = np.empty((3, 8, 32, 3), dtype=np.float32)[:, ::2]
+    FK.batch_euler_fk(angles, out=strided)
+    assert np.array_equal(strided, out)
+
+
+def test_rotmat_fk_matches_euler_fk():
+    angles = random_euler(20, seed=4)
+    Rs = FK.batch_rot3d(angles.reshape((-1, 3))).reshape((20, 32, 3, 3))
+    out = FK.rotmat_fk(Rs, chunk_size=7, n_threads=2)
+    assert np.allclose(out, FK.euler_fk(angles), atol=ATOL)
+
+
+def test_batch_frames_are_counted():
+    IN.enable()
+    try:
+        IN.reset()
+        FK.batch_euler_fk(random_euler(12).reshape((3, 4, 96)))
+        assert IN.stages()["fk.batch_euler_fk"]["frames"] == 12
+    finally:
+        IN.reset()
+        IN.disable()
+
+
+# expmap_fk and rotmat_fk skip the float32 Euler angles of the euler_fk
+# pipeline, whose rounding moves the joints by up to a few 1e-5 m for
+# rotations of up to pi and close to gimbal lock
+ATOL_EULER_PATH = 5e-5
+
+
+def random_expmap(n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-np.pi, np.pi, size=(n_frames, 99)).astype(np.float32)
+
+
+def gimbal_expmap(offset):
+    """rotations of +-(pi/2 + offset) about y: Euler angles at gimbal lock"""
+    seq = random_expmap(8, seed=5)
+    for j in range(len(seq)):
+        for k in range(3, 99, 3):
+            if (j + k) % 2 == 0:
+                seq[j, k : k + 3] = [0, (np.pi / 2 + offset) * (-1) ** (k // 3), 0]
+    return seq
+
+
+def local_rotations(seq):
+    """{n x n_joints x 3 x 3} of expmap_fk: root rotation dropped"""
+    r = np.array(seq[:, 3:], dtype=np.float64).reshape((len(seq), 32, 3))
+    r[:, 0] = 0
+    return conv.batch_expmap2rotmat(r.reshape((-1, 3))).reshape((len(seq), 32, 3, 3))
+
+
+def float64_fk(seq):
+    out = np.empty((len(seq), 32, 3), dtype=np.float32)
+    FK._chain(local_rotations(seq), out)
+    return out
+
+
+def test_expmap_fk_matches_euler_path():
+    for seq in [random_expmap(64), gimbal_expmap(1e-3), gimbal_expmap(-1e-3)]:
+        expected = FK.euler_fk(conv.expmap2euler(seq))
+        assert np.allclose(FK.expmap_fk(seq), expected, atol=ATOL_EULER_PATH)
+        Rs = local_rotations(seq)
+        assert np.allclose(FK.rotmat_fk(Rs), expected, atol=ATOL_EULER_PATH)
+
+
+def test_expmap_fk_at_gimbal_lock():
+    # exactly at the lock expmap2euler takes the special case of the
+    # original rotmat2euler, which euler_fk does not invert: only the
+    # float64 chain is a reference here
+    seq = gimbal_expmap(0)
+    assert np.allclose(FK.expmap_fk(seq), float64_fk(seq), atol=1e-6)
+    assert np.allclose(FK.rotmat_fk(local_rotations(seq)), float64_fk(seq), atol=1e-6)
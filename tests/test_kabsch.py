@@ -0,0 +1,56 @@
+import numpy as np
+import h36m_fa.kabsch as KB
+
+
+def random_rotations(n, seed=0):
+    rng = np.random.default_rng(seed)
+    q, r = np.linalg.qr(rng.normal(size=(n, 3, 3)))
+    q = q * np.sign(np.diagonal(r, axis1=1, axis2=2))[:, np.newaxis]
+    q[np.linalg.det(q) < 0, :, 0] *= -1
+    return q
+
+
+def pairs(n, dtype, seed=0):
+    """:return: P, Q = P @ R^T + t, R"""
+    rng = np.random.default_rng(seed)
+    P = rng.normal(size=(n, 32, 3))
+    R = random_rotations(n, seed)
+    t = rng.normal(size=(n, 1, 3))
+    Q = np.matmul(P, np.swapaxes(R, 1, 2)) + t
+    return P.astype(dtype), Q.astype(dtype), R
+
+
+def test_kabsch_recovers_rotation():
+    for dtype, atol in [(np.float32, 1e-4), (np.float64, 1e-10)]:
+        P, Q, R = pairs(4, dtype)
+        for i in range(len(P)):
+            R_est = KB.kabsch(P[i], Q[i])
+            assert R_est.dtype == dtype
+            assert np.allclose(R_est, R[i], atol=atol)
+            assert np.allclose(KB.rotate_P_to_Q(P[i], Q[i]), Q[i], atol=atol * 10)
+
+
+def test_kabsch_never_reflects():
+    P, Q, _ = pairs(3, np.float64, seed=1)
+    Q = Q * np.array([-1, 1, 1])  # a mirrored target
+    R = KB.kabsch_batch(P, Q)
+    assert np.allclose(np.linalg.det(R), 1)
+
+
+def test_batch_matches_single():
+    for dtype in [np.float32, np.float64]:
+        P, Q, _ = pairs(16, dtype, seed=2)
+        R = KB.kabsch_batch(P, Q)
+        out = KB.rotate_P_to_Q_batch(P, Q)
+        assert out.dtype == dtype
+        for i in range(len(P)):
+            assert np.array_equal(R[i], KB.kabsch(P[i], Q[i]))
+            assert np.array_equal(out[i], KB.rotate_P_to_Q(P[i], Q[i]))
+
+
+def test_flat_and_read_only_inputs():
+    P, Q, _ = pairs(2, np.float32, seed=3)
+    expected = KB.rotate_P_to_Q_batch(P, Q)
+    P.flags.writeable = False
+    flat = KB.rotate_P_to_Q_batch(P.reshape((2, -1)), Q.reshape((2, -1)))
+    assert np.array_equal(flat, expected)
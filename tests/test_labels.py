@@ -0,0 +1,46 @@
+import numpy as np
+from os.path import join, dirname
+
+import h36m_fa.labels as labels
+
+RAW_DIR = join(dirname(dirname(__file__)), "data")
+
+
+def raw(n_classes, actor, action, sid):
+    fname = join(RAW_DIR, f"label{n_classes}_{actor}_{action}_{sid}.txt")
+    return np.loadtxt(fname, ndmin=2).astype(np.uint8)
+
+
+def test_store_matches_raw_text():
+    sequences = [("S1", "walking", 1), ("S5", "eating", 2), ("S11", "directions", 1)]
+    for n_classes in [8, 11]:
+        store = labels.LabelStore(n_classes)
+        for actor, action, sid in sequences:
+            lab = store.get(actor, action, sid)
+            assert lab.dtype == np.uint8
+            assert lab.shape[1] == n_classes
+            assert np.array_equal(lab, raw(n_classes, actor, action, sid))
+
+
+def test_store_spans_are_contiguous():
+    store = labels.LabelStore(11)
+    spans = sorted(store.index.values())
+    assert len(spans) == 210
+    assert spans[0][0] == 0
+    for (start, length), (next_start, _) in zip(spans, spans[1:]):
+        assert start + length == next_start
+    assert sum(length for _, length in spans) == len(store.packed)
+
+
+def test_pack_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    lab = {
+        labels.key("S1", "walking", 1): rng.random((37, 11)) < 0.3,
+        labels.key("S1", "walking", 2): rng.random((5, 11)) < 0.3,
+    }
+    labels.pack(lab, n_classes=11, data_dir=str(tmp_path))
+    store = labels.LabelStore(11, data_dir=str(tmp_path))
+    assert store.span("S1", "walking", 2) == (37, 5)
+    for sid in [1, 2]:
+        expected = lab[labels.key("S1", "walking", sid)].astype(np.uint8)
+        assert np.array_equal(store.get("S1", "walking", sid), expected)
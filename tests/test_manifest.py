@@ -0,0 +1,112 @@
+import json
+import sys
+import numpy as np
+import pytest
+from os import makedirs, utime, stat, remove
+from os.path import join
+
+import h36m_fa.conversion as conv
+import h36m_fa.manifest as MF
+import h36m_fa.poses as poses
+from h36m_fa.cache import CACHE
+
+KEY = ("S1", "walking", 1)
+KINDS = list(MF.ARTIFACTS)
+
+
+def write_expmap(data_dir, seed):
+    rng = np.random.default_rng(seed)
+    seq = rng.uniform(-1, 1, size=(20, 99))
+    exp_dir = join(data_dir, "exp_dir/h3.6m/dataset", KEY[0])
+    makedirs(exp_dir, exist_ok=True)
+    np.savetxt(join(exp_dir, f"{KEY[1]}_{KEY[2]}.txt"), seq, delimiter=",")
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data_dir = str(tmp_path)
+    write_expmap(data_dir, seed=0)
+    p3d = np.random.default_rng(1).normal(size=(20, 32, 3)).astype(np.float32)
+    np.save(join(data_dir, "S1_walking_1.npy"), p3d)
+    CACHE.clear()
+    poses.get3d_fixed(*KEY, data_dir)  # generates and records all kinds
+    CACHE.clear()
+    yield data_dir
+    CACHE.clear()
+
+
+def statuses(data_dir):
+    return {kind: MF.check(data_dir, kind, keys=[KEY])[KEY] for kind in KINDS}
+
+
+def output(data_dir, kind):
+    return join(data_dir, kind, MF.artifact_name(*KEY, kind))
+
+
+def record_file(data_dir, kind):
+    return MF.record_name(data_dir, kind, MF.artifact_name(*KEY, kind))
+
+
+def test_generated_artifacts_are_recorded(data_dir):
+    assert statuses(data_dir) == {kind: "ok" for kind in KINDS}
+    assert MF.check(data_dir, "euler")[("S5", "eating", 1)] == "no input"
+
+
+def test_verify_does_not_write(data_dir):
+    fname = output(data_dir, "euler")
+    st = stat(fname)
+    utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    with open(record_file(data_dir, "euler")) as f:
+        before = f.read()
+    assert statuses(data_dir)["euler"] == "ok"
+    with open(record_file(data_dir, "euler")) as f:
+        assert f.read() == before
+
+    assert MF.rebuild(data_dir, n_workers=1) == {kind: 0 for kind in KINDS}
+    entry = MF.load(data_dir, "euler", MF.artifact_name(*KEY, "euler"))
+    assert entry["output"]["mtime_ns"] == st.st_mtime_ns + 10 ** 9
+
+
+def test_changed_source_is_rebuilt_downstream(data_dir):
+    write_expmap(data_dir, seed=2)
+    # fixed_skeleton_from_rotation reads euler/, which is not rebuilt yet
+    assert statuses(data_dir) == {kind: "stale" for kind in KINDS}
+
+    assert MF.rebuild(data_dir, n_workers=1) == {kind: 1 for kind in KINDS}
+    assert statuses(data_dir) == {kind: "ok" for kind in KINDS}
+    CACHE.clear()
+    expected = conv.expmap2euler(poses.get_expmap(*KEY, data_dir))
+    assert np.array_equal(np.load(output(data_dir, "euler")), expected)
+
+
+def test_upstream_code_change_propagates(data_dir):
+    fname = record_file(data_dir, "euler")
+    with open(fname) as f:
+        entry = json.load(f)
+    entry["code"] = "an older pipeline"
+    MF.save(data_dir, "euler", MF.artifact_name(*KEY, "euler"), entry)
+    assert statuses(data_dir) == {kind: "stale" for kind in KINDS}
+
+
+def test_modified_unrecorded_and_record(data_dir):
+    fname = output(data_dir, "fixed_skeleton_from_rotation")
+    np.save(fname, np.zeros((20, 32, 3), dtype=np.float32))
+    assert statuses(data_dir)["fixed_skeleton_from_rotation"] == "modified"
+    assert statuses(data_dir)["fixed_skeleton"] == "stale"
+
+    remove(record_file(data_dir, "euler"))
+    assert statuses(data_dir)["euler"] == "unrecorded"
+
+    for kind in KINDS:
+        MF.record(data_dir, kind, [KEY])
+    assert statuses(data_dir) == {kind: "ok" for kind in KINDS}
+
+
+def test_verify_exit_code(data_dir, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["manifest", "verify", data_dir])
+    MF.main()
+    remove(record_file(data_dir, "fixed_skeleton"))
+    with pytest.raises(SystemExit) as exit_info:
+        MF.main()
+    assert exit_info.value.code == 1
+    assert "unrecorded fixed_skeleton/S1_walking_1.txt" in capsys.readouterr().out
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import h36m_fa.conversion as conv
+import h36m_fa.mirror as mirror
+
+
+def reference_mirror_p3d(seq, n_joints):
+    """the original per-joint loop"""
+    seq = np.reshape(seq, (len(seq), n_joints, 3))
+    if n_joints == 32:
+        LS, RS = mirror.LS_32, mirror.RS_32
+    else:
+        LS, RS = mirror.LS_17, mirror.RS_17
+    out = seq.copy()
+    for jid in range(n_joints):
+        if jid in LS:
+            src = RS[LS.index(jid)]
+        elif jid in RS:
+            src = LS[RS.index(jid)]
+        else:
+            src = jid
+        out[:, jid] = seq[:, src]
+        out[:, jid, 0] *= -1
+    return out
+
+
+def test_mirror_p3d_matches_reference():
+    rng = np.random.default_rng(0)
+    for n_joints in [32, 17]:
+        seq = rng.normal(size=(9, n_joints, 3)).astype(np.float32)
+        expected = reference_mirror_p3d(seq, n_joints)
+        assert np.array_equal(mirror.mirror_p3d(seq), expected)
+        flat = seq.reshape((9, -1))
+        assert np.array_equal(mirror.mirror_p3d(flat), expected)
+        # the input is untouched unless inplace
+        assert np.array_equal(flat, seq.reshape((9, -1)))
+
+
+def test_mirror_p3d_inplace_and_batched():
+    seq = np.random.default_rng(1).normal(size=(2, 5, 32, 3))
+    expected = mirror.mirror_p3d(seq)
+    assert expected.shape == seq.shape
+    assert np.array_equal(mirror.mirror_p3d(expected), seq)  # involution
+    out = mirror.mirror_p3d(seq, inplace=True)
+    assert np.shares_memory(out, seq)
+    assert np.array_equal(out, expected)
+
+
+def test_mirror_p3d_rejects_bad_shapes():
+    with pytest.raises(ValueError):
+        mirror.mirror_p3d(np.zeros((4, 10)))
+    with pytest.raises(AssertionError):
+        mirror.mirror_p3d(np.zeros((4, 10 * 3)))
+
+
+def test_qfix():
+    rng = np.random.default_rng(2)
+    q = rng.normal(size=(20, 32, 4))
+    q /= np.linalg.norm(q, axis=-1, keepdims=True)
+    fixed = mirror.qfix(q)
+    assert np.all(np.sum(fixed[1:] * fixed[:-1], axis=-1) >= 0)
+    assert np.allclose(np.abs(fixed), np.abs(q))
+    assert np.array_equal(fixed[0], q[0])
+
+
+def test_mirror_quaternion_reflects_rotations():
+    rng = np.random.default_rng(3)
+    q = rng.normal(size=(6, 32, 4))
+    q /= np.linalg.norm(q, axis=-1, keepdims=True)
+    q = mirror.qfix(q)
+    out = mirror.mirror_quaternion(q.reshape((6, -1)))
+    assert out.shape == (6, 32 * 4)
+    # every joint carries the rotation M R M (M: reflection over x) of its
+    # counterpart on the other side
+    M = np.diag([-1.0, 1.0, 1.0])
+    R = conv.convert(q, "quat", "rotmat")
+    R_out = conv.convert(out.reshape((6, 32, 4)), "quat", "rotmat")
+    expected = M @ R[:, mirror.PERMUTATION[32]] @ M
+    assert np.allclose(R_out, expected, atol=1e-12)
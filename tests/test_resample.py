@@ -0,0 +1,99 @@
+import numpy as np
+
+import h36m_fa.conversion as conv
+import h36m_fa.resample as RS
+
+
+def test_n_resampled():
+    assert RS.n_resampled(10, 1) == 10
+    assert RS.n_resampled(10, 2) == 5
+    assert RS.n_resampled(11, 2) == 6
+    assert RS.n_resampled(11, 2.5) == 5  # source times 0, 2.5, .., 10
+
+
+def test_integer_factor_picks_frames():
+    seq = np.random.default_rng(0).normal(size=(11, 32, 3)).astype(np.float32)
+    out = RS.resample_poses(seq, RS.factor_of(25))
+    assert out.flags.c_contiguous
+    assert np.array_equal(out, seq[::2])
+    euler = seq.reshape((11, 96))
+    assert np.array_equal(RS.resample_euler(euler, 2.0), euler[::2])
+
+
+def test_fractional_factor_interpolates_linearly():
+    seq = np.random.default_rng(1).normal(size=(11, 4)).astype(np.float32)
+    factor = RS.factor_of(20)  # 2.5
+    out = RS.resample_poses(seq, factor)
+    assert out.shape == (5, 4) and out.dtype == np.float32
+    for i in range(len(out)):
+        t = i * factor
+        i0 = int(np.floor(t))
+        i1 = min(i0 + 1, len(seq) - 1)
+        expected = (1 - (t - i0)) * seq[i0] + (t - i0) * seq[i1]
+        assert np.allclose(out[i], expected, atol=1e-6)
+
+
+def test_euler_slerp():
+    rng = np.random.default_rng(2)
+    seq = rng.uniform(-1.2, 1.2, size=(7, 96)).astype(np.float32)
+    factor = 1.5
+    out = RS.resample_euler(seq, factor)
+    assert out.shape == (RS.n_resampled(7, factor), 96)
+
+    R = conv.convert(seq.reshape((7, 32, 3)).astype(np.float64), "zyx", "rotmat")
+    R_out = conv.convert(out.reshape((-1, 32, 3)).astype(np.float64), "zyx", "rotmat")
+    for i in range(len(out)):
+        t = i * factor
+        i0 = int(np.floor(t))
+        w = t - i0
+        if w == 0:
+            assert np.allclose(R_out[i], R[i0], atol=1e-5)
+            continue
+        # geodesic interpolation: R0 exp(w log(R0^T R1))
+        delta = np.matmul(np.swapaxes(R[i0], 1, 2), R[i0 + 1])
+        r = conv.convert(delta, "rotmat", "expmap")
+        expected = np.matmul(R[i0], conv.convert(w * r, "expmap", "rotmat"))
+        assert np.allclose(R_out[i], expected, atol=1e-5)
+
+
+def reference_labels(lab, factor):
+    """:return: [(lo, hi), ...] the pooled source frames of every output frame"""
+    n_out = RS.n_resampled(len(lab), factor)
+    spans = []
+    for i in range(n_out):
+        lo = min(int(round(i * factor)), len(lab))
+        hi = max(min(int(round((i + 1) * factor)), len(lab)), lo + 1)
+        spans.append((lo, hi))
+    return spans
+
+
+def test_resample_labels():
+    lab = (np.random.default_rng(3).random((23, 11)) < 0.3).astype(np.uint8)
+    for factor in [2.0, 2.5, 50 / 15]:
+        spans = reference_labels(lab, factor)
+        fraction = np.stack([lab[lo:hi].mean(axis=0) for lo, hi in spans])
+
+        out = RS.resample_labels(lab, factor, rule="any")
+        assert out.dtype == lab.dtype
+        assert np.array_equal(out, (fraction > 0).astype(np.uint8))
+
+        out = RS.resample_labels(lab, factor, rule="majority", threshold=0.5)
+        assert np.array_equal(out, (fraction > 0.5).astype(np.uint8))
+
+        out = RS.resample_labels(lab, factor, rule="fraction")
+        assert out.dtype == np.float32
+        assert np.allclose(out, fraction)
+        assert len(out) == RS.n_resampled(len(lab), factor)
+
+
+def test_resampled_loader():
+    seq = np.arange(20, dtype=np.float32).reshape((10, 2))
+
+    def get_ramp(actor, action, sid, data_dir):
+        return seq
+
+    loader = RS.resampled(get_ramp, 25)
+    assert loader.__name__ == "get_ramp@25"
+    out = loader("S1", "walking", 1, "/nonexistent")
+    assert np.array_equal(out, seq[::2])
+    assert loader("S1", "walking", 1, "/nonexistent") is out
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from os.path import join
+
+import h36m_fa.retrieval as retrieval
+from h36m_fa.labels import LabelStore
+
+pytest.importorskip("scipy")
+
+KEYS = [("S1", "walking", 1), ("S5", "eating", 2), ("S9", "sitting", 1)]
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp("h36m"))
+    rng = np.random.default_rng(0)
+    for actor, action, sid in KEYS:
+        seq = rng.normal(size=(40, 32, 3)).astype(np.float32)
+        np.save(join(data_dir, f"{actor}_{action}_{sid}.npy"), seq)
+    return data_dir
+
+
+def build(data_dir):
+    return retrieval.PoseIndex.build(
+        data_dir, keys=KEYS, n_components=8, representation="3d"
+    )
+
+
+def test_canonicalize():
+    seq = np.random.default_rng(1).normal(size=(5, 32, 3))
+    out = retrieval.canonicalize(seq).reshape((5, 32, 3))
+    assert np.allclose(out[:, retrieval.ROOT], 0)
+    hips = out[:, retrieval.LEFT_HIP] - out[:, retrieval.RIGHT_HIP]
+    assert np.allclose(hips[:, 1], 0, atol=1e-5)
+    assert np.all(hips[:, 0] >= 0)
+    # rotations about the vertical axis are removed
+    angle = 0.7
+    c, s = np.cos(angle), np.sin(angle)
+    R = np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+    rotated = retrieval.canonicalize(seq @ R.T + 3.0)
+    assert np.allclose(rotated, out.reshape((5, -1)), atol=1e-5)
+
+
+def test_search_finds_indexed_poses(data_dir):
+    index = build(data_dir)
+    assert len(index) == 3 * 40
+    query = np.load(join(data_dir, "S5_eating_2.npy"))[[3, 17]]
+    seq_ids, frames, distances = index.search(query, k=3)
+    assert seq_ids.shape == (2, 3)
+    assert np.all(seq_ids[:, 0] == 1)
+    assert np.array_equal(frames[:, 0], [3, 17])
+    assert np.allclose(distances[:, 0], 0, atol=1e-5)
+    assert np.all(np.diff(distances, axis=1) >= 0)
+
+
+def test_save_and_mmap_load(data_dir, tmp_path):
+    index = build(data_dir)
+    index.save(str(tmp_path))
+    loaded = retrieval.PoseIndex.load(str(tmp_path), mmap=True)
+    assert loaded.keys == KEYS
+    assert loaded.yaw == index.yaw
+    for name in retrieval.ARRAYS:
+        array = getattr(loaded, name)
+        assert isinstance(array, np.memmap)
+        assert np.array_equal(array, getattr(index, name))
+
+    query = np.random.default_rng(2).normal(size=(4, 96))
+    for a, b in zip(loaded.search(query, k=4), index.search(query, k=4)):
+        assert np.array_equal(a, b)
+
+    in_memory = retrieval.PoseIndex.load(str(tmp_path), mmap=False)
+    assert not isinstance(in_memory.poses, np.memmap)
+
+
+def test_query_labels(data_dir):
+    index = build(data_dir)
+    query = np.load(join(data_dir, "S9_sitting_1.npy"))[[5]]
+    results, lab = index.query(query, k=2)
+    actor, action, sid, frame, distance = results[0][0]
+    assert (actor, action, sid, frame) == ("S9", "sitting", 1, 5)
+    expected = LabelStore(n_classes=11).get("S9", "sitting", 1)[5]
+    assert np.array_equal(lab[0, 0], expected)
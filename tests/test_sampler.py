@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+import h36m_fa.labels as labels
+from h36m_fa.sampler import AliasTable, BalancedSampler
+
+KEYS = [("S1", "walking", 1), ("S1", "walking", 2), ("S5", "eating", 1)]
+N_CLASSES = 4
+
+
+def alias_probabilities(table):
+    """exact probability of every index under the table"""
+    n = len(table)
+    p = table.prob / n
+    np.add.at(p, table.alias, (1 - table.prob) / n)
+    return p
+
+
+def test_alias_table_is_exact():
+    for weights in [[1, 1, 1], [5, 1, 0, 2, 0.5], [0, 0, 3], np.arange(1, 20)]:
+        weights = np.asarray(weights, dtype=np.float64)
+        table = AliasTable(weights)
+        assert np.allclose(alias_probabilities(table), weights / weights.sum())
+
+
+def test_alias_table_draws():
+    weights = np.float64([5, 1, 0, 2])
+    table = AliasTable(weights)
+    draws = table.draw(np.random.default_rng(0), 200000)
+    assert not np.any(draws == 2)
+    frequencies = np.bincount(draws, minlength=4) / len(draws)
+    assert np.allclose(frequencies, weights / weights.sum(), atol=0.005)
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    lab = {}
+    for actor, action, sid in KEYS:
+        seq = np.zeros((200, N_CLASSES), dtype=np.uint8)
+        seq[:, 0] = 1  # a frequent class
+        seq[rng.integers(0, 200, 10), 1] = 1  # a rare one
+        seq[50:120, 2] = 1
+        lab[labels.key(actor, action, sid)] = seq
+    # class 3 is never active
+    data_dir = str(tmp_path_factory.mktemp("labels"))
+    labels.pack(lab, N_CLASSES, data_dir)
+    return labels.LabelStore(N_CLASSES, data_dir=data_dir)
+
+
+def test_windows_show_their_class(store):
+    sampler = BalancedSampler(length=9, keys=KEYS, store=store)
+    cls, seq, start = sampler.sample(5000, seed=1)
+    assert np.all(start >= 0)
+    assert np.all(start + 9 <= sampler.seq_lengths[seq])
+    for c, i, s in zip(cls, seq, start):
+        center = store.get(*KEYS[i])[s + 9 // 2]
+        assert center[c] == 1
+
+
+def test_balanced_and_frequency_weights(store):
+    sampler = BalancedSampler(length=5, keys=KEYS, store=store)
+    assert np.allclose(sampler.class_probabilities(), [1 / 3, 1 / 3, 1 / 3, 0])
+    cls, _, _ = sampler.sample(30000, seed=2)
+    frequencies = np.bincount(cls, minlength=N_CLASSES) / len(cls)
+    assert np.allclose(frequencies, [1 / 3, 1 / 3, 1 / 3, 0], atol=0.02)
+
+    sampler = BalancedSampler(length=5, weights="frequency", keys=KEYS, store=store)
+    assert np.allclose(sampler.class_probabilities(), sampler.counts / sampler.counts.sum())
+
+
+def test_determinism_and_shards(store):
+    sampler = BalancedSampler(length=3, keys=KEYS, store=store)
+    full = sampler.sample(1001, seed=3, epoch=4)
+    again = sampler.sample(1001, seed=3, epoch=4)
+    for a, b in zip(full, again):
+        assert np.array_equal(a, b)
+    other_epoch = sampler.sample(1001, seed=3, epoch=5)
+    assert not np.array_equal(full[2], other_epoch[2])
+
+    n_shards = 3
+    shards = [
+        sampler.sample(1001, seed=3, epoch=4, shard=i, n_shards=n_shards)
+        for i in range(n_shards)
+    ]
+    for k in range(3):
+        merged = np.empty_like(full[k])
+        for i in range(n_shards):
+            merged[i::n_shards] = shards[i][k]
+        assert np.array_equal(merged, full[k])
+
+    windows = sampler.windows(1001, seed=3, epoch=4)
+    assert windows == [(KEYS[i], int(s)) for i, s in zip(full[1], full[2])]
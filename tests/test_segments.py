@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import h36m_fa.labels as labels
+from h36m_fa.segments import SegmentIndex
+
+N_CLASSES = 5
+KEYS = [("S1", "walking", 1), ("S1", "walking", 2), ("S5", "eating", 1)]
+
+
+def runs(active):
+    """:return: [(start, end), ...] of the runs of True, end exclusive"""
+    padded = np.concatenate([[False], active, [False]]).astype(np.int8)
+    edges = np.nonzero(np.diff(padded))[0]
+    return list(zip(edges[0::2], edges[1::2]))
+
+
+@pytest.fixture(scope="module")
+def sequences(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    seqs = {}
+    for actor, action, sid in KEYS:
+        n_frames = int(rng.integers(30, 60))
+        seqs[actor, action, sid] = (rng.random((n_frames, N_CLASSES)) < 0.4).astype(
+            np.uint8
+        )
+    # runs that touch both ends of a sequence must not merge across
+    seqs[KEYS[0]][-1] = 1
+    seqs[KEYS[1]][0] = 1
+    data_dir = str(tmp_path_factory.mktemp("labels"))
+    labels.pack({labels.key(*k): v for k, v in seqs.items()}, N_CLASSES, data_dir)
+    index = SegmentIndex(store=labels.LabelStore(N_CLASSES, data_dir=data_dir))
+    return seqs, index
+
+
+def test_segments(sequences):
+    seqs, index = sequences
+    for k in range(N_CLASSES):
+        for min_length in [1, 3]:
+            expected = [
+                key + (int(start), int(end))
+                for key, lab in seqs.items()
+                for start, end in runs(lab[:, k] == 1)
+                if end - start >= min_length
+            ]
+            found = index.segments(k, min_length=min_length)
+            assert sorted(found) == sorted(expected)
+            lengths = [end - start for _, _, _, start, end in found]
+            assert lengths == sorted(lengths, reverse=True)
+
+
+def test_cooccurrences(sequences):
+    seqs, index = sequences
+    for a, b in [(0, 1), (2, 4), (3, 3)]:
+        expected = [
+            key + (int(start), int(end))
+            for key, lab in seqs.items()
+            for start, end in runs((lab[:, a] == 1) & (lab[:, b] == 1))
+            if end - start >= 2
+        ]
+        assert sorted(index.cooccurrences(a, b, min_length=2)) == sorted(expected)
+
+
+def test_counts(sequences):
+    seqs, index = sequences
+    lab = np.concatenate(list(seqs.values())).astype(np.int64)
+    assert np.array_equal(index.frame_counts(), lab.sum(axis=0))
+    assert np.array_equal(index.cooccurrence(), lab.T @ lab)
+
+    transitions = np.zeros((N_CLASSES, N_CLASSES), dtype=np.int64)
+    for lab in seqs.values():
+        ends = (lab[:-1] == 1) & (lab[1:] == 0)
+        begins = (lab[:-1] == 0) & (lab[1:] == 1)
+        transitions += ends.T.astype(np.int64) @ begins.astype(np.int64)
+    assert np.array_equal(index.transitions(), transitions)
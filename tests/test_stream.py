@@ -0,0 +1,81 @@
+import numpy as np
+
+import h36m_fa.conversion as conv
+import h36m_fa.fk as FK
+import h36m_fa.stream as stream
+from h36m_fa.labels import LabelStore
+from h36m_fa.mirror import mirror_p3d
+
+ATOL = 1e-5
+
+
+def random_euler(n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-np.pi, np.pi, size=(n_frames, 96)).astype(np.float32)
+
+
+def random_expmap(n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-np.pi, np.pi, size=(n_frames, 99)).astype(np.float32)
+
+
+def push_all(processor, seq):
+    joints = []
+    mirrored = []
+    for frame in seq:
+        p3d, p3d_mirrored, _ = processor.push(frame)
+        joints.append(p3d.copy())
+        if p3d_mirrored is not None:
+            mirrored.append(p3d_mirrored.copy())
+    return np.stack(joints), np.stack(mirrored) if mirrored else None
+
+
+def test_tables_follow_the_conversion_formulas():
+    e = random_euler(1).reshape((32, 3))[:4]
+    sa, sb, sc = np.sin(e).T
+    ca, cb, cc = np.cos(e).T
+    trig = np.stack([sa, sb, sc, ca, cb, cc, np.ones(4), np.zeros(4)], axis=1)
+    products = np.prod(trig[:, np.array(stream.ZYX_FACTORS)], axis=-1)
+    R = np.sum(products * np.array(stream.ZYX_SIGNS), axis=-1)
+    assert np.allclose(R.reshape((4, 3, 3)), conv.zyx2rotmat(e), atol=1e-6)
+
+    k = np.float32([0.2, -0.3, 0.9])
+    entries = np.concatenate([k, -k, [0]])
+    K = entries[stream.SKEW].reshape((3, 3))
+    assert np.allclose(K @ np.float32([1, 2, 3]), np.cross(k, [1, 2, 3]))
+
+
+def test_euler_stream_matches_batch_fk():
+    seq = random_euler(20)
+    processor = stream.StreamProcessor("euler", mirror=True)
+    joints, mirrored = push_all(processor, seq)
+    expected = FK.batch_euler_fk(seq)
+    assert np.allclose(joints, expected, atol=ATOL)
+    assert np.allclose(joints, FK.euler_fk(seq), atol=ATOL)
+    assert np.allclose(mirrored, mirror_p3d(expected), atol=ATOL)
+
+
+def test_expmap_stream_matches_expmap_fk():
+    seq = random_expmap(20, seed=1)
+    processor = stream.StreamProcessor("expmap")
+    joints, mirrored = push_all(processor, seq)
+    assert mirrored is None
+    assert np.allclose(joints, FK.expmap_fk(seq), atol=ATOL)
+
+
+def test_buffers_labels_and_latency():
+    processor = stream.StreamProcessor("euler", n_classes=11)
+    processor.reset("S1", "walking", 1)
+    labels = LabelStore(n_classes=11).get("S1", "walking", 1)
+    seq = random_euler(3, seed=2)
+    for i, frame in enumerate(seq):
+        joints, _, label = processor.push(frame)
+        assert joints is processor.joints  # a buffer, overwritten per frame
+        assert np.array_equal(label, labels[i])
+    assert processor.frame == 3
+    assert processor.latency()["frames"] == 3
+
+    processor.reset()
+    _, _, label = processor.push(seq[0])
+    assert processor.frame == 1
+    assert not np.any(label)
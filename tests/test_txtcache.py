@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from os import remove
+from os.path import join, isfile
+
+import h36m_fa.txtcache as TC
+
+
+def test_shadow_round_trip(tmp_path):
+    fname = join(str(tmp_path), "seq.txt")
+    seq = np.random.default_rng(0).normal(size=(7, 5)).astype(np.float32)
+    np.savetxt(fname, seq, delimiter=",")
+    assert not TC.is_fresh(fname)
+    assert np.array_equal(TC.loadtxt(fname, delimiter=","), seq)
+    assert TC.is_fresh(fname)
+    assert np.array_equal(TC.loadtxt(fname, delimiter=","), seq)
+
+
+def test_deleted_source(tmp_path):
+    fname = join(str(tmp_path), "seq.txt")
+    TC.savetxt(fname, np.ones((3, 2)))
+    assert TC.is_fresh(fname)
+    remove(fname)
+    assert isfile(TC.shadow_name(fname))
+    assert not TC.is_fresh(fname)
+    with pytest.raises(FileNotFoundError):
+        TC.loadtxt(fname)